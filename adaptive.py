@@ -0,0 +1,173 @@
+"""
+Adaptive (CAT-style) assessment mode
+
+Treats the ordered prerequisite list of a grade as a dependency chain:
+a correct answer on a topic is evidence that every earlier topic is mastered,
+and a wrong answer is evidence that every later topic is not. Each answer
+updates a mastery probability for all topics, and the session ends as soon
+as every topic is confidently classified.
+"""
+import random
+import logging
+
+# Probability that a student who has mastered a topic still answers wrongly
+SLIP = 0.1
+# Probability that a student who has not mastered a topic answers correctly
+GUESS = 0.1
+# How much inferred evidence weakens per step along the chain
+INFERENCE_DECAY = 0.95
+# Confidence thresholds for classifying a topic as mastered / not mastered
+MASTERY_THRESHOLD = 0.85
+NON_MASTERY_THRESHOLD = 0.15
+# Never ask more than this share of the grade's prerequisites
+MAX_QUESTION_RATIO = 0.6
+
+def new_state(prerequisite_count: int) -> dict:
+    """Create initial adaptive state for a grade with the given number of prerequisites"""
+    return {
+        'p': [0.5] * prerequisite_count,
+        'asked': [],
+    }
+
+def _posterior(prior: float, correct: bool, weight: float = 1.0) -> float:
+    """Bayesian update of mastery probability, with evidence scaled by weight (0..1)"""
+    p_correct_mastered = 0.5 + ((1 - SLIP) - 0.5) * weight
+    p_correct_not_mastered = 0.5 + (GUESS - 0.5) * weight
+    if correct:
+        likelihood_m, likelihood_n = p_correct_mastered, p_correct_not_mastered
+    else:
+        likelihood_m, likelihood_n = 1 - p_correct_mastered, 1 - p_correct_not_mastered
+    numerator = prior * likelihood_m
+    denominator = numerator + (1 - prior) * likelihood_n
+    return numerator / denominator if denominator > 0 else prior
+
+def record_answer(state: dict, index: int, correct: bool) -> dict:
+    """
+    Update state after an answer on the prerequisite at index.
+    Correct answers propagate mastery to earlier topics, wrong or "don't know"
+    answers propagate non-mastery to later topics.
+    """
+    probabilities = state['p']
+    probabilities[index] = _posterior(probabilities[index], correct)
+
+    if correct:
+        inferred = range(index - 1, -1, -1)
+    else:
+        inferred = range(index + 1, len(probabilities))
+
+    for j in inferred:
+        weight = INFERENCE_DECAY ** abs(index - j)
+        probabilities[j] = _posterior(probabilities[j], correct, weight)
+
+    state['p'] = [round(p, 4) for p in probabilities]
+    state['asked'] = state['asked'] + [index]
+    return state
+
+def _is_confident(p: float) -> bool:
+    return p >= MASTERY_THRESHOLD or p <= NON_MASTERY_THRESHOLD
+
+def max_questions(prerequisite_count: int) -> int:
+    """Upper bound on questions asked in an adaptive session"""
+    return max(1, int(round(prerequisite_count * MAX_QUESTION_RATIO)))
+
+def is_complete(state: dict) -> bool:
+    """Session ends when every topic is classified or the question budget is spent"""
+    probabilities = state['p']
+    if not probabilities:
+        return True
+    if len(state['asked']) >= max_questions(len(probabilities)):
+        return True
+    return all(_is_confident(p) for p in probabilities)
+
+def next_index(state: dict):
+    """
+    Pick the next prerequisite to ask: the unasked topic whose mastery
+    is most uncertain, preferring the middle of the uncertain range so
+    each answer splits the chain roughly in half.
+    Returns None when the session is complete.
+    """
+    if is_complete(state):
+        return None
+
+    probabilities = state['p']
+    asked = set(state['asked'])
+    candidates = [i for i, p in enumerate(probabilities) if i not in asked and not _is_confident(p)]
+    if not candidates:
+        candidates = [i for i in range(len(probabilities)) if i not in asked]
+    if not candidates:
+        return None
+
+    middle = (candidates[0] + candidates[-1]) / 2
+    return min(candidates, key=lambda i: (abs(probabilities[i] - 0.5), abs(i - middle)))
+
+def classify(state: dict, prerequisites: list) -> dict:
+    """Split prerequisites into inferred mastered / not mastered / uncertain lists"""
+    result = {'mastered': [], 'not_mastered': [], 'uncertain': []}
+    for prerequisite, p in zip(prerequisites, state['p']):
+        if p >= MASTERY_THRESHOLD:
+            result['mastered'].append(prerequisite)
+        elif p <= NON_MASTERY_THRESHOLD:
+            result['not_mastered'].append(prerequisite)
+        else:
+            result['uncertain'].append(prerequisite)
+    return result
+
+def _simulated_answer(rng: random.Random, mastered: bool) -> bool:
+    return rng.random() >= SLIP if mastered else rng.random() < GUESS
+
+def simulate(grade_prerequisites: dict, students_per_grade: int = 1000, seed: int = 42) -> dict:
+    """
+    Simulate students against adaptive and linear modes.
+
+    Each simulated student masters a prefix of the grade's chain (plus
+    slip/guess noise on every answer). Returns, per grade, the average
+    number of questions asked and the share of topics classified correctly.
+    """
+    rng = random.Random(seed)
+    report = {}
+
+    for grade, prerequisites in grade_prerequisites.items():
+        count = len(prerequisites)
+        adaptive_questions = 0
+        adaptive_correct = 0
+        linear_correct = 0
+
+        for _ in range(students_per_grade):
+            frontier = rng.randint(0, count)
+            truth = [i < frontier for i in range(count)]
+
+            # Adaptive session
+            state = new_state(count)
+            while True:
+                index = next_index(state)
+                if index is None:
+                    break
+                record_answer(state, index, _simulated_answer(rng, truth[index]))
+            adaptive_questions += len(state['asked'])
+            adaptive_correct += sum(1 for i, p in enumerate(state['p']) if (p >= 0.5) == truth[i])
+
+            # Linear session: one question per prerequisite, taken at face value
+            linear_correct += sum(1 for i in range(count) if _simulated_answer(rng, truth[i]) == truth[i])
+
+        total_topics = count * students_per_grade
+        report[grade] = {
+            'prerequisites': count,
+            'adaptive_avg_questions': round(adaptive_questions / students_per_grade, 2),
+            'adaptive_accuracy': round(adaptive_correct / total_topics * 100, 1),
+            'linear_avg_questions': count,
+            'linear_accuracy': round(linear_correct / total_topics * 100, 1),
+        }
+        logging.debug(f"Simulated {students_per_grade} adaptive sessions for grade {grade}")
+
+    return report
+
+if __name__ == '__main__':
+    import sys
+    from app import GRADE_PREREQUISITES
+
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    results = simulate(GRADE_PREREQUISITES, students)
+    print(f"{'grade':<10}{'topics':>8}{'adaptive q':>12}{'adaptive acc%':>15}{'linear acc%':>13}")
+    for grade, row in results.items():
+        print(f"{grade:<10}{row['prerequisites']:>8}{row['adaptive_avg_questions']:>12}"
+              f"{row['adaptive_accuracy']:>15}{row['linear_accuracy']:>13}")
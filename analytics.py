@@ -1,6 +1,10 @@
 import logging
-from models import db, Question, Student, StudentAnswer
-from sqlalchemy import func
+from datetime import timedelta
+from models import db, Question, Student, StudentAnswer, PrerequisiteDailyStats, utc_now, upsert_insert
+from sqlalchemy import func, case
+from tenancy import current_tenant
+import reads
+import cold_storage
 
 def calculate_analytics():
     """
@@ -99,54 +103,197 @@ def get_question_quality_summary():
     Returns counts of questions in each quality category
     """
     try:
-        questions = Question.query.filter(Question.avg_discrimination_index.isnot(None)).all()
-        
-        excellent = sum(1 for q in questions if q.avg_discrimination_index >= 0.4)
-        acceptable = sum(1 for q in questions if 0.2 <= q.avg_discrimination_index < 0.4)
-        poor = sum(1 for q in questions if q.avg_discrimination_index < 0.2)
+        index = Question.avg_discrimination_index
+        excellent, acceptable, poor, total = db.session.query(
+            func.coalesce(func.sum(case((index >= 0.4, 1), else_=0)), 0),
+            func.coalesce(func.sum(case(((index >= 0.2) & (index < 0.4), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((index < 0.2, 1), else_=0)), 0),
+            func.count(index)
+        ).one()
         
         return {
             'excellent': excellent,
             'acceptable': acceptable, 
             'poor': poor,
-            'total': len(questions)
+            'total': total
         }
         
     except Exception as e:
         logging.error(f"Error getting question quality summary: {e}")
         return {'excellent': 0, 'acceptable': 0, 'poor': 0, 'total': 0}
 
-def get_prerequisite_performance():
+# Sortable columns of the admin analytics question table
+QUESTION_SORT_COLUMNS = {
+    'id': reads.questions.c.id,
+    'discrimination': reads.questions.c.avg_discrimination_index,
+    'difficulty': reads.questions.c.avg_difficulty_percent,
+    'times_used': reads.questions.c.times_used,
+}
+
+def get_questions_page(page=1, per_page=50, sort='id', order='asc'):
+    """
+    Get one page of questions (as QuestionRow) for the analytics table, sorted in SQL.
+    Questions without computed analytics always sort last.
+    """
+    column = QUESTION_SORT_COLUMNS.get(sort, reads.questions.c.id)
+    direction = column.desc() if order == 'desc' else column.asc()
+    return reads.question_page([column.is_(None), direction, reads.questions.c.id], page, per_page)
+
+def get_analytics_snapshot_version():
+    """
+    Cheap fingerprint of the data behind question analytics.
+    Changes whenever questions or answers are added or questions are used,
+    so caches keyed by it are invalidated exactly when analytics could change.
+    """
+    try:
+        question_stats = db.session.query(
+            func.count(Question.id), func.max(Question.id), func.sum(Question.times_used)
+        ).one()
+        answer_stats = db.session.query(func.count(StudentAnswer.id), func.max(StudentAnswer.id)).one()
+        return '-'.join(str(value or 0) for value in (*question_stats, *answer_stats))
+    except Exception as e:
+        logging.error(f"Error getting analytics snapshot version: {e}")
+        return None
+
+def get_analytics_results_version():
+    """
+    Fingerprint of the stored analytics results (avg_* columns).
+    Changes whenever calculate_analytics() writes different values, so
+    fragments rendered from them are keyed by what they actually show.
+    """
+    try:
+        results = db.session.query(
+            func.count(Question.avg_difficulty_percent),
+            func.sum(Question.avg_difficulty_percent), func.max(Question.avg_difficulty_percent),
+            func.sum(Question.avg_discrimination_index), func.max(Question.avg_discrimination_index)
+        ).one()
+        return '-'.join(str(round(value or 0, 6)) for value in results)
+    except Exception as e:
+        logging.error(f"Error getting analytics results version: {e}")
+        return None
+
+def _rollup_upsert(values):
+    """INSERT ... ON CONFLICT DO UPDATE adding values' counters to an existing rollup row"""
+    table = PrerequisiteDailyStats.__table__
+    counters = ('answers', 'correct', 'incorrect', 'dont_know')
+    
+    statement = upsert_insert(table)
+    if statement is not None:
+        statement = statement.values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['tenant_id', 'grade', 'prerequisite_name', 'day'],
+            set_={name: table.c[name] + statement.excluded[name] for name in counters}
+        )
+        db.session.execute(statement)
+        return
+    
+    # Generic fallback: update, then insert if no row existed yet
+    result = db.session.execute(
+        table.update()
+        .where(table.c.tenant_id == values['tenant_id'],
+               table.c.grade == values['grade'],
+               table.c.prerequisite_name == values['prerequisite_name'],
+               table.c.day == values['day'])
+        .values({name: table.c[name] + values[name] for name in counters})
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**values))
+
+def record_answer_rollup(grade, prerequisite_name, is_correct, day=None):
+    """
+    Add one answer to the current tenant's (grade, prerequisite, day) rollup.
+    Runs in the caller's transaction so the rollup commits together with the answer.
+    is_correct uses the StudentAnswer encoding: 1 correct, 0 incorrect, -1 "don't know".
+    """
+    _rollup_upsert({
+        'tenant_id': current_tenant(),
+        'grade': grade,
+        'prerequisite_name': prerequisite_name,
+        'day': day or utc_now().date(),
+        'answers': 1,
+        'correct': 1 if is_correct == 1 else 0,
+        'incorrect': 1 if is_correct == 0 else 0,
+        'dont_know': 1 if is_correct == -1 else 0,
+    })
+
+def rebuild_answer_rollups():
+    """Rebuild the current tenant's rollups from all its answers, hot, archived and cold, dated by answered_at"""
+    from retention import answers_between
+    
+    try:
+        answers = answers_between(tenant_id=current_tenant())
+        day = func.date(answers.c.answered_at, type_=db.Date)
+        
+        db.session.query(PrerequisiteDailyStats).delete()
+        rows = db.session.query(
+            Student.student_grade,
+            answers.c.prerequisite_name,
+            day,
+            func.count(answers.c.id),
+            func.sum(case((answers.c.is_correct == 1, 1), else_=0)),
+            func.sum(case((answers.c.is_correct == 0, 1), else_=0)),
+            func.sum(case((answers.c.is_correct == -1, 1), else_=0))
+        ).join(Student, Student.id == answers.c.student_id)\
+            .group_by(Student.student_grade, answers.c.prerequisite_name, day).all()
+        
+        # Sessions compacted to cold storage are no longer in either table
+        totals = cold_storage.daily_rollups()
+        for grade, prerequisite_name, answer_day, *counts in rows:
+            merged = totals.setdefault((grade, prerequisite_name, answer_day), [0, 0, 0, 0])
+            for i, count in enumerate(counts):
+                merged[i] += count or 0
+        rows = list(totals.items())
+        
+        for (grade, prerequisite_name, answer_day), (answers_count, correct, incorrect, dont_know) in rows:
+            db.session.add(PrerequisiteDailyStats(
+                grade=grade, prerequisite_name=prerequisite_name, day=answer_day,
+                answers=answers_count, correct=correct, incorrect=incorrect, dont_know=dont_know
+            ))
+        db.session.commit()
+        logging.info(f"Rebuilt {len(rows)} prerequisite rollup rows")
+        return len(rows)
+        
+    except Exception as e:
+        logging.error(f"Error rebuilding answer rollups: {e}")
+        db.session.rollback()
+        return 0
+
+def get_prerequisite_performance(grade_prerequisites, grade=None, days=None):
     """
-    Get performance statistics for each prerequisite
+    Get student outcome statistics for each prerequisite from the daily rollups.
+    grade_prerequisites maps each grade to its prerequisites; grade limits results
+    to that grade's prerequisites, days to the last N days.
+    One grouped query regardless of the number of prerequisites.
     """
     try:
-        from app import PREREQUISITES
+        query = db.session.query(
+            PrerequisiteDailyStats.prerequisite_name,
+            func.sum(PrerequisiteDailyStats.answers),
+            func.sum(PrerequisiteDailyStats.correct),
+            func.sum(PrerequisiteDailyStats.incorrect),
+            func.sum(PrerequisiteDailyStats.dont_know)
+        )
+        if grade:
+            query = query.filter(PrerequisiteDailyStats.grade == grade)
+            prerequisites = grade_prerequisites.get(grade, [])
+        else:
+            prerequisites = list(dict.fromkeys(p for grade_prereqs in grade_prerequisites.values() for p in grade_prereqs))
+        if days:
+            query = query.filter(PrerequisiteDailyStats.day >= utc_now().date() - timedelta(days=days - 1))
+        
+        totals = {row[0]: row[1:] for row in query.group_by(PrerequisiteDailyStats.prerequisite_name).all()}
         
         stats = []
-        for prerequisite in PREREQUISITES:
-            questions = Question.query.filter_by(prerequisite_name=prerequisite).all()
-            if not questions:
-                stats.append({
-                    'name': prerequisite,
-                    'total_questions': 0,
-                    'avg_difficulty': 0,
-                    'avg_discrimination': 0,
-                    'times_used': 0
-                })
-                continue
-                
-            total_questions = len(questions)
-            avg_difficulty = sum(q.avg_difficulty_percent or 0 for q in questions) / total_questions
-            avg_discrimination = sum(q.avg_discrimination_index or 0 for q in questions) / total_questions  
-            total_times_used = sum(q.times_used for q in questions)
-            
+        for prerequisite in prerequisites:
+            answers, correct, incorrect, dont_know = totals.get(prerequisite, (0, 0, 0, 0))
+            attempted = (correct or 0) + (incorrect or 0)
             stats.append({
                 'name': prerequisite,
-                'total_questions': total_questions,
-                'avg_difficulty': round(avg_difficulty, 1),
-                'avg_discrimination': round(avg_discrimination, 3),
-                'times_used': total_times_used
+                'answers': answers or 0,
+                'correct': correct or 0,
+                'incorrect': incorrect or 0,
+                'dont_know': dont_know or 0,
+                'success_rate': round(correct / attempted * 100, 1) if attempted else None
             })
         
         return stats
@@ -154,3 +301,15 @@ def get_prerequisite_performance():
     except Exception as e:
         logging.error(f"Error getting prerequisite performance: {e}")
         return []
+
+def get_weakest_prerequisites(grade_prerequisites, grade, days=None, limit=5, min_answers=1):
+    """
+    Prerequisites of a grade ordered by lowest success rate.
+    "Don't know" answers count against the prerequisite here, since they signal
+    a gap just like wrong answers do.
+    """
+    stats = [s for s in get_prerequisite_performance(grade_prerequisites, grade, days) if s['answers'] >= min_answers]
+    for s in stats:
+        s['mastery_rate'] = round(s['correct'] / s['answers'] * 100, 1)
+    stats.sort(key=lambda s: (s['mastery_rate'], -s['answers']))
+    return stats[:limit]
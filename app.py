@@ -1,11 +1,37 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, make_response, Response, send_file, abort
 from werkzeug.middleware.proxy_fix import ProxyFix
-from models import db, Question, Student, StudentAnswer, PrerequisiteVideo
+from models import db, Question, Student, StudentAnswer, PrerequisiteVideo, PrerequisiteDependency, utc_now, upsert_insert
+from migrations import upgrade_schema
 from gemini_service import generate_questions_from_ai
-from analytics import calculate_analytics
+from analytics import (calculate_analytics, get_question_quality_summary, get_questions_page,
+                       get_analytics_snapshot_version, get_analytics_results_version,
+                       QUESTION_SORT_COLUMNS, record_answer_rollup,
+                       get_prerequisite_performance, get_weakest_prerequisites)
+from fragment_cache import fragment_cache
+from markupsafe import Markup
+from session_store import init_session_backend
+from assets import init_assets
+from compression import init_compression
+from json_provider import init_json_provider
+from replica import init_replica, replica_reads
+from tenancy import init_tenancy, current_tenant, tenant_scope, check_admin_credentials, DEFAULT_TENANT
+from ratelimit import rate_limit, init_admission_control, admission_exempt
+from question_pool import init_question_pool, register_provider, pick_question
+from question_dedup import find_near_duplicate
+from results import finalize_results, load_results, live_results, dashboard_rows
+from live_updates import (publish_session_started, publish_progress, event_stream, current_event_id,
+                          LIVE_UPDATES, LIVE_POLL_INTERVAL)
+from profiling import init_profiling, list_profiles, profile_path
+import adaptive
+import question_templates
+import reads
+import remediation
 import json
+import copy
+import hashlib
+import random
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -20,11 +46,15 @@ if not session_secret:
     session_secret = secrets.token_hex(32)
     logging.warning("SESSION_SECRET not set in environment. Using generated secret for development.")
 app.secret_key = session_secret
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# x_for gives rate limiting the client address instead of the proxy's
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Configure PostgreSQL database
 database_url = os.environ.get('DATABASE_URL')
-if database_url:
+if database_url and database_url.startswith('sqlite'):
+    # A SQLite file, e.g. the throwaway database of the test suite
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+elif database_url:
     # Fix SSL connection issues for PostgreSQL
     if '?' not in database_url:
         database_url += '?sslmode=prefer'
@@ -44,13 +74,52 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////tmp/mathboost.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Optional read replica for admin and analytics reads (REPLICA_DATABASE_URL)
+init_replica(app)
+
 # Initialize database
 db.init_app(app)
 
-# Admin credentials from environment
+# Opt-in sampling profiler, slow-request capture and on-demand cProfile (see profiling.py)
+init_profiling(app)
+
+# Bind each request to its school (tenant); tenant-scoped queries are filtered automatically
+init_tenancy(app)
+
+# Shed API/admin requests with 429 before they exhaust the database pool
+init_admission_control(app)
+
+# Session storage: signed cookie by default, or server-side via SESSION_BACKEND
+init_session_backend(app)
+
+# Fingerprinted, precompressed static assets (built with `python assets.py`)
+init_assets(app)
+
+# Compact UTF-8 JSON encoding and negotiated compression for /api/ responses
+init_json_provider(app)
+init_compression(app)
+
+# Admin credentials of the default school; other schools use TENANT_ADMINS (see tenancy.py)
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin123")
 
+# Token bucket limits as (burst capacity, seconds to refill it)
+START_SESSION_LIMIT = (60, 60)  # per client IP; a whole class may share one address
+STUDENT_API_LIMIT = (120, 60)  # per student session
+ADMIN_LOGIN_LIMIT = (10, 60)  # per client IP
+GENERATE_QUESTIONS_LIMIT = (10, 60)  # per admin session
+
+# Longest window (in days) the prerequisite analytics endpoints accept; larger values are clamped
+ANALYTICS_MAX_DAYS = 3650
+
+# Default assessment mode: 'linear' asks every prerequisite, 'adaptive' stops early once mastery is inferred
+ASSESSMENT_MODE = os.environ.get("ASSESSMENT_MODE", "linear")
+ASSESSMENT_MODES = ('linear', 'adaptive')
+
+# Serve locally generated questions for prerequisites with a template in question_templates.py
+LOCAL_QUESTIONS = os.environ.get("LOCAL_QUESTIONS", "1") == "1"
+LOCAL_QUESTION_DIFFICULTY = os.environ.get("LOCAL_QUESTION_DIFFICULTY", "medium")
+
 # Grade-specific prerequisites for Iranian curriculum (Grades 7-12)
 GRADE_PREREQUISITES = {
     "ششم": [
@@ -213,6 +282,20 @@ def get_prerequisites_for_grade(grade):
     """Get prerequisites for a specific grade"""
     return GRADE_PREREQUISITES.get(grade, [])
 
+def all_prerequisites():
+    """Sorted unique prerequisites across all grades"""
+    return sorted({prerequisite for grade_prereqs in GRADE_PREREQUISITES.values() for prerequisite in grade_prereqs})
+
+def get_current_prerequisite_index(grade_prerequisites):
+    """Index of the prerequisite to ask next in this session, or None when the assessment is complete"""
+    if session.get('assessment_mode') == 'adaptive':
+        return adaptive.next_index(session['adaptive_state'])
+    
+    prerequisite_index = session.get('current_prerequisite_index', 0)
+    if prerequisite_index >= len(grade_prerequisites):
+        return None
+    return prerequisite_index
+
 def generate_questions(prerequisite_name, count=1):
     """Generate questions for a specific prerequisite"""
     try:
@@ -296,6 +379,76 @@ def generate_questions(prerequisite_name, count=1):
             "answer": "۱"
         }]
 
+def gemini_question_provider(prerequisite_name, difficulty_level):
+    """Question pool provider backed by Gemini (stores one question per difficulty level)"""
+    return generate_questions_from_ai(prerequisite_name)
+
+def local_question_provider(prerequisite_name, difficulty_level, count=3):
+    """Question pool provider storing instances of the prerequisite's local template"""
+    if not question_templates.has_template(prerequisite_name):
+        return False
+    
+    rng = random.Random()
+    added = 0
+    # Extra attempts since small easy templates can repeat a question
+    for _ in range(count * 3):
+        if added >= count:
+            break
+        generated = question_templates.generate(prerequisite_name, rng, difficulty_level)
+        if find_near_duplicate(generated['text']):
+            continue
+        db.session.add(Question(
+            prerequisite_name=prerequisite_name,
+            difficulty_level=difficulty_level,
+            question_text=generated['text'],
+            correct_answer=generated['answer'],
+            times_used=0
+        ))
+        added += 1
+    
+    db.session.commit()
+    logging.info(f"Stored {added} local {difficulty_level} questions for {prerequisite_name}")
+    return added > 0
+
+# Local templates are free and instant, so they are tried before Gemini
+register_provider('local', local_question_provider)
+register_provider('gemini', gemini_question_provider)
+
+# Background top-up of the question pool (QUESTION_POOL_REPLENISH=1)
+init_question_pool(app, all_prerequisites())
+
+# Prerequisite dependency graph for remediation paths, precomputed from grade ordering
+remediation.init_remediation(GRADE_PREREQUISITES)
+
+def get_slot_question(prerequisite_name, slot):
+    """
+    Question served for a slot of the current session. Prerequisites with a
+    local template get a generated instance; otherwise stocked questions are
+    preferred and the choice is remembered in the session so the question that
+    was shown is the one graded, even if the pool changes in between.
+    """
+    if LOCAL_QUESTIONS and question_templates.has_template(prerequisite_name):
+        # Fresh instance per student, regenerated identically from the session seed when graded
+        seed = session.get('question_seed', session['student_id'])
+        return question_templates.generate_for_slot(prerequisite_name, seed, slot, LOCAL_QUESTION_DIFFICULTY)
+    
+    served = session.get('served_questions', {})
+    question_id = served.get(str(slot))
+    question = db.session.get(Question, question_id) if question_id else None
+    
+    if question is None:
+        question = pick_question(prerequisite_name, f"{session['student_id']}:{slot}")
+        if question is not None:
+            served[str(slot)] = question.id
+            session['served_questions'] = served
+    
+    if question is not None:
+        return {'text': question.question_text, 'answer': question.correct_answer}
+    
+    # Nothing stocked yet for this prerequisite
+    questions = generate_questions(prerequisite_name, 1)
+    return questions[0] if questions else None
+
 # For backward compatibility
 PREREQUISITES = GRADE_PREREQUISITES.get("هفتم", [])
 
@@ -371,16 +524,12 @@ def add_sample_questions():
 def create_tables():
     """Initialize database tables and sample data"""
     db.create_all()
+    upgrade_schema()
     
     # Add sample video links for all prerequisites if not exist
     if not PrerequisiteVideo.query.first():
-        # Get all unique prerequisites from all grades
-        all_prerequisites = set()
-        for grade_prereqs in GRADE_PREREQUISITES.values():
-            all_prerequisites.update(grade_prereqs)
-        
         # Create sample video entries for all prerequisites
-        for i, prerequisite in enumerate(sorted(all_prerequisites), 1):
+        for i, prerequisite in enumerate(all_prerequisites(), 1):
             video = PrerequisiteVideo(
                 prerequisite_name=prerequisite, 
                 video_url=f"https://example.com/video{i}"
@@ -394,44 +543,48 @@ def create_tables():
             add_sample_questions()
 
 # Database initialization function for lazy loading
+_tables_checked = False
+
 def init_db_if_needed():
     """Initialize database tables and sample data on first request"""
-    try:
-        # Try a simple query to see if tables exist
-        PrerequisiteVideo.query.first()
-    except Exception:
-        # Tables don't exist, create them
-        db.create_all()
-        
-        # Add sample video links for all prerequisites if not exist
-        if not PrerequisiteVideo.query.first():
-            # Get all unique prerequisites from all grades
-            all_prerequisites = set()
-            for grade_prereqs in GRADE_PREREQUISITES.values():
-                all_prerequisites.update(grade_prereqs)
-            
-            # Create sample video entries for all prerequisites
-            for i, prerequisite in enumerate(sorted(all_prerequisites), 1):
-                video = PrerequisiteVideo(
-                    prerequisite_name=prerequisite, 
-                    video_url=f"https://example.com/video{i}"
-                )
-                db.session.add(video)
-            
-            db.session.commit()
-            
-            # Add sample questions for testing if no questions exist
-            if not Question.query.first():
-                add_sample_questions()
+    global _tables_checked
+    if not _tables_checked:
+        # Creates missing tables (including ones added since the database was
+        # first initialized) and seeds videos and sample questions when empty.
+        # Seed data belongs to the shared default tenant whichever school asks first.
+        with tenant_scope(DEFAULT_TENANT):
+            create_tables()
+        _tables_checked = True
+
+# Rendered index page and its ETag, cached per process since the page is static
+_index_page_cache = None
 
 # Student Routes
 @app.route('/')
 def index():
     """Main assessment page for students"""
+    global _index_page_cache
     init_db_if_needed()
-    return render_template('index.html')
+    
+    # Pages carrying flashed messages are per-user and must not be cached
+    if session.get('_flashes'):
+        return render_template('index.html')
+    
+    if _index_page_cache is None:
+        html = render_template('index.html')
+        _index_page_cache = (html, hashlib.sha1(html.encode('utf-8')).hexdigest())
+    html, etag = _index_page_cache
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/start_session', methods=['POST'])
+@rate_limit('start_session', *START_SESSION_LIMIT, per='ip')
 def start_session():
     """Start a new student assessment session"""
     try:
@@ -439,18 +592,23 @@ def start_session():
         data = request.get_json()
         student_name = data.get('name', '').strip()
         student_grade = data.get('grade', '').strip()
+        assessment_mode = data.get('mode') or ASSESSMENT_MODE
         
         if not student_name or not student_grade:
             return jsonify({'success': False, 'error': 'نام و پایه تحصیلی الزامی است'})
         
+        if assessment_mode not in ASSESSMENT_MODES:
+            return jsonify({'success': False, 'error': 'نوع آزمون نامعتبر است'})
+        
         # Create new student record
         student = Student(
             student_name=student_name,
             student_grade=student_grade,
-            session_start_time=str(db.func.current_timestamp())
+            session_start_time=utc_now()
         )
         db.session.add(student)
         db.session.commit()
+        publish_session_started(current_tenant(), student)
         
         # Store session data
         session['student_id'] = student.id
@@ -458,17 +616,35 @@ def start_session():
         session['current_prerequisite_index'] = 0
         session['score'] = 0
         session['total_questions'] = 0
+        session['progress_version'] = 0
+        session.pop('served_questions', None)
+        session['question_seed'] = secrets.randbits(32)
+        session['assessment_mode'] = assessment_mode
+        if assessment_mode == 'adaptive':
+            session['adaptive_state'] = adaptive.new_state(len(get_prerequisites_for_grade(student_grade)))
         
         # Debug logging for session creation
         logging.info(f"Session created for student {student.id}: {dict(session)}")
         
-        return jsonify({'success': True, 'student_id': student.id})
+        return jsonify({'success': True, 'student_id': student.id, 'mode': assessment_mode})
         
     except Exception as e:
         logging.error(f"Error starting session: {e}")
         return jsonify({'success': False, 'error': 'خطا در شروع جلسه'})
 
+def session_inferred_mastery():
+    """Mastery inferred for prerequisites an adaptive session never asked, or None for linear sessions"""
+    if session.get('assessment_mode') != 'adaptive':
+        return None
+    grade_prerequisites = get_prerequisites_for_grade(session.get('student_grade', 'هفتم'))
+    return adaptive.classify(session['adaptive_state'], grade_prerequisites)
+
+def finalize_session_results():
+    """Store the results snapshot of the session's completed assessment (once) and return it"""
+    return finalize_results(session['student_id'], session_inferred_mastery())
+
 @app.route('/api/get_question', methods=['GET'])
+@rate_limit('student_api', *STUDENT_API_LIMIT, per='session')
 def get_question():
     """Get next question for student"""
     try:
@@ -480,14 +656,15 @@ def get_question():
             logging.error("Session does not contain student_id")
             return jsonify({'success': False, 'error': 'جلسه یافت نشد'})
         
-        prerequisite_index = session.get('current_prerequisite_index', 0)
         student_grade = session.get('student_grade', 'هفتم')
         
         # Get prerequisites for student's grade
         grade_prerequisites = get_prerequisites_for_grade(student_grade)
+        prerequisite_index = get_current_prerequisite_index(grade_prerequisites)
         
         # Check if assessment is complete
-        if prerequisite_index >= len(grade_prerequisites):
+        if prerequisite_index is None:
+            finalize_session_results()
             return jsonify({
                 'success': True, 
                 'completed': True,
@@ -497,15 +674,11 @@ def get_question():
         
         prerequisite = grade_prerequisites[prerequisite_index]
         
-        # Generate question for current prerequisite using new system
-        logging.info(f"Generating new questions for: {prerequisite}")
-        questions = generate_questions(prerequisite, 1)
+        question = get_slot_question(prerequisite, prerequisite_index)
         
-        if not questions:
+        if not question:
             return jsonify({'success': False, 'error': 'خطا در تولید سوال'})
         
-        question = questions[0]
-        
         return jsonify({
             'success': True,
             'question': {
@@ -518,9 +691,224 @@ def get_question():
         logging.error(f"Error getting question: {e}")
         return jsonify({'success': False, 'error': 'خطا در دریافت سوال'})
 
+@app.route('/api/get_questions', methods=['GET'])
+@rate_limit('student_api', *STUDENT_API_LIMIT, per='session')
+def get_questions():
+    """
+    Prefetch the next questions of the session so the client can answer offline.
+    Linear sessions return up to `count` upcoming prerequisites; adaptive sessions
+    only the next one, since later choices depend on the answers.
+    """
+    try:
+        if 'student_id' not in session:
+            return jsonify({'success': False, 'error': 'جلسه یافت نشد'})
+        
+        count = max(1, min(request.args.get('count', 5, type=int), MAX_BATCH_SIZE))
+        grade_prerequisites = get_prerequisites_for_grade(session.get('student_grade', 'هفتم'))
+        prerequisite_index = get_current_prerequisite_index(grade_prerequisites)
+        
+        if prerequisite_index is None:
+            finalize_session_results()
+            return jsonify({
+                'success': True,
+                'completed': True,
+                'questions': [],
+                'score': session.get('score', 0),
+                'total': session.get('total_questions', 0)
+            })
+        
+        if session.get('assessment_mode') == 'adaptive':
+            slots = [prerequisite_index]
+        else:
+            slots = range(prerequisite_index, min(prerequisite_index + count, len(grade_prerequisites)))
+        
+        questions = []
+        for slot in slots:
+            prerequisite = grade_prerequisites[slot]
+            question = get_slot_question(prerequisite, slot)
+            if not question:
+                break
+            questions.append({'slot': slot, 'text': question['text'], 'prerequisite': prerequisite})
+        
+        if not questions:
+            return jsonify({'success': False, 'error': 'خطا در تولید سوال'})
+        
+        return jsonify({'success': True, 'completed': False, 'questions': questions})
+        
+    except Exception as e:
+        logging.error(f"Error prefetching questions: {e}")
+        return jsonify({'success': False, 'error': 'خطا در دریافت سوال'})
+
+# Session keys that track assessment progress
+SESSION_PROGRESS_KEYS = ('current_prerequisite_index', 'score', 'total_questions', 'adaptive_state', 'progress_version')
+# Most questions returned by one prefetch and answers accepted by one batch
+MAX_BATCH_SIZE = 20
+
+def _answer_result(answer_row, client_key=None):
+    """Client result for an answer that was already recorded"""
+    return {
+        'success': True,
+        'key': client_key,
+        'slot': answer_row.slot,
+        'duplicate': True,
+        'correct': answer_row.is_correct == 1,
+        'correct_answer': answer_row.correct_answer,
+        'dont_know': answer_row.is_correct == -1
+    }
+
+def resync_progress(student_id):
+    """Rebuild the session's progress from the answers recorded in the database"""
+    student = db.session.get(Student, student_id)
+    answers = StudentAnswer.query.filter_by(student_id=student_id).order_by(StudentAnswer.id).all()
+    
+    session['total_questions'] = len(answers)
+    session['score'] = sum(1 for a in answers if a.is_correct == 1)
+    session['progress_version'] = student.progress_version if student else len(answers)
+    
+    if session.get('assessment_mode') == 'adaptive':
+        grade_prerequisites = get_prerequisites_for_grade(session.get('student_grade', 'هفتم'))
+        state = adaptive.new_state(len(grade_prerequisites))
+        for a in answers:
+            if a.slot is not None:
+                state = adaptive.record_answer(state, a.slot, a.is_correct == 1)
+        session['adaptive_state'] = state
+        session['current_prerequisite_index'] = len(state['asked'])
+    else:
+        slots = [a.slot for a in answers if a.slot is not None]
+        session['current_prerequisite_index'] = max(slots) + 1 if slots else 0
+
+def record_student_answer(answer, slot=None, client_key=None):
+    """
+    Grade one answer for the session's current prerequisite, advance session progress
+    and stage the StudentAnswer and rollup rows. The caller commits.
+    
+    Safe under retries and concurrent requests for the same session:
+    - a client_key or slot that was already recorded returns the stored result
+    - progress is claimed with an optimistic check on Student.progress_version, so
+      of two requests carrying the same session state only one records an answer
+    - the unique (student_id, slot) index rejects anything that slips through
+    """
+    student_id = session['student_id']
+    student_grade = session.get('student_grade', 'هفتم')
+    
+    if client_key:
+        existing = reads.recorded_answer(student_id, client_key=client_key)
+        if existing:
+            return _answer_result(existing, client_key)
+    
+    if not answer:
+        return {'success': False, 'key': client_key, 'error': 'لطفا پاسخ خود را وارد کنید'}
+    
+    # Get current question info
+    current_prerequisites = get_prerequisites_for_grade(student_grade)
+    prerequisite_index = get_current_prerequisite_index(current_prerequisites)
+    if slot is not None and slot != prerequisite_index:
+        # A retry of an answer whose response was lost
+        existing = reads.recorded_answer(student_id, slot=slot)
+        if existing:
+            return _answer_result(existing, client_key)
+        return {'success': False, 'key': client_key, 'error': 'ترتیب پاسخ‌ها نامعتبر است'}
+    if prerequisite_index is None:
+        return {'success': False, 'key': client_key, 'error': 'آزمون تمام شده است'}
+    
+    current_prerequisite = current_prerequisites[prerequisite_index]
+    
+    # The question that was served for this slot
+    question = get_slot_question(current_prerequisite, prerequisite_index)
+    if not question:
+        return {'success': False, 'key': client_key, 'error': 'خطا در تولید سوال'}
+    
+    correct_answer = question['answer']
+    
+    # Check for "don't know" answer
+    is_dont_know = answer == 'بلد نیستم'
+    
+    # Check if answer is correct (simple string comparison for now)
+    is_correct = False if is_dont_know else answer.lower().strip() == str(correct_answer).lower().strip()
+    answer_value = 1 if is_correct else (-1 if is_dont_know else 0)
+    
+    # Claim this step of the session; fails if another request already advanced it
+    expected_version = session.get('progress_version', 0)
+    claimed = db.session.execute(
+        db.update(Student)
+        .where(Student.id == student_id, Student.progress_version == expected_version)
+        .values(progress_version=expected_version + 1)
+    ).rowcount
+    
+    if claimed:
+        # Save answer to database; ON CONFLICT keeps a duplicate slot a no-op
+        values = {
+            'student_id': student_id,
+            'slot': prerequisite_index,
+            'prerequisite_name': current_prerequisite,
+            'student_answer': answer,
+            'correct_answer': str(correct_answer),
+            'is_correct': answer_value,
+            'answered_at': utc_now(),
+            'client_key': client_key
+        }
+        statement = upsert_insert(StudentAnswer.__table__)
+        if statement is not None:
+            statement = statement.values(**values).on_conflict_do_nothing(index_elements=['student_id', 'slot'])
+        else:
+            statement = StudentAnswer.__table__.insert().values(**values)
+        inserted = db.session.execute(statement).rowcount
+    else:
+        inserted = 0
+    
+    if not inserted:
+        logging.info(f"Concurrent submission for student {student_id} slot {prerequisite_index}, resyncing progress")
+        resync_progress(student_id)
+        existing = reads.recorded_answer(student_id, slot=prerequisite_index)
+        if existing:
+            return _answer_result(existing, client_key)
+        return {'success': False, 'key': client_key, 'error': 'پاسخ هم‌زمان ثبت شد، لطفا دوباره تلاش کنید'}
+    
+    # Update session score (don't count "don't know" as wrong)
+    session['total_questions'] = session.get('total_questions', 0) + 1
+    if is_correct:
+        session['score'] = session.get('score', 0) + 1
+    session['progress_version'] = expected_version + 1
+    
+    # Move to next prerequisite
+    if session.get('assessment_mode') == 'adaptive':
+        session['adaptive_state'] = adaptive.record_answer(session['adaptive_state'], prerequisite_index, is_correct)
+        session['current_prerequisite_index'] = len(session['adaptive_state']['asked'])
+    else:
+        session['current_prerequisite_index'] = prerequisite_index + 1
+    
+    record_answer_rollup(student_grade, current_prerequisite, answer_value, values['answered_at'].date())
+    
+    logging.info(f"Student {student_id} answered '{answer}' for {current_prerequisite}: {'correct' if is_correct else 'incorrect' if not is_dont_know else 'dont_know'}")
+    
+    return {
+        'success': True,
+        'key': client_key,
+        'slot': prerequisite_index,
+        'correct': is_correct,
+        'correct_answer': str(correct_answer),
+        'dont_know': is_dont_know
+    }
+
+def publish_session_progress():
+    """Push the session's answer counts to live admin dashboards"""
+    grade_prerequisites = get_prerequisites_for_grade(session.get('student_grade', 'هفتم'))
+    publish_progress(current_tenant(), session['student_id'], session.get('total_questions', 0),
+                     session.get('score', 0), get_current_prerequisite_index(grade_prerequisites) is None)
+
+def _snapshot_progress():
+    return {key: copy.deepcopy(session.get(key)) for key in SESSION_PROGRESS_KEYS if key in session}
+
+def _restore_progress(snapshot):
+    for key in SESSION_PROGRESS_KEYS:
+        if key in snapshot:
+            session[key] = snapshot[key]
+
 @app.route('/api/submit_answer', methods=['POST'])
+@rate_limit('student_api', *STUDENT_API_LIMIT, per='session')
 def submit_answer():
     """Submit student answer"""
+    snapshot = None
     try:
         if 'student_id' not in session:
             return jsonify({'success': False, 'error': 'جلسه یافت نشد'})
@@ -531,65 +919,66 @@ def submit_answer():
         if not answer:
             return jsonify({'success': False, 'error': 'لطفا پاسخ خود را وارد کنید'})
         
-        student_id = session['student_id']
-        prerequisite_index = session.get('current_prerequisite_index', 0)
-        student_grade = session.get('student_grade', 'هفتم')
-        
-        # Get current question info
-        current_prerequisites = get_prerequisites_for_grade(student_grade)
-        if prerequisite_index >= len(current_prerequisites):
-            return jsonify({'success': False, 'error': 'آزمون تمام شده است'})
-        
-        current_prerequisite = current_prerequisites[prerequisite_index]
-        
-        # Generate or get question for current prerequisite
-        questions = generate_questions(current_prerequisite, 1)
-        if not questions:
-            return jsonify({'success': False, 'error': 'خطا در تولید سوال'})
-        
-        question = questions[0]
-        correct_answer = question['answer']
+        snapshot = _snapshot_progress()
+        result = record_student_answer(answer, data.get('slot'), data.get('key'))
+        if not result['success']:
+            return jsonify(result)
         
-        # Check for "don't know" answer
-        is_dont_know = answer == 'بلد نیستم'
+        db.session.commit()
+        publish_session_progress()
+        return jsonify(result)
         
-        # Check if answer is correct (simple string comparison for now)
-        is_correct = False if is_dont_know else answer.lower().strip() == str(correct_answer).lower().strip()
+    except Exception as e:
+        logging.error(f"Error submitting answer: {e}")
+        db.session.rollback()
+        if snapshot is not None:
+            _restore_progress(snapshot)
+        return jsonify({'success': False, 'error': 'خطا در ثبت پاسخ'})
+
+@app.route('/api/submit_answers', methods=['POST'])
+@rate_limit('student_api', *STUDENT_API_LIMIT, per='session')
+def submit_answers():
+    """
+    Submit a batch of answers in order, persisted in one transaction.
+    Each item is {'slot', 'answer', 'key'}; the idempotency key makes retries safe.
+    Processing stops at the first rejected item; earlier items are still saved.
+    """
+    snapshot = None
+    try:
+        if 'student_id' not in session:
+            return jsonify({'success': False, 'error': 'جلسه یافت نشد'})
         
-        # Update session score (don't count "don't know" as wrong)
-        session['total_questions'] = session.get('total_questions', 0) + 1
-        if is_correct:
-            session['score'] = session.get('score', 0) + 1
+        items = (request.get_json() or {}).get('answers') or []
+        if not isinstance(items, list) or len(items) > MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'error': 'تعداد پاسخ‌ها نامعتبر است'})
         
-        # Move to next prerequisite
-        session['current_prerequisite_index'] = prerequisite_index + 1
+        snapshot = _snapshot_progress()
+        results = []
+        for item in items:
+            result = record_student_answer(str(item.get('answer', '')).strip(), item.get('slot'), item.get('key'))
+            results.append(result)
+            if not result['success']:
+                break
         
-        # Save answer to database
-        answer_value = 1 if is_correct else (-1 if is_dont_know else 0)
-        student_answer = StudentAnswer(
-            student_id=student_id,
-            prerequisite_name=current_prerequisite,
-            student_answer=answer,
-            correct_answer=str(correct_answer),
-            is_correct=answer_value
-        )
-        db.session.add(student_answer)
         db.session.commit()
-        
-        logging.info(f"Student {student_id} answered '{answer}' for {current_prerequisite}: {'correct' if is_correct else 'incorrect' if not is_dont_know else 'dont_know'}")
+        if any(result['success'] for result in results):
+            publish_session_progress()
         
         return jsonify({
-            'success': True,
-            'correct': is_correct,
-            'correct_answer': str(correct_answer),
-            'dont_know': is_dont_know
+            'success': all(result['success'] for result in results),
+            'results': results,
+            'next_slot': session.get('current_prerequisite_index', 0)
         })
         
     except Exception as e:
-        logging.error(f"Error submitting answer: {e}")
-        return jsonify({'success': False, 'error': 'خطا در ثبت پاسخ'})
+        logging.error(f"Error submitting answer batch: {e}")
+        db.session.rollback()
+        if snapshot is not None:
+            _restore_progress(snapshot)
+        return jsonify({'success': False, 'error': 'خطا در ثبت پاسخ‌ها'})
 
 @app.route('/api/get_results', methods=['GET'])
+@rate_limit('student_api', *STUDENT_API_LIMIT, per='session')
 def get_results():
     """Get detailed student results with strengths/weaknesses analysis"""
     try:
@@ -597,74 +986,16 @@ def get_results():
             return jsonify({'success': False, 'error': 'جلسه یافت نشد'})
         
         student_id = session['student_id']
-        score = session.get('score', 0)
-        total = session.get('total_questions', 0)
-        
-        # Get all student answers for analysis
-        answers = StudentAnswer.query.filter_by(student_id=student_id).all()
-        
-        # Analyze strengths and weaknesses
-        strengths = []
-        weaknesses = []
-        
-        # Group answers by prerequisite
-        prerequisite_performance = {}
-        for answer in answers:
-            prereq = answer.prerequisite_name
-            if prereq not in prerequisite_performance:
-                prerequisite_performance[prereq] = {'correct': 0, 'total': 0, 'dont_know': 0}
-            
-            prerequisite_performance[prereq]['total'] += 1
-            if answer.is_correct == 1:
-                prerequisite_performance[prereq]['correct'] += 1
-            elif answer.is_correct == -1:
-                prerequisite_performance[prereq]['dont_know'] += 1
-        
-        # Determine strengths and weaknesses
-        for prereq, performance in prerequisite_performance.items():
-            total_answered = performance['total']
-            correct_answers = performance['correct']
-            dont_know_count = performance['dont_know']
-            
-            # Calculate success rate excluding "don't know" answers
-            # Only count answers where student actually attempted (correct or incorrect)
-            attempted_answers = total_answered - dont_know_count
-            
-            if attempted_answers > 0:
-                success_rate = correct_answers / attempted_answers
-                
-                # Get educational video link
-                video = PrerequisiteVideo.query.filter_by(prerequisite_name=prereq).first()
-                video_link = video.video_url if video else None
-                
-                result_item = {
-                    'prerequisite': prereq,
-                    'correct': correct_answers,
-                    'attempted': attempted_answers,
-                    'total': total_answered,
-                    'dont_know': dont_know_count,
-                    'success_rate': round(success_rate * 100, 1),
-                    'video_link': video_link
-                }
-                
-                # Consider as strength if success rate >= 70%
-                if success_rate >= 0.7:
-                    strengths.append(result_item)
-                else:
-                    weaknesses.append(result_item)
-        
-        # Calculate total attempted (excluding "don't know" answers)
-        total_attempted = len([a for a in answers if a.is_correct != -1])
+        results = load_results(student_id)
+        if results is None:
+            grade_prerequisites = get_prerequisites_for_grade(session.get('student_grade', 'هفتم'))
+            if get_current_prerequisite_index(grade_prerequisites) is None:
+                results = finalize_session_results()
+            if results is None:
+                # Assessment still in progress: report the answers so far without storing them
+                results = live_results(student_id, session_inferred_mastery())
         
-        return jsonify({
-            'success': True,
-            'score': score,
-            'total': total,
-            'attempted': total_attempted,
-            'percentage': round((score / total_attempted * 100) if total_attempted > 0 else 0, 1),
-            'strengths': strengths,
-            'weaknesses': weaknesses
-        })
+        return jsonify({'success': True, **results})
         
     except Exception as e:
         logging.error(f"Error getting results: {e}")
@@ -672,6 +1003,7 @@ def get_results():
 
 # Admin Routes
 @app.route('/admin/login', methods=['GET', 'POST'])
+@rate_limit('admin_login', *ADMIN_LOGIN_LIMIT, per='ip', methods=('POST',))
 def admin_login():
     """Admin login page"""
     init_db_if_needed()
@@ -679,8 +1011,9 @@ def admin_login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+        if check_admin_credentials(current_tenant(), username, password, (ADMIN_USERNAME, ADMIN_PASSWORD)):
             session['admin_logged_in'] = True
+            session['admin_tenant'] = current_tenant()
             return redirect(url_for('admin_dashboard'))
         else:
             flash('نام کاربری یا رمز عبور اشتباه است', 'error')
@@ -691,12 +1024,19 @@ def admin_login():
 def admin_logout():
     """Admin logout"""
     session.pop('admin_logged_in', None)
+    session.pop('admin_tenant', None)
     return redirect(url_for('admin_login'))
 
+# Rows per page of the admin analytics question table
+ANALYTICS_PAGE_SIZE = int(os.environ.get("ANALYTICS_PAGE_SIZE", 50))
+# Snapshot version the stored question analytics were last calculated for, per tenant
+_analytics_calculated_versions = {}
+
 def admin_required(f):
     """Decorator to require admin login"""
     def decorated_function(*args, **kwargs):
-        if not session.get('admin_logged_in'):
+        # An admin session only grants access to the school it logged in to
+        if not session.get('admin_logged_in') or session.get('admin_tenant', DEFAULT_TENANT) != current_tenant():
             return redirect(url_for('admin_login'))
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
@@ -704,54 +1044,166 @@ def admin_required(f):
 
 @app.route('/admin/dashboard')
 @admin_required
+@replica_reads
 def admin_dashboard():
     """Admin dashboard showing student results"""
-    students = Student.query.all()
+    # Taken before the query so the stream replays anything the rows below miss
+    last_event_id = current_event_id()
     
-    # Calculate stats for each student
+    # Completed sessions come from their result snapshots, the rest from one grouped query
     student_stats = []
-    for student in students:
-        answers = StudentAnswer.query.filter_by(student_id=student.id).all()
-        total_answers = len(answers)
-        correct_answers = sum(1 for a in answers if a.is_correct)
+    for student_id, name, grade, start_time, total_answers, correct_answers in dashboard_rows():
         percentage = (correct_answers / total_answers * 100) if total_answers > 0 else 0
         
         student_stats.append({
-            'id': student.id,
-            'name': student.student_name,
-            'grade': student.student_grade,
-            'start_time': student.session_start_time,
+            'id': student_id,
+            'name': name,
+            'grade': grade,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M'),
             'total_questions': total_answers,
             'correct_answers': correct_answers,
             'percentage': round(percentage, 1)
         })
     
-    return render_template('admin/dashboard.html', students=student_stats)
+    return render_template('admin/dashboard.html', students=student_stats, last_event_id=last_event_id,
+                           live_mode=LIVE_UPDATES, poll_interval=LIVE_POLL_INTERVAL)
 
+@app.route('/admin/dashboard/rows')
+@admin_required
+@replica_reads
+def admin_dashboard_rows():
+    """Current dashboard rows, polled by the dashboard when streaming is off (see live_updates.py)"""
+    students = [{'id': student_id, 'name': name, 'grade': grade,
+                 'start_time': start_time.strftime('%Y-%m-%d %H:%M'), 'total': total, 'correct': correct}
+                for student_id, name, grade, start_time, total, correct in dashboard_rows()]
+    return jsonify({'success': True, 'students': students})
+
+@app.route('/admin/dashboard/stream')
+@admission_exempt
+@admin_required
+def admin_dashboard_stream():
+    """Server-Sent Events feed of dashboard deltas (see live_updates.py)"""
+    # Reconnects send Last-Event-ID; the first connect passes the id the page was rendered at
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(event_stream(current_tenant(), last_event_id),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Not @replica_reads: this view writes analytics and then renders them, so it
+# must read its version and results from the primary it just wrote to
 @app.route('/admin/analytics')
 @admin_required
 def admin_analytics():
     """Admin analytics page showing question analysis"""
-    # Update analytics before showing
-    calculate_analytics()
-    
-    questions = Question.query.all()
-    
-    # Prepare questions data with analytics
-    questions_data = []
-    for q in questions:
-        questions_data.append({
-            'id': q.id,
-            'prerequisite_name': q.prerequisite_name,
-            'difficulty_level': q.difficulty_level,
-            'question_text': q.question_text[:100] + '...' if len(q.question_text) > 100 else q.question_text,
-            'correct_answer': q.correct_answer,
-            'times_used': q.times_used,
-            'avg_difficulty_percent': round(q.avg_difficulty_percent or 0, 1),
-            'avg_discrimination_index': round(q.avg_discrimination_index or 0, 3)
-        })
+    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'id')
+    order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+    if sort not in QUESTION_SORT_COLUMNS:
+        sort = 'id'
+    
+    # Update analytics before showing, only when the underlying data changed
+    version = get_analytics_snapshot_version()
+    tenant_id = current_tenant()
+    if version is None or version != _analytics_calculated_versions.get(tenant_id):
+        calculate_analytics()
+        _analytics_calculated_versions[tenant_id] = version
+    
+    # Fragments show the stored avg_* results, so key them by those too
+    results_version = get_analytics_results_version()
+    if version is not None and results_version is not None:
+        version = f"{version}:{results_version}"
+    else:
+        version = None
+    
+    def render_summary():
+        return render_template('admin/_quality_summary.html',
+                               summary=get_question_quality_summary(),
+                               question_count=Question.query.count())
+    
+    def render_table():
+        pagination = get_questions_page(page, ANALYTICS_PAGE_SIZE, sort, order)
+        
+        # Prepare questions data with analytics
+        questions_data = []
+        for q in pagination.items:
+            questions_data.append({
+                'id': q.id,
+                'prerequisite_name': q.prerequisite_name,
+                'difficulty_level': q.difficulty_level,
+                'question_text': q.question_text[:100] + '...' if len(q.question_text) > 100 else q.question_text,
+                'correct_answer': q.correct_answer,
+                'times_used': q.times_used,
+                'avg_difficulty_percent': round(q.avg_difficulty_percent or 0, 1),
+                'avg_discrimination_index': round(q.avg_discrimination_index or 0, 3)
+            })
+        
+        return render_template('admin/_questions_table.html', questions=questions_data,
+                               pagination=pagination, sort=sort, order=order)
+    
+    if version is None:
+        summary_html, table_html = Markup(render_summary()), Markup(render_table())
+    else:
+        summary_html = fragment_cache.get_or_render(('analytics_summary', tenant_id, version), render_summary)
+        table_html = fragment_cache.get_or_render(('analytics_table', tenant_id, version, page, sort, order), render_table)
+    
+    return render_template('admin/analytics.html', summary_html=summary_html, table_html=table_html,
+                           sort=sort, order=order)
+
+@app.route('/admin/api/prerequisite_performance')
+@admin_required
+@replica_reads
+def admin_prerequisite_performance():
+    """Per-prerequisite student outcomes for a grade (optional) over the last N days (optional)"""
+    grade = request.args.get('grade')
+    days = request.args.get('days', type=int)
+    
+    if grade and grade not in GRADE_PREREQUISITES:
+        return jsonify({'success': False, 'error': 'پایه تحصیلی نامعتبر است'})
+    if days is not None and days < 1:
+        return jsonify({'success': False, 'error': 'تعداد روزها باید مثبت باشد'})
+    days = min(days, ANALYTICS_MAX_DAYS) if days else None
+    
+    return jsonify({'success': True, 'grade': grade, 'days': days,
+                    'prerequisites': get_prerequisite_performance(GRADE_PREREQUISITES, grade, days)})
+
+@app.route('/admin/api/weakest_prerequisites')
+@admin_required
+@replica_reads
+def admin_weakest_prerequisites():
+    """Weakest prerequisites for a grade over the last N days"""
+    grade = request.args.get('grade')
+    days = request.args.get('days', type=int)
+    limit = request.args.get('limit', 5, type=int)
+    min_answers = request.args.get('min_answers', 1, type=int)
+    
+    if grade not in GRADE_PREREQUISITES:
+        return jsonify({'success': False, 'error': 'پایه تحصیلی نامعتبر است'})
+    if days is not None and days < 1:
+        return jsonify({'success': False, 'error': 'تعداد روزها باید مثبت باشد'})
+    days = min(days, ANALYTICS_MAX_DAYS) if days else None
+    limit = max(1, limit)
+    min_answers = max(1, min_answers)
     
-    return render_template('admin/analytics.html', questions=questions_data)
+    return jsonify({'success': True, 'grade': grade, 'days': days,
+                    'prerequisites': get_weakest_prerequisites(GRADE_PREREQUISITES, grade, days, limit, min_answers)})
+
+@app.route('/admin/api/profiles')
+@admin_required
+def admin_profiles():
+    """Captured profiles of this process, newest first"""
+    return jsonify({'success': True, 'profiles': list_profiles()})
+
+@app.route('/admin/api/profiles/<name>')
+@admin_required
+def admin_download_profile(name):
+    """Download one captured profile"""
+    path = profile_path(name)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=name)
 
 @app.route('/admin/videos', methods=['GET', 'POST'])
 @admin_required
@@ -778,8 +1230,70 @@ def admin_videos():
     videos = PrerequisiteVideo.query.all()
     return render_template('admin/videos.html', videos=videos, prerequisites=PREREQUISITES)
 
+def _dependency_overrides():
+    """Overrides visible to this school in the order remediation applies them: shared ones, then its own"""
+    return PrerequisiteDependency.query.order_by(
+        PrerequisiteDependency.tenant_id != DEFAULT_TENANT, PrerequisiteDependency.id
+    ).all()
+
+def _own_dependency_overrides():
+    """This school's overrides; shared ones of the default tenant can only be changed by its admins"""
+    return PrerequisiteDependency.query.filter_by(tenant_id=current_tenant())
+
+@app.route('/admin/api/dependencies', methods=['GET', 'POST'])
+@admin_required
+def admin_dependencies():
+    """Effective prerequisite dependencies and admin overrides; POST adds or replaces an override"""
+    if request.method == 'POST':
+        try:
+            data = request.get_json() or {}
+            prerequisite = data.get('prerequisite', '').strip()
+            dependent = data.get('dependent', '').strip()
+            action = data.get('action', 'add')
+            
+            # Validate against the other overrides, as this one replaces the school's own for the same edge
+            tenant_id = current_tenant()
+            others = [(o.prerequisite_name, o.dependent_name, o.action) for o in _dependency_overrides()
+                      if (o.tenant_id, o.prerequisite_name, o.dependent_name) != (tenant_id, prerequisite, dependent)]
+            error = remediation.validate_override(GRADE_PREREQUISITES, prerequisite, dependent, action, others)
+            if error:
+                return jsonify({'success': False, 'error': error})
+            
+            _own_dependency_overrides().filter_by(prerequisite_name=prerequisite, dependent_name=dependent).delete()
+            db.session.add(PrerequisiteDependency(prerequisite_name=prerequisite, dependent_name=dependent, action=action))
+            db.session.commit()
+            remediation.invalidate_graph()
+        except Exception as e:
+            logging.error(f"Error saving prerequisite dependency: {e}")
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'خطا در ذخیره وابستگی'})
+    
+    graph = remediation.dependency_graph()
+    edges = sorted(graph.edges, key=lambda edge: (graph.rank[edge[0]], graph.rank[edge[1]]))
+    overrides = [{'id': o.id, 'prerequisite': o.prerequisite_name, 'dependent': o.dependent_name, 'action': o.action,
+                  'shared': o.tenant_id != current_tenant()}
+                 for o in _dependency_overrides()]
+    return jsonify({'success': True, 'edges': [list(edge) for edge in edges], 'overrides': overrides})
+
+@app.route('/admin/api/dependencies/<int:override_id>', methods=['DELETE'])
+@admin_required
+def admin_delete_dependency(override_id):
+    """Remove an override, restoring the edge from grade ordering"""
+    try:
+        deleted = _own_dependency_overrides().filter_by(id=override_id).delete()
+        db.session.commit()
+        remediation.invalidate_graph()
+        if not deleted:
+            return jsonify({'success': False, 'error': 'وابستگی یافت نشد'})
+        return jsonify({'success': True})
+    except Exception as e:
+        logging.error(f"Error deleting prerequisite dependency: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'خطا در حذف وابستگی'})
+
 @app.route('/admin/generate_questions', methods=['POST'])
 @admin_required
+@rate_limit('generate_questions', *GENERATE_QUESTIONS_LIMIT, per='session')
 def admin_generate_questions():
     """Manually generate questions for a prerequisite"""
     try:
@@ -0,0 +1,304 @@
+"""
+Static asset pipeline
+
+Build step (run at deploy time with `python assets.py`):
+- minifies the app's own JS/CSS and checks the output still has the source's rules
+- fingerprints each file with a content hash (student.3f2a9c1d0b.js)
+- precompresses every output with gzip and, when the brotli package is installed, brotli
+- writes static/dist/manifest.json mapping logical names to fingerprinted files
+
+At runtime, templates call asset_url('js/student.js'). When a manifest exists
+the fingerprinted file is served from /assets/ with a long-lived immutable
+Cache-Control header and the best precompressed variant the client accepts.
+Without a manifest asset_url falls back to the regular /static/ URL.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+from flask import url_for, send_from_directory, request, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSETS = ['js/student.js', 'js/admin.js', 'css/style.css']
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_FOLDER = os.path.join(STATIC_FOLDER, 'dist')
+MANIFEST_PATH = os.path.join(DIST_FOLDER, 'manifest.json')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = None
+
+_CSS_STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.S)
+
+def _css_statements(source: str) -> list:
+    """Split CSS into (text, terminator) pairs on { } ; outside strings, dropping comments"""
+    statements, text, i = [], [], 0
+    while i < len(source):
+        char = source[i]
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = len(source) if end == -1 else end + 2
+            text.append(' ')
+            continue
+        if char in '"\'':
+            match = _CSS_STRING.match(source, i)
+            literal = match.group(0) if match else source[i:]
+            text.append(literal)
+            i += len(literal)
+            continue
+        if char in '{};':
+            statements.append((''.join(text), char))
+            text = []
+        else:
+            text.append(char)
+        i += 1
+    if ''.join(text).strip():
+        statements.append((''.join(text), ''))
+    return statements
+
+def _outside_strings(text: str, transform) -> str:
+    """Apply transform to the parts of text that are not CSS string literals"""
+    parts, last = [], 0
+    for match in _CSS_STRING.finditer(text):
+        parts.append(transform(text[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(transform(text[last:]))
+    return ''.join(parts).strip()
+
+def _collapse_selector(text: str) -> str:
+    # Only combinator commas and '>' lose their spaces; 'a :hover' keeps the descendant space
+    return re.sub(r'\s*([,>])\s*', r'\1', re.sub(r'\s+', ' ', text))
+
+def _collapse_declaration(text: str) -> str:
+    return re.sub(r'\s*([:,])\s*', r'\1', re.sub(r'\s+', ' ', text))
+
+def minify_css(source: str) -> str:
+    """Strip comments and insignificant whitespace from CSS"""
+    output = []
+    for text, terminator in _css_statements(source):
+        if terminator == '{':
+            text = _outside_strings(text, _collapse_selector)
+        else:
+            text = _outside_strings(text, _collapse_declaration)
+        if terminator == '}' and not text and output and output[-1].endswith(';'):
+            output[-1] = output[-1][:-1]
+        if terminator == ';' and not text:
+            continue
+        output.append(text + terminator)
+    return ''.join(output)
+
+def css_rules(source: str) -> list:
+    """Selectors, declarations and block boundaries of a stylesheet, whitespace-normalised"""
+    rules = []
+    for text, terminator in _css_statements(source):
+        text = _outside_strings(text, lambda part: re.sub(r'\s+', ' ', part))
+        if terminator == '{':
+            rules.append(('block', _outside_strings(text, lambda part: re.sub(r' ?([,>]) ?', r'\1', part))))
+        elif text:
+            prop, _, value = text.partition(':')
+            value = _outside_strings(value, lambda part: re.sub(r' ?, ?', ',', part))
+            rules.append(('decl', prop.strip().lower(), value))
+        if terminator == '}':
+            rules.append(('end',))
+    return rules
+
+_JS_LITERALS = ('"', "'", '`')
+
+def _scan_js(source: str):
+    """
+    Walk JS source tracking strings, template literals (with ${} nesting) and comments.
+    Returns the literal texts in order and, per line, whether it starts and ends
+    inside a string or template literal.
+    """
+    literals, line_states = [], []
+    stack = ['code']  # 'code' frames hold a brace depth for ${} nesting
+    depths = [0]
+    current = None  # (quote, start index) of the open literal piece
+    line_start_open = False
+    i = 0
+    while i < len(source):
+        char = source[i]
+        mode = stack[-1]
+        if char == '\n':
+            if mode == 'line-comment':
+                stack.pop()
+            is_open = stack[-1] in _JS_LITERALS
+            line_states.append((line_start_open, is_open))
+            line_start_open = is_open
+            i += 1
+            continue
+        if mode == 'line-comment':
+            i += 1
+        elif mode == 'block-comment':
+            if source.startswith('*/', i):
+                stack.pop()
+                i += 2
+            else:
+                i += 1
+        elif mode in ('"', "'"):
+            if char == '\\':
+                i += 2
+                continue
+            if char == mode:
+                literals.append(source[current:i + 1])
+                current = None
+                stack.pop()
+            i += 1
+        elif mode == '`':
+            if char == '\\':
+                i += 2
+                continue
+            if char == '`' or source.startswith('${', i):
+                literals.append(source[current:i + 1])
+                current = None
+                if char == '`':
+                    stack.pop()
+                    i += 1
+                else:
+                    stack.append('code')
+                    depths.append(0)
+                    i += 2
+                continue
+            i += 1
+        else:
+            if source.startswith('//', i):
+                stack.append('line-comment')
+                i += 2
+                continue
+            if source.startswith('/*', i):
+                stack.append('block-comment')
+                i += 2
+                continue
+            if char in '"\'`':
+                stack.append(char)
+                current = i
+            elif char == '{':
+                depths[-1] += 1
+            elif char == '}':
+                if depths[-1] == 0 and len(stack) > 1:
+                    stack.pop()
+                    depths.pop()
+                    current = i
+                else:
+                    depths[-1] -= 1
+            i += 1
+    line_states.append((line_start_open, stack[-1] in _JS_LITERALS))
+    return literals, line_states
+
+def minify_js(source: str) -> str:
+    """
+    Conservative JS minifier: drops full-line comments, indentation and blank lines.
+    Lines that begin or end inside a string or template literal keep their
+    whitespace, so literal contents are never changed.
+    """
+    _, line_states = _scan_js(source)
+    lines = []
+    for line, (starts_open, ends_open) in zip(source.split('\n'), line_states):
+        if starts_open:
+            lines.append(line)
+            continue
+        stripped = line.lstrip() if ends_open else line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+def verify_minified(logical_name: str, source: str, minified: str):
+    """Raise ValueError when minification changed a stylesheet's rules or a script's literals"""
+    if logical_name.endswith('.css'):
+        same = css_rules(source) == css_rules(minified)
+    else:
+        same = _scan_js(source)[0] == _scan_js(minified)[0]
+    if not same:
+        raise ValueError(f"Minified {logical_name} does not match its source")
+
+def _fingerprinted_name(logical_name: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:10]
+    base, ext = os.path.splitext(logical_name)
+    return f"{base}.{digest}{ext}"
+
+def build_assets(static_folder=STATIC_FOLDER, dist_folder=DIST_FOLDER) -> dict:
+    """Minify, fingerprint and precompress ASSETS into dist_folder; returns the manifest"""
+    manifest = {}
+    for logical_name in ASSETS:
+        with open(os.path.join(static_folder, logical_name), encoding='utf-8') as f:
+            source = f.read()
+
+        minified = minify_css(source) if logical_name.endswith('.css') else minify_js(source)
+        verify_minified(logical_name, source, minified)
+        content = minified.encode('utf-8')
+        output_name = _fingerprinted_name(logical_name, content)
+        output_path = os.path.join(dist_folder, output_name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        with open(output_path, 'wb') as f:
+            f.write(content)
+        with open(output_path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(output_path + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+
+        manifest[logical_name] = output_name
+        logging.info(f"Built {logical_name} -> {output_name} ({len(source)} -> {len(content)} bytes)")
+
+    with open(os.path.join(dist_folder, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+def load_manifest() -> dict:
+    """Read the build manifest once per process; empty when assets were not built"""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH, encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+def asset_url(filename: str) -> str:
+    """URL of the built asset for filename, or the plain static URL when not built"""
+    built = load_manifest().get(filename)
+    if built:
+        return url_for('serve_asset', filename=built)
+    return url_for('static', filename=filename)
+
+def serve_asset(filename):
+    """Serve a fingerprinted asset, preferring a precompressed variant the client accepts"""
+    if not os.path.isfile(os.path.join(DIST_FOLDER, filename)):
+        abort(404)
+
+    accepted = request.accept_encodings
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[candidate] and os.path.isfile(os.path.join(DIST_FOLDER, filename + suffix)):
+            encoding, filename_on_disk = candidate, filename + suffix
+            break
+
+    if encoding:
+        mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+        response = send_from_directory(DIST_FOLDER, filename_on_disk, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(DIST_FOLDER, filename)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_assets(app):
+    """Register the /assets/ route and the asset_url template helper"""
+    app.add_url_rule('/assets/<path:filename>', 'serve_asset', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build_assets()
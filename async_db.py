@@ -0,0 +1,105 @@
+"""
+Async database access for the ASGI entry point (asgi.py)
+
+Every engine Flask-SQLAlchemy creates gets an async twin on the matching
+asyncio driver (aiosqlite for SQLite, asyncpg for PostgreSQL). Requests that
+asgi.py serves on the event loop run the ordinary Flask view inside
+run_async(), SQLAlchemy's greenlet bridge: RoutingSession hands those
+requests the twin, so each query awaits the driver instead of blocking a
+thread, while the models, tenancy filter and view code stay the same. Other
+code, such as background threads, CLIs and views asgi.py runs on threads,
+keeps the regular sync engines.
+
+Direct db.engine users (the 'sql' session and rate limit stores) stay
+synchronous. They are short single-row statements.
+
+Importing this module needs neither greenlet nor the async drivers, so
+main:app under gunicorn does not depend on them; they are loaded by
+init_async_db() and run_async(), which only asgi.py calls.
+"""
+import os
+import logging
+from contextvars import ContextVar
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 10))
+ASYNC_SQLITE_BUSY_TIMEOUT = float(os.environ.get('ASYNC_SQLITE_BUSY_TIMEOUT', 30))
+
+_running_async = ContextVar('running_async', default=False)
+# Sync engine -> its AsyncEngine twin
+_twins = {}
+
+def running_async():
+    """Whether the current code runs inside run_async(), where await_only() may be used"""
+    return _running_async.get()
+
+async def run_async(fn, *args, **kwargs):
+    """Run sync fn on the event loop, with database I/O (and await_only calls) awaited instead of blocking"""
+    from sqlalchemy.util import greenlet_spawn
+
+    token = _running_async.set(True)
+    try:
+        return await greenlet_spawn(fn, *args, **kwargs)
+    finally:
+        _running_async.reset(token)
+
+def async_engine_args(url, options=None):
+    """(url, engine options) of the async driver for a sync engine's URL and options"""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend} databases")
+    options = dict(options or {})
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+
+    if backend == 'postgresql':
+        # asyncpg names libpq's sslmode and connect_timeout differently
+        query = dict(url.query)
+        connect_args = dict(options.pop('connect_args', {}))
+        sslmode = query.pop('sslmode', None)
+        sslmode = connect_args.pop('sslmode', sslmode)
+        if sslmode:
+            connect_args['ssl'] = sslmode
+        if 'connect_timeout' in connect_args:
+            connect_args['timeout'] = connect_args.pop('connect_timeout')
+        url = url.set(query=query)
+        options['connect_args'] = connect_args
+
+    if backend == 'sqlite':
+        # Writers on other pooled connections wait for SQLite's lock on aiosqlite's thread, not the event loop
+        connect_args = dict(options.get('connect_args', {}))
+        connect_args.setdefault('timeout', ASYNC_SQLITE_BUSY_TIMEOUT)
+        options['connect_args'] = connect_args
+    options.setdefault('pool_size', ASYNC_DB_POOL_SIZE)
+    options.setdefault('max_overflow', ASYNC_DB_MAX_OVERFLOW)
+    return url, options
+
+def init_async_db(app):
+    """Create the async twin of each of the app's engines"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from replica import RoutingSession
+
+    db = app.extensions['sqlalchemy']
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    # aiosqlite logs every statement twice at DEBUG, which the app's root logger would emit
+    logging.getLogger('aiosqlite').setLevel(logging.INFO)
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine in _twins:
+                continue
+            url, engine_options = async_engine_args(engine.url, options)
+            _twins[engine] = create_async_engine(url, **engine_options)
+            logging.info(f"Async database driver {url.drivername} for bind {bind_key or 'default'}")
+    RoutingSession.bind_hook = staticmethod(bind_for)
+
+def bind_for(engine):
+    """The engine a session should use: the async twin inside run_async(), engine itself otherwise"""
+    if not _running_async.get():
+        return engine
+    twin = _twins.get(engine)
+    return twin.sync_engine if twin is not None else engine
+
+async def dispose():
+    """Close the async pools (on ASGI shutdown)"""
+    for twin in _twins.values():
+        await twin.dispose()
@@ -0,0 +1,339 @@
+"""
+Columnar cold storage for old sessions
+
+Sessions whose last answer is older than COLD_STORAGE_AFTER_DAYS are moved
+out of student_answers and student_answers_archive into immutable segment
+directories under COLD_STORAGE_DIR/<tenant>/ (default: cold_storage/ in the
+Flask instance folder). Each segment stores one NumPy
+array per column, sorted by student, with the repeated strings
+(prerequisite, grade, answers) dictionary-encoded as small integer codes:
+
+    student_id.npy  id.npy  slot.npy  is_correct.npy  answered_at.npy (µs since epoch)
+    prerequisite.npy  grade.npy  student_answer.npy  correct_answer.npy  (codes)
+    meta.json  (dictionaries, row count, time and student ranges)
+
+Readers open the arrays memory-mapped, so only the pages a query touches are
+read. reads.answer_outcomes, the dashboard's answer totals and
+analytics.rebuild_answer_rollups add the cold rows to the database rows
+transparently. Student rows and result snapshots stay in the database.
+
+Segments are local files: on multiple hosts, COLD_STORAGE_DIR must be
+shared storage. Requires NumPy (`uv sync --extra cold-storage`); compaction,
+and reads while segments exist, raise ColdStorageUnavailable without it
+rather than silently dropping the cold answers.
+
+    python cold_storage.py [--days N] [--purge RETENTION_DAYS] [--stats]
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, func, union_all
+from models import db, Student, StudentAnswer, StudentAnswerArchive, utc_now
+from tenancy import current_tenant
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Unset: cold_storage/ inside the app's instance folder
+COLD_STORAGE_DIR = os.environ.get('COLD_STORAGE_DIR')
+COLD_STORAGE_AFTER_DAYS = int(os.environ.get('COLD_STORAGE_AFTER_DAYS', 180))
+COLD_SEGMENT_STUDENTS = int(os.environ.get('COLD_SEGMENT_STUDENTS', 20000))
+
+NUMERIC_COLUMNS = {
+    'student_id': 'int64',
+    'id': 'int64',
+    'slot': 'int32',          # -1 for answers recorded before slots existed
+    'is_correct': 'int8',
+    'answered_at': 'int64',
+}
+ENCODED_COLUMNS = ('prerequisite', 'grade', 'student_answer', 'correct_answer')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class ColdStorageUnavailable(RuntimeError):
+    """NumPy is missing, so cold segments can be neither written nor read"""
+
+def _to_micros(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int((moment - _EPOCH) / timedelta(microseconds=1))
+
+def _from_micros(micros):
+    return _EPOCH + timedelta(microseconds=int(micros))
+
+def encode(values):
+    """(codes, dictionary) with dictionary in first-seen order"""
+    dictionary, codes = {}, []
+    for value in values:
+        codes.append(dictionary.setdefault(value, len(dictionary)))
+    dtype = 'uint8' if len(dictionary) <= 0xFF else 'uint16' if len(dictionary) <= 0xFFFF else 'uint32'
+    return np.array(codes, dtype=dtype), list(dictionary)
+
+class Segment:
+    """One memory-mapped segment; arrays are opened on first access"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._arrays = {}
+        self._student_totals = None
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def dictionary(self, name):
+        return self.meta['dictionaries'][name]
+
+    def student_range(self, student_id):
+        """Row slice of one student (rows are sorted by student)"""
+        if not self.meta['min_student_id'] <= student_id <= self.meta['max_student_id']:
+            return slice(0, 0)
+        students = self.column('student_id')
+        return slice(int(np.searchsorted(students, student_id, 'left')),
+                     int(np.searchsorted(students, student_id, 'right')))
+
+    def student_totals(self):
+        """(student ids, answers, correct answers) per student; cached since segments never change"""
+        if self._student_totals is None:
+            students = self.column('student_id')
+            ids, starts, counts = np.unique(students, return_index=True, return_counts=True)
+            correct = np.add.reduceat((self.column('is_correct') == 1).astype('int64'), starts) if len(ids) else counts
+            self._student_totals = (ids, counts, correct)
+        return self._student_totals
+
+_segments = {}
+_segments_lock = threading.Lock()
+
+def storage_dir(directory=None):
+    """Root of the segment directories, anchored to the instance folder unless configured"""
+    return directory or COLD_STORAGE_DIR or os.path.join(current_app.instance_path, 'cold_storage')
+
+def _tenant_dir(tenant_id, directory=None):
+    return os.path.join(storage_dir(directory), tenant_id)
+
+def segments(tenant_id=None, directory=None):
+    """Segments of a tenant (the current one by default), oldest first"""
+    tenant_dir = _tenant_dir(tenant_id or current_tenant(), directory)
+    if not os.path.isdir(tenant_dir):
+        return []
+    names = sorted(name for name in os.listdir(tenant_dir) if not name.startswith('.'))
+    if names and np is None:
+        raise ColdStorageUnavailable(f"{tenant_dir} holds cold segments but NumPy is not installed")
+    found = []
+    with _segments_lock:
+        for name in names:
+            path = os.path.join(tenant_dir, name)
+            if path not in _segments:
+                try:
+                    _segments[path] = Segment(path)
+                except (OSError, ValueError) as e:
+                    logging.error(f"Skipping unreadable cold segment {path}: {e}")
+                    continue
+            found.append(_segments[path])
+    return found
+
+def answer_outcomes(student_id, tenant_id=None):
+    """[(prerequisite_name, is_correct)] of a student's cold answers in answer order"""
+    outcomes = []
+    for segment in segments(tenant_id):
+        rows = segment.student_range(student_id)
+        if rows.stop == rows.start:
+            continue
+        prerequisites = segment.dictionary('prerequisite')
+        order = np.argsort(segment.column('id')[rows], kind='stable')
+        codes = segment.column('prerequisite')[rows][order]
+        outcomes.extend(zip((prerequisites[code] for code in codes.tolist()),
+                            segment.column('is_correct')[rows][order].tolist()))
+    return outcomes
+
+def student_totals(tenant_id=None):
+    """{student_id: (answers, correct)} over the cold segments"""
+    totals = {}
+    for segment in segments(tenant_id):
+        for student_id, answers, correct in zip(*(array.tolist() for array in segment.student_totals())):
+            previous = totals.get(student_id, (0, 0))
+            totals[student_id] = (previous[0] + answers, previous[1] + correct)
+    return totals
+
+def daily_rollups(tenant_id=None):
+    """{(grade, prerequisite, day): [answers, correct, incorrect, dont_know]} over the cold segments"""
+    rollups = {}
+    for segment in segments(tenant_id):
+        if not len(segment):
+            continue
+        day = segment.column('answered_at') // 86_400_000_000
+        keys = np.stack([segment.column('grade').astype('int64'), segment.column('prerequisite').astype('int64'), day])
+        unique_keys, inverse = np.unique(keys, axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        is_correct = segment.column('is_correct')
+        counts = [np.bincount(inverse, weights=weights, minlength=unique_keys.shape[1])
+                  for weights in (None, is_correct == 1, is_correct == 0, is_correct == -1)]
+        grades, prerequisites = segment.dictionary('grade'), segment.dictionary('prerequisite')
+        for i, (grade, prerequisite, days) in enumerate(unique_keys.T.tolist()):
+            key = (grades[grade], prerequisites[prerequisite], (_EPOCH + timedelta(days=days)).date())
+            totals = rollups.setdefault(key, [0, 0, 0, 0])
+            for j in range(4):
+                totals[j] += int(counts[j][i])
+    return rollups
+
+def _write_segment(tenant_dir, rows):
+    """Write rows (sorted by student_id, id) as a new segment directory. Returns its path."""
+    os.makedirs(tenant_dir, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{rows[0]['student_id']}-{rows[-1]['student_id']}"
+    staging = os.path.join(tenant_dir, f".{name}")
+    os.makedirs(staging)
+
+    meta = {
+        'rows': len(rows),
+        'created_at': utc_now().isoformat(),
+        'min_student_id': rows[0]['student_id'],
+        'max_student_id': rows[-1]['student_id'],
+        'min_answered_at': min(row['answered_at'] for row in rows),
+        'max_answered_at': max(row['answered_at'] for row in rows),
+        'dictionaries': {},
+    }
+    for column, dtype in NUMERIC_COLUMNS.items():
+        np.save(os.path.join(staging, f"{column}.npy"), np.array([row[column] for row in rows], dtype=dtype))
+    for column in ENCODED_COLUMNS:
+        codes, dictionary = encode(row[column] for row in rows)
+        np.save(os.path.join(staging, f"{column}.npy"), codes)
+        meta['dictionaries'][column] = dictionary
+    meta['min_answered_at'] = _from_micros(meta['min_answered_at']).isoformat()
+    meta['max_answered_at'] = _from_micros(meta['max_answered_at']).isoformat()
+    with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # Readers never see a partly written segment
+    path = os.path.join(tenant_dir, name)
+    os.rename(staging, path)
+    return path
+
+def cold_session_ids(cutoff, tenant_id):
+    """Students of the tenant whose last answer (hot or archived) is before cutoff"""
+    hot, archive = StudentAnswer.__table__, StudentAnswerArchive.__table__
+    answers = union_all(
+        select(hot.c.student_id, hot.c.answered_at).where(hot.c.tenant_id == tenant_id),
+        select(archive.c.student_id, archive.c.answered_at).where(archive.c.tenant_id == tenant_id),
+    ).subquery()
+    return db.session.execute(
+        select(answers.c.student_id)
+        .group_by(answers.c.student_id)
+        .having(func.max(answers.c.answered_at) < cutoff)
+        .order_by(answers.c.student_id)
+    ).scalars().all()
+
+def _session_rows(student_ids, tenant_id):
+    hot, archive, students = StudentAnswer.__table__, StudentAnswerArchive.__table__, Student.__table__
+
+    def rows_of(table):
+        return (select(table.c.student_id, table.c.id, table.c.slot, table.c.is_correct, table.c.answered_at,
+                       table.c.prerequisite_name, students.c.student_grade,
+                       table.c.student_answer, table.c.correct_answer)
+                .join(students, students.c.id == table.c.student_id)
+                .where(table.c.tenant_id == tenant_id, table.c.student_id.in_(student_ids)))
+
+    rows = db.session.execute(union_all(rows_of(hot), rows_of(archive))).all()
+    rows = sorted(rows, key=lambda row: (row[0], row[1]))
+    return [{
+        'student_id': student_id, 'id': answer_id, 'slot': -1 if slot is None else slot,
+        'is_correct': is_correct, 'answered_at': _to_micros(_as_datetime(answered_at)),
+        'prerequisite': prerequisite, 'grade': grade,
+        'student_answer': student_answer or '', 'correct_answer': correct_answer or '',
+    } for student_id, answer_id, slot, is_correct, answered_at, prerequisite, grade, student_answer, correct_answer in rows]
+
+def _as_datetime(value):
+    # SQLite returns raw text from compound selects
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def compact_sessions(older_than_days=COLD_STORAGE_AFTER_DAYS, tenant_id=None, segment_students=COLD_SEGMENT_STUDENTS,
+                     directory=None):
+    """Move the tenant's sessions idle for older_than_days into new segments. Returns answers moved."""
+    if np is None:
+        raise ColdStorageUnavailable("NumPy is required for cold storage compaction")
+    tenant_id = tenant_id or current_tenant()
+    tenant_dir = _tenant_dir(tenant_id, directory)
+    cutoff = utc_now() - timedelta(days=older_than_days)
+    hot, archive = StudentAnswer.__table__, StudentAnswerArchive.__table__
+    moved = 0
+
+    student_ids = cold_session_ids(cutoff, tenant_id)
+    for i in range(0, len(student_ids), segment_students):
+        batch = student_ids[i:i + segment_students]
+        rows = _session_rows(batch, tenant_id)
+        if not rows:
+            continue
+        path = _write_segment(tenant_dir, rows)
+        try:
+            for table in (hot, archive):
+                for j in range(0, len(batch), 1000):
+                    db.session.execute(table.delete().where(table.c.tenant_id == tenant_id,
+                                                            table.c.student_id.in_(batch[j:j + 1000])))
+            db.session.commit()
+            moved += len(rows)
+        except Exception as e:
+            # The rows stay in the database; drop the segment so they are not counted twice
+            logging.error(f"Error removing compacted answers, discarding segment {path}: {e}")
+            db.session.rollback()
+            shutil.rmtree(path, ignore_errors=True)
+            break
+
+    logging.info(f"Compacted {moved} answers of {len(student_ids)} sessions idle for {older_than_days} days")
+    return moved
+
+def purge_segments(retention_days, tenant_id=None, directory=None):
+    """Delete segments whose newest answer is older than the retention period. Returns segments removed."""
+    cutoff = utc_now() - timedelta(days=retention_days)
+    removed = 0
+    for segment in segments(tenant_id, directory):
+        if datetime.fromisoformat(segment.meta['max_answered_at']) < cutoff:
+            with _segments_lock:
+                _segments.pop(segment.path, None)
+            shutil.rmtree(segment.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+def stats(tenant_id=None, directory=None):
+    """Segment count, rows and bytes on disk"""
+    found = segments(tenant_id, directory)
+    size = sum(os.path.getsize(os.path.join(segment.path, name))
+               for segment in found for name in os.listdir(segment.path))
+    return {'segments': len(found), 'rows': sum(len(segment) for segment in found), 'bytes': size}
+
+if __name__ == '__main__':
+    import argparse
+    from app import app, init_db_if_needed
+    from tenancy import tenant_scope
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=COLD_STORAGE_AFTER_DAYS, help='compact sessions idle this long')
+    parser.add_argument('--purge', type=int, help='delete segments older than this many days')
+    parser.add_argument('--stats', action='store_true', help='only report segment sizes')
+    parser.add_argument('--tenant', action='append', help='tenant to process (repeatable; all with data by default)')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        init_db_if_needed()
+        tenants = args.tenant or db.session.execute(
+            select(Student.tenant_id).distinct().execution_options(all_tenants=True)
+        ).scalars().all()
+        for tenant_id in tenants:
+            with tenant_scope(tenant_id):
+                if not args.stats:
+                    print(f"{tenant_id}: compacted {compact_sessions(args.days)} answers")
+                    if args.purge is not None:
+                        print(f"{tenant_id}: purged {purge_segments(args.purge)} segments")
+                print(f"{tenant_id}: {stats()}")
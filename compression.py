@@ -0,0 +1,59 @@
+"""
+Negotiated response compression for API endpoints
+
+JSON responses under /api/ larger than COMPRESSION_MIN_SIZE bytes are
+compressed with brotli (when the brotli package is installed) or gzip,
+depending on the client's Accept-Encoding.
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_PREFIXES = ('/api/',)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress data with the given content-coding ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+def choose_encoding(accept_encodings):
+    """Best supported content-coding from a parsed Accept-Encoding header, or None"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """after_request hook compressing eligible API responses"""
+    from flask import request
+
+    if not request.path.startswith(COMPRESSION_PREFIXES):
+        return response
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype != 'application/json':
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """Register response compression on the app"""
+    app.after_request(compress_response)
@@ -0,0 +1,40 @@
+"""
+Cache for rendered template fragments
+
+Fragments are keyed by a caller-supplied tuple that must include a data
+version (for example the analytics snapshot version), so stale entries are
+never served and simply age out of the LRU.
+"""
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+class FragmentCache:
+    """Thread-safe LRU of rendered HTML fragments"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        """Return the cached fragment for key, calling render() to build it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        html = Markup(render())
+
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fragment_cache = FragmentCache()
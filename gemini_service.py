@@ -4,7 +4,9 @@ import logging
 import google.genai as genai
 from google.genai import types
 from models import db, Question
+from question_dedup import find_near_duplicate
 from pydantic import BaseModel
+from async_db import running_async
 from typing import List, Dict
 
 # Initialize Gemini client
@@ -73,7 +75,7 @@ def generate_questions_from_ai(prerequisite_name: str) -> bool:
         لطفاً فقط به صورت JSON پاسخ دهید و هیچ توضیح اضافی ندهید.
         """
         
-        response = client.models.generate_content(
+        request = dict(
             model="gemini-2.5-flash",
             contents=[
                 types.Content(role="user", parts=[types.Part(text=prompt)])
@@ -84,6 +86,12 @@ def generate_questions_from_ai(prerequisite_name: str) -> bool:
                 response_schema=QuestionSet,
             ),
         )
+        if running_async():
+            # Served by asgi.py: wait for Gemini on the event loop instead of blocking it
+            from sqlalchemy.util import await_only
+            response = await_only(client.aio.models.generate_content(**request))
+        else:
+            response = client.models.generate_content(**request)
         
         if not response.text:
             logging.error("Empty response from Gemini API")
@@ -102,12 +110,19 @@ def generate_questions_from_ai(prerequisite_name: str) -> bool:
         questions_added = 0
         for q_data in question_set.questions:
             try:
-                # Check if question already exists
-                existing = Question.query.filter_by(question_text=q_data.question_text).first()
+                # Check if question already exists (question_text is unique across all schools)
+                existing = Question.query.filter_by(question_text=q_data.question_text)\
+                    .execution_options(all_tenants=True).first()
                 if existing:
                     logging.info(f"Question already exists: {q_data.question_text[:50]}...")
                     continue
                 
+                # Reject rewordings of an existing question
+                duplicate_id = find_near_duplicate(q_data.question_text)
+                if duplicate_id:
+                    logging.info(f"Question is a near-duplicate of question {duplicate_id}: {q_data.question_text[:50]}...")
+                    continue
+                
                 question = Question(
                     prerequisite_name=prerequisite_name,
                     difficulty_level=q_data.difficulty_level,
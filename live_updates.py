@@ -0,0 +1,178 @@
+"""
+Live admin dashboard updates over Server-Sent Events
+
+start_session and the answer endpoints publish small deltas to an in-process
+broker once their transaction commits:
+    session   {id, name, grade, start_time}         a new student row
+    progress  {id, total, correct, completed}       updated answer counts
+The admin dashboard subscribes at /admin/dashboard/stream and patches its
+table in place, so the server never recomputes the whole dashboard. The page
+is rendered with the broker's last event id, which the first connect passes
+as ?last_event_id= so events published while the page loaded are replayed.
+
+The broker lives in process memory, so a stream only sees sessions served by
+the same worker process. SSE is therefore opt-in: set LIVE_UPDATES=sse only
+when the app runs as a single process (one gunicorn worker with --threads,
+one instance). Otherwise, including the autoscale deployment, the dashboard
+polls /admin/dashboard/rows every LIVE_POLL_INTERVAL seconds.
+
+Each stream occupies one worker thread, so at most SSE_MAX_STREAMS are open
+at once (the rest are told to poll) and each ends after SSE_MAX_DURATION
+seconds, when the browser reconnects and resumes from Last-Event-ID out of the
+last SSE_BACKLOG events. When the events it missed are no longer available
+(or it reconnected to another process) the client is told to reload the page
+instead.
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import threading
+from collections import deque, defaultdict
+
+# 'sse' streams from the in-process broker (single process only); 'poll' re-reads the table
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', 'poll')
+LIVE_POLL_INTERVAL = int(os.environ.get('LIVE_POLL_INTERVAL', 10))
+# Open streams per process; keeps dashboards from taking the threads student requests need
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 2))
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', 300))
+SSE_BACKLOG = int(os.environ.get('SSE_BACKLOG', 1000))
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 1000))
+SSE_RETRY_MS = 3000
+
+class Subscriber:
+    """One open stream: a bounded queue of (event_id, event, data)"""
+
+    def __init__(self, queue_size=SSE_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # A stalled client; it reloads rather than showing a table with gaps
+            self.overflowed = True
+
+class DashboardBroker:
+    """Per-tenant pub/sub with a short replay backlog"""
+
+    def __init__(self, backlog=SSE_BACKLOG):
+        # Event ids are unique to this process, so a reconnect to another process is detected
+        self.stream_id = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._backlog = deque(maxlen=backlog)
+        self._subscribers = defaultdict(set)
+
+    def publish(self, tenant_id, event, data):
+        with self._lock:
+            self._sequence += 1
+            message = (f"{self.stream_id}-{self._sequence}", event, data)
+            self._backlog.append((tenant_id, self._sequence, message))
+            for subscriber in self._subscribers.get(tenant_id, ()):
+                subscriber.put(message)
+
+    def last_event_id(self):
+        """Id of the newest event published so far; subscribing with it replays everything after"""
+        with self._lock:
+            return f"{self.stream_id}-{self._sequence}"
+
+    def subscribe(self, tenant_id, last_event_id=None, max_streams=None):
+        """
+        Register a stream, queueing the backlog after last_event_id. Returns
+        (subscriber, in_sync), or (None, False) when max_streams are already open.
+        """
+        subscriber = Subscriber()
+        with self._lock:
+            if max_streams is not None and sum(len(s) for s in self._subscribers.values()) >= max_streams:
+                return None, False
+            in_sync = True
+            if last_event_id:
+                stream_id, _, sequence = last_event_id.partition('-')
+                sequence = int(sequence) if sequence.isdigit() else -1
+                oldest = self._backlog[0][1] if self._backlog else self._sequence + 1
+                if stream_id != self.stream_id or sequence < 0 or sequence + 1 < oldest:
+                    in_sync = False
+                else:
+                    for event_tenant, event_sequence, message in self._backlog:
+                        if event_tenant == tenant_id and event_sequence > sequence:
+                            subscriber.put(message)
+            self._subscribers[tenant_id].add(subscriber)
+        return subscriber, in_sync
+
+    def unsubscribe(self, tenant_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(tenant_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[tenant_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+broker = DashboardBroker()
+
+def current_event_id():
+    return broker.last_event_id()
+
+def format_event(event, data=None, event_id=None):
+    """One SSE message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+def publish_session_started(tenant_id, student):
+    broker.publish(tenant_id, 'session', {
+        'id': student.id,
+        'name': student.student_name,
+        'grade': student.student_grade,
+        'start_time': student.session_start_time.strftime('%Y-%m-%d %H:%M'),
+    })
+
+def publish_progress(tenant_id, student_id, total, correct, completed=False):
+    broker.publish(tenant_id, 'progress', {
+        'id': student_id,
+        'total': total,
+        'correct': correct,
+        'completed': completed,
+    })
+
+def event_stream(tenant_id, last_event_id=None, heartbeat=SSE_HEARTBEAT, max_duration=SSE_MAX_DURATION):
+    """Generator of SSE messages for one dashboard; ends after max_duration so the browser reconnects"""
+    subscriber = None
+    if LIVE_UPDATES == 'sse':
+        subscriber, in_sync = broker.subscribe(tenant_id, last_event_id, SSE_MAX_STREAMS)
+    if subscriber is None:
+        # Streaming is off or every stream slot is taken; the client falls back to polling
+        yield format_event('poll', {'interval': LIVE_POLL_INTERVAL})
+        return
+    deadline = time.monotonic() + max_duration
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        if not in_sync:
+            yield format_event('reload')
+            return
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event_id, event, data = subscriber.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event, data, event_id)
+            if subscriber.overflowed:
+                yield format_event('reload')
+                return
+    finally:
+        broker.unsubscribe(tenant_id, subscriber)
@@ -0,0 +1,206 @@
+"""
+In-place schema upgrades for existing databases
+
+db.create_all() creates missing tables but never alters existing ones.
+upgrade_schema() applies the column changes made since a database was first
+created. Every step checks the live schema first, so it is safe to run on
+every startup.
+"""
+import logging
+from sqlalchemy import inspect, text, String
+from models import db
+
+def _column_types(inspector, table):
+    return {column['name']: column['type'] for column in inspector.get_columns(table)}
+
+def _upgrade_answer_timestamps(conn, inspector, dialect):
+    """student_answers.answered_at did not exist; legacy answers are stamped with the upgrade time"""
+    if 'answered_at' in _column_types(inspector, 'student_answers'):
+        return
+    column_type = 'TIMESTAMP WITH TIME ZONE' if dialect == 'postgresql' else 'DATETIME'
+    conn.execute(text(f"ALTER TABLE student_answers ADD COLUMN answered_at {column_type}"))
+    conn.execute(text("UPDATE student_answers SET answered_at = CURRENT_TIMESTAMP WHERE answered_at IS NULL"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_student_answers_answered_at ON student_answers (answered_at)"))
+    logging.info("Added student_answers.answered_at")
+
+def _upgrade_session_start_time(conn, inspector, dialect):
+    """
+    students.session_start_time used to be a string holding the repr of a SQL
+    expression rather than a time, so old values cannot be recovered and are
+    replaced with the upgrade time.
+    """
+    column_type = _column_types(inspector, 'students').get('session_start_time')
+    if dialect == 'postgresql':
+        if isinstance(column_type, String):
+            conn.execute(text(
+                "ALTER TABLE students ALTER COLUMN session_start_time "
+                "TYPE TIMESTAMP WITH TIME ZONE USING CURRENT_TIMESTAMP"
+            ))
+            logging.info("Converted students.session_start_time to TIMESTAMP WITH TIME ZONE")
+    else:
+        # SQLite keeps the declared type; only rewrite values that are not timestamps
+        result = conn.execute(text(
+            "UPDATE students SET session_start_time = CURRENT_TIMESTAMP "
+            "WHERE session_start_time NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'"
+        ))
+        if result.rowcount:
+            logging.info(f"Replaced {result.rowcount} invalid students.session_start_time values")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_students_session_start_time ON students (session_start_time)"))
+
+def _upgrade_answer_client_key(conn, inspector, dialect):
+    """student_answers.client_key holds idempotency keys for batched submissions"""
+    if 'client_key' in _column_types(inspector, 'student_answers'):
+        return
+    conn.execute(text("ALTER TABLE student_answers ADD COLUMN client_key VARCHAR(64)"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_student_answers_student_client_key "
+        "ON student_answers (student_id, client_key)"
+    ))
+    logging.info("Added student_answers.client_key")
+
+def _upgrade_answer_slots(conn, inspector, dialect):
+    """
+    student_answers.slot and students.progress_version make submissions idempotent
+    and concurrency-safe. Existing answers keep a NULL slot, which the unique index ignores.
+    """
+    if 'slot' not in _column_types(inspector, 'student_answers'):
+        conn.execute(text("ALTER TABLE student_answers ADD COLUMN slot INTEGER"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_student_answers_student_slot "
+            "ON student_answers (student_id, slot)"
+        ))
+        logging.info("Added student_answers.slot")
+    if 'progress_version' not in _column_types(inspector, 'students'):
+        conn.execute(text("ALTER TABLE students ADD COLUMN progress_version INTEGER NOT NULL DEFAULT 0"))
+        logging.info("Added students.progress_version")
+
+# Tenant-led indexes: (name, table, columns)
+TENANT_INDEXES = (
+    ('ix_questions_tenant_prerequisite_difficulty', 'questions', 'tenant_id, prerequisite_name, difficulty_level'),
+    ('ix_students_tenant_session_start_time', 'students', 'tenant_id, session_start_time'),
+    ('ix_student_answers_tenant_student', 'student_answers', 'tenant_id, student_id'),
+    ('ix_student_answers_tenant_answered_at', 'student_answers', 'tenant_id, answered_at'),
+    ('ix_student_answers_archive_tenant_answered_at', 'student_answers_archive', 'tenant_id, answered_at'),
+)
+
+def _upgrade_tenants(conn, inspector, dialect):
+    """
+    tenant_id on every school-owned table; existing rows belong to the default tenant.
+    The rollup table's unique key now leads with the tenant.
+    """
+    from tenancy import DEFAULT_TENANT
+    
+    for table in ('questions', 'students', 'student_answers', 'student_answers_archive'):
+        if 'tenant_id' not in _column_types(inspector, table):
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN tenant_id VARCHAR(64) NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+            ))
+            logging.info(f"Added {table}.tenant_id")
+    
+    if 'tenant_id' not in _column_types(inspector, 'prerequisite_daily_stats'):
+        if dialect == 'postgresql':
+            conn.execute(text(
+                f"ALTER TABLE prerequisite_daily_stats ADD COLUMN tenant_id VARCHAR(64) NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+            ))
+            conn.execute(text("ALTER TABLE prerequisite_daily_stats DROP CONSTRAINT IF EXISTS uq_prerequisite_daily_stats"))
+            conn.execute(text(
+                "ALTER TABLE prerequisite_daily_stats ADD CONSTRAINT uq_prerequisite_daily_stats_tenant "
+                "UNIQUE (tenant_id, grade, prerequisite_name, day)"
+            ))
+        else:
+            # SQLite cannot drop a table constraint; copy the rollups into a rebuilt table
+            from models import PrerequisiteDailyStats
+            conn.execute(text("ALTER TABLE prerequisite_daily_stats RENAME TO prerequisite_daily_stats_old"))
+            PrerequisiteDailyStats.__table__.create(conn)
+            conn.execute(text(
+                "INSERT INTO prerequisite_daily_stats "
+                "(tenant_id, grade, prerequisite_name, day, answers, correct, incorrect, dont_know) "
+                f"SELECT '{DEFAULT_TENANT}', grade, prerequisite_name, day, answers, correct, incorrect, dont_know "
+                "FROM prerequisite_daily_stats_old"
+            ))
+            conn.execute(text("DROP TABLE prerequisite_daily_stats_old"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_prerequisite_daily_stats_grade_day"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_prerequisite_daily_stats_tenant_grade_day "
+            "ON prerequisite_daily_stats (tenant_id, grade, day)"
+        ))
+        logging.info("Added prerequisite_daily_stats.tenant_id")
+    
+    for name, table, columns in TENANT_INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    # Superseded by the tenant-led index
+    conn.execute(text("DROP INDEX IF EXISTS ix_questions_prerequisite_difficulty"))
+
+def _upgrade_dependency_tenants(conn, inspector, dialect):
+    """
+    prerequisite_dependencies.tenant_id scopes overrides to a school; existing
+    overrides become the shared base of the default tenant.
+    """
+    from tenancy import DEFAULT_TENANT
+    
+    if not inspector.has_table('prerequisite_dependencies'):
+        return
+    if 'tenant_id' in _column_types(inspector, 'prerequisite_dependencies'):
+        return
+    if dialect == 'postgresql':
+        conn.execute(text(
+            f"ALTER TABLE prerequisite_dependencies ADD COLUMN tenant_id VARCHAR(64) NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+        ))
+        conn.execute(text("ALTER TABLE prerequisite_dependencies DROP CONSTRAINT IF EXISTS uq_prerequisite_dependencies_edge"))
+        conn.execute(text(
+            "ALTER TABLE prerequisite_dependencies ADD CONSTRAINT uq_prerequisite_dependencies_tenant_edge "
+            "UNIQUE (tenant_id, prerequisite_name, dependent_name)"
+        ))
+    else:
+        # SQLite cannot drop a table constraint; copy the overrides into a rebuilt table
+        from models import PrerequisiteDependency
+        conn.execute(text("ALTER TABLE prerequisite_dependencies RENAME TO prerequisite_dependencies_old"))
+        PrerequisiteDependency.__table__.create(conn)
+        conn.execute(text(
+            "INSERT INTO prerequisite_dependencies (id, tenant_id, prerequisite_name, dependent_name, action) "
+            f"SELECT id, '{DEFAULT_TENANT}', prerequisite_name, dependent_name, action "
+            "FROM prerequisite_dependencies_old"
+        ))
+        conn.execute(text("DROP TABLE prerequisite_dependencies_old"))
+    logging.info("Added prerequisite_dependencies.tenant_id")
+
+def _upgrade_session_versions(conn, inspector, dialect):
+    """server_sessions.version lets the tiered session store validate worker-local copies"""
+    if not inspector.has_table('server_sessions'):
+        return
+    if 'version' in _column_types(inspector, 'server_sessions'):
+        return
+    conn.execute(text("ALTER TABLE server_sessions ADD COLUMN version VARCHAR(16)"))
+    logging.info("Added server_sessions.version")
+
+def _upgrade_archive_slots(conn, inspector, dialect):
+    """student_answers_archive keeps client_key and slot so archived answers read like hot ones"""
+    if not inspector.has_table('student_answers_archive'):
+        return
+    columns = _column_types(inspector, 'student_answers_archive')
+    if 'client_key' not in columns:
+        conn.execute(text("ALTER TABLE student_answers_archive ADD COLUMN client_key VARCHAR(64)"))
+        logging.info("Added student_answers_archive.client_key")
+    if 'slot' not in columns:
+        conn.execute(text("ALTER TABLE student_answers_archive ADD COLUMN slot INTEGER"))
+        logging.info("Added student_answers_archive.slot")
+
+UPGRADES = [
+    _upgrade_answer_timestamps,
+    _upgrade_session_start_time,
+    _upgrade_answer_client_key,
+    _upgrade_answer_slots,
+    _upgrade_tenants,
+    _upgrade_dependency_tenants,
+    _upgrade_session_versions,
+    _upgrade_archive_slots,
+]
+
+def upgrade_schema(engine=None):
+    """Apply all pending in-place upgrades to the bound database (or the given engine)"""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        for upgrade in UPGRADES:
+            upgrade(conn, inspector, dialect)
@@ -1,11 +1,63 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+from replica import RoutingSession
+from tenancy import current_tenant, DEFAULT_TENANT
 
-db = SQLAlchemy()
+# Reads inside @replica_reads views may be routed to the read replica (see replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-class Question(db.Model):
+def utc_now():
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+def upsert_insert(table):
+    """
+    INSERT construct supporting on_conflict_do_update/do_nothing for the bound database,
+    or None when the dialect has no ON CONFLICT support
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+class TenantScoped:
+    """Rows private to one school; queries only see the current tenant's rows"""
+    tenant_id = db.Column(db.String(64), nullable=False, default=current_tenant, server_default=DEFAULT_TENANT)
+
+class SharedTenantScoped:
+    """Rows owned by one school, plus a bank shared by all schools under DEFAULT_TENANT"""
+    tenant_id = db.Column(db.String(64), nullable=False, default=current_tenant, server_default=DEFAULT_TENANT)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _scope_to_tenant(execute_state):
+    """Filter ORM selects, updates and deletes to the current tenant unless run with all_tenants=True"""
+    # Core statements on tables (see reads.py) carry their own tenant conditions
+    if not execute_state.is_orm_statement:
+        return
+    if execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.execution_options.get('all_tenants', False):
+        return
+    tenant_id = current_tenant()
+    visible_tenants = (tenant_id, DEFAULT_TENANT)
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True),
+        with_loader_criteria(SharedTenantScoped, lambda cls: cls.tenant_id.in_(visible_tenants), include_aliases=True)
+    )
+
+class Question(SharedTenantScoped, db.Model):
     """Model for storing generated questions"""
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Pool inventory and serving look questions up by prerequisite and difficulty
+        db.Index('ix_questions_tenant_prerequisite_difficulty', 'tenant_id', 'prerequisite_name', 'difficulty_level'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     prerequisite_name = db.Column(db.String(200), nullable=False)
@@ -21,14 +73,19 @@ class Question(db.Model):
     def __repr__(self):
         return f'<Question {self.id}: {self.prerequisite_name}>'
 
-class Student(db.Model):
+class Student(TenantScoped, db.Model):
     """Model for storing student session information"""
     __tablename__ = 'students'
+    __table_args__ = (
+        db.Index('ix_students_tenant_session_start_time', 'tenant_id', 'session_start_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_name = db.Column(db.String(100), nullable=False)
     student_grade = db.Column(db.String(50), nullable=False)
-    session_start_time = db.Column(db.String(50), nullable=False)
+    session_start_time = db.Column(db.DateTime(timezone=True), nullable=False, default=utc_now, index=True)
+    # Number of answers recorded; guards session progress against concurrent submissions
+    progress_version = db.Column(db.Integer, nullable=False, default=0)
     
     # Relationship to student answers
     answers = db.relationship('StudentAnswer', backref='student', lazy=True)
@@ -36,9 +93,18 @@ class Student(db.Model):
     def __repr__(self):
         return f'<Student {self.id}: {self.student_name}>'
 
-class StudentAnswer(db.Model):
+class StudentAnswer(TenantScoped, db.Model):
     """Model for storing individual student answers"""
     __tablename__ = 'student_answers'
+    __table_args__ = (
+        # Idempotency: a client-generated key is recorded at most once per student
+        db.Index('ux_student_answers_student_client_key', 'student_id', 'client_key', unique=True),
+        # Each prerequisite slot of a session is answered at most once
+        db.Index('ux_student_answers_student_slot', 'student_id', 'slot', unique=True),
+        # Per-school dashboards and time-window analytics
+        db.Index('ix_student_answers_tenant_student', 'tenant_id', 'student_id'),
+        db.Index('ix_student_answers_tenant_answered_at', 'tenant_id', 'answered_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -46,10 +112,37 @@ class StudentAnswer(db.Model):
     student_answer = db.Column(db.String(500))
     correct_answer = db.Column(db.String(500))
     is_correct = db.Column(db.Integer, nullable=False)  # 1 for correct, 0 for incorrect, -1 for "don't know"
+    answered_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utc_now, index=True)
+    client_key = db.Column(db.String(64))  # Idempotency key sent by the client, if any
+    slot = db.Column(db.Integer)  # Index of the prerequisite in the student's grade list
     
     def __repr__(self):
         return f'<StudentAnswer {self.id}: Student {self.student_id}, {self.prerequisite_name}>'
 
+class StudentAnswerArchive(TenantScoped, db.Model):
+    """Answers moved out of student_answers by the retention job (range-partitioned by month on PostgreSQL)"""
+    __tablename__ = 'student_answers_archive'
+    __table_args__ = (
+        db.Index('ix_student_answers_archive_answered_at', 'answered_at'),
+        db.Index('ix_student_answers_archive_student_id', 'student_id'),
+        db.Index('ix_student_answers_archive_tenant_answered_at', 'tenant_id', 'answered_at'),
+        {'postgresql_partition_by': 'RANGE (answered_at)'},
+    )
+    
+    # PostgreSQL requires the partition key to be part of the primary key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    answered_at = db.Column(db.DateTime(timezone=True), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    prerequisite_name = db.Column(db.String(200), nullable=False)
+    student_answer = db.Column(db.String(500))
+    correct_answer = db.Column(db.String(500))
+    is_correct = db.Column(db.Integer, nullable=False)
+    client_key = db.Column(db.String(64))
+    slot = db.Column(db.Integer)
+    
+    def __repr__(self):
+        return f'<StudentAnswerArchive {self.id}: Student {self.student_id}, {self.prerequisite_name}>'
+
 class PrerequisiteVideo(db.Model):
     """Model for storing educational video links"""
     __tablename__ = 'prerequisite_videos'
@@ -60,3 +153,79 @@ class PrerequisiteVideo(db.Model):
     
     def __repr__(self):
         return f'<PrerequisiteVideo {self.id}: {self.prerequisite_name}>'
+
+class PrerequisiteDependency(SharedTenantScoped, db.Model):
+    """
+    Admin override of the prerequisite dependency graph derived from grade ordering (see remediation.py).
+    Overrides of DEFAULT_TENANT apply to every school, each school's own are applied after them.
+    """
+    __tablename__ = 'prerequisite_dependencies'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'prerequisite_name', 'dependent_name', name='uq_prerequisite_dependencies_tenant_edge'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    prerequisite_name = db.Column(db.String(200), nullable=False)
+    dependent_name = db.Column(db.String(200), nullable=False)
+    action = db.Column(db.String(10), nullable=False, default='add')  # 'add' or 'remove' the edge
+    
+    def __repr__(self):
+        return f'<PrerequisiteDependency {self.action} {self.prerequisite_name} -> {self.dependent_name}>'
+
+class ServerSession(db.Model):
+    """Model for server-side session payloads (shared tier of the session store)"""
+    __tablename__ = 'server_sessions'
+    
+    sid = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)  # Unix timestamp
+    version = db.Column(db.String(16))  # Changes on every write; validates worker-local copies
+    
+    def __repr__(self):
+        return f'<ServerSession {self.sid}>'
+
+class PrerequisiteDailyStats(TenantScoped, db.Model):
+    """Rollup of student answers per (tenant, grade, prerequisite, day), maintained incrementally on submit"""
+    __tablename__ = 'prerequisite_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'grade', 'prerequisite_name', 'day', name='uq_prerequisite_daily_stats_tenant'),
+        db.Index('ix_prerequisite_daily_stats_tenant_grade_day', 'tenant_id', 'grade', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    grade = db.Column(db.String(50), nullable=False)
+    prerequisite_name = db.Column(db.String(200), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    incorrect = db.Column(db.Integer, nullable=False, default=0)
+    dont_know = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PrerequisiteDailyStats {self.grade} {self.prerequisite_name} {self.day}>'
+
+class ResultSnapshot(TenantScoped, db.Model):
+    """Final results of a completed assessment, written once and served as-is (see results.py)"""
+    __tablename__ = 'result_snapshots'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utc_now, index=True)
+    # Summary columns for the admin dashboard; the full breakdown is in payload
+    total = db.Column(db.Integer, nullable=False)
+    correct = db.Column(db.Integer, nullable=False)
+    attempted = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f'<ResultSnapshot Student {self.student_id}: {self.correct}/{self.total}>'
+
+class RateLimitBucket(db.Model):
+    """Token bucket shared by all workers (SQL backend of ratelimit.py)"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # Unix timestamp
+    
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}: {self.tokens}>'
@@ -0,0 +1,242 @@
+"""
+Opt-in profiling
+
+Three captures, all written to PROFILE_DIR (newest PROFILE_MAX_FILES kept):
+
+- Sampling profiler (SAMPLING_PROFILER=1): a daemon thread snapshots every
+  thread's stack each PROFILE_SAMPLE_INTERVAL seconds and writes the counts
+  every PROFILE_FLUSH_INTERVAL seconds as collapsed stacks (*.folded), the
+  input format of flamegraph.pl and speedscope.
+- Slow requests (PROFILE_SLOW_MS=<ms>): the sampler also keeps the samples
+  taken on each request's thread; requests slower than the threshold have
+  them saved as <endpoint>-slow-*.folded. Enables the sampler.
+- On demand: a request carrying PROFILE_HEADER is run under cProfile and
+  saved as a pstats file (*.prof, for snakeviz or flameprof). The header is
+  honored for logged-in admins, or when it equals PROFILE_TOKEN. One such
+  capture runs at a time; the file name comes back in the same header.
+
+/admin/api/profiles lists captures and /admin/api/profiles/<name> downloads one.
+"""
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import secrets
+from collections import Counter
+from flask import request, session, g
+
+SAMPLING_PROFILER = os.environ.get('SAMPLING_PROFILER') == '1'
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.01))
+PROFILE_FLUSH_INTERVAL = float(os.environ.get('PROFILE_FLUSH_INTERVAL', 300))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/mathboost-profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Profile')
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+MAX_STACK_DEPTH = 128
+
+PROFILE_EXTENSIONS = ('.folded', '.prof')
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+_labels = {}
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+def collapse_stack(frame):
+    """Root-first 'a;b;c' label of a frame's call stack"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+def format_folded(counts):
+    """Collapsed-stack text: one 'stack count' line per distinct stack"""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+def save_profile(kind, label, write, extension, directory=PROFILE_DIR):
+    """Write a capture via write(path) and prune old ones. Returns the file name."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{_SAFE_NAME.sub('_', label)[:60]}-{kind}{extension}"
+    write(os.path.join(directory, name))
+    prune_profiles(directory)
+    return name
+
+def prune_profiles(directory=PROFILE_DIR, keep=PROFILE_MAX_FILES):
+    entries = sorted(list_profiles(directory), key=lambda entry: entry['modified'])
+    for entry in entries[:max(0, len(entries) - keep)]:
+        try:
+            os.remove(os.path.join(directory, entry['name']))
+        except OSError:
+            pass
+
+def list_profiles(directory=PROFILE_DIR):
+    """Stored captures, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(PROFILE_EXTENSIONS):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime,
+                         'format': 'pstats' if name.endswith('.prof') else 'folded'})
+    return sorted(entries, key=lambda entry: -entry['modified'])
+
+def profile_path(name, directory=PROFILE_DIR):
+    """Path of a stored capture, or None for unknown or unsafe names"""
+    if name != os.path.basename(name) or not name.endswith(PROFILE_EXTENSIONS):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+class SamplingProfiler:
+    """Daemon thread sampling all thread stacks into collapsed-stack counts"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, flush_interval=PROFILE_FLUSH_INTERVAL, flush=True):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.flush_enabled = flush
+        self.counts = Counter()
+        self.samples = 0
+        self._captures = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = collapse_stack(frame)
+                self.counts[stack] += 1
+                capture = self._captures.get(ident)
+                if capture is not None:
+                    capture[stack] += 1
+            self.samples += 1
+
+    def start_capture(self, ident):
+        """Also record the samples of one thread (a request in progress)"""
+        with self._lock:
+            self._captures[ident] = Counter()
+
+    def stop_capture(self, ident):
+        with self._lock:
+            return self._captures.pop(ident, None)
+
+    def flush(self):
+        """Save and reset the process-wide counts. Returns the file name, or None when empty."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return None
+        return save_profile('sampling', 'process', lambda path: _write_text(path, format_folded(counts)), '.folded')
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+                if self.flush_enabled and time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                logging.error(f"Sampling profiler error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _write_pstats(profiler):
+    def write(path):
+        pstats.Stats(profiler).dump_stats(path)
+    return write
+
+sampler = None
+_cprofile_lock = threading.Lock()
+
+def _profile_requested():
+    value = request.headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    if PROFILE_TOKEN:
+        return secrets.compare_digest(value, PROFILE_TOKEN)
+    return bool(session.get('admin_logged_in'))
+
+def start_request_profile():
+    """before_request hook starting the captures that apply to this request"""
+    g.profile_started = time.perf_counter()
+    if sampler is not None and PROFILE_SLOW_MS > 0:
+        sampler.start_capture(threading.get_ident())
+    if _profile_requested() and _cprofile_lock.acquire(blocking=False):
+        g.cprofile = cProfile.Profile()
+        g.cprofile.enable()
+
+def _finish_cprofile():
+    profiler = g.pop('cprofile', None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    _cprofile_lock.release()
+    try:
+        return save_profile('request', request.endpoint or 'unknown', _write_pstats(profiler), '.prof')
+    except Exception as e:
+        logging.error(f"Error saving request profile: {e}")
+        return None
+
+def finish_request_profile(response):
+    """after_request hook saving an on-demand cProfile capture and naming it in the response"""
+    name = _finish_cprofile()
+    if name:
+        response.headers[PROFILE_HEADER] = name
+    return response
+
+def end_request_profile(error=None):
+    """teardown_request hook keeping the samples of slow requests"""
+    # Requests that failed before after_request still release the cProfile slot
+    _finish_cprofile()
+    started = g.pop('profile_started', None)
+    if sampler is None or started is None:
+        return
+    capture = sampler.stop_capture(threading.get_ident())
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if capture and PROFILE_SLOW_MS > 0 and elapsed_ms >= PROFILE_SLOW_MS:
+        try:
+            name = save_profile('slow', f"{request.endpoint or 'unknown'}-{elapsed_ms:.0f}ms",
+                                lambda path: _write_text(path, format_folded(capture)), '.folded')
+            logging.warning(f"Slow request {request.path} took {elapsed_ms:.0f}ms; samples in {name}")
+        except Exception as e:
+            logging.error(f"Error saving slow request profile: {e}")
+
+def init_profiling(app):
+    """Register request profiling hooks and start the sampler when enabled"""
+    global sampler
+    if SAMPLING_PROFILER or PROFILE_SLOW_MS > 0:
+        sampler = SamplingProfiler(flush=SAMPLING_PROFILER).start()
+        logging.info(f"Sampling profiler every {PROFILE_SAMPLE_INTERVAL * 1000:.0f}ms, writing to {PROFILE_DIR}")
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
+    app.teardown_request(end_request_profile)
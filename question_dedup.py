@@ -0,0 +1,299 @@
+"""
+Near-duplicate detection for the question bank
+
+Questions are normalized (Arabic/Persian letter forms, diacritics, digits,
+LaTeX and punctuation), split into character shingles and summarized with MinHash
+signatures. Locality-sensitive hashing over signature bands finds candidate
+matches without comparing against every question. Two questions count as
+duplicates when their estimated Jaccard similarity reaches
+DUPLICATE_THRESHOLD and they use the same numbers, so template variants such
+as "25 + 37" and "26 + 37" stay distinct.
+
+Signatures are computed with NumPy when it is installed and in pure Python
+otherwise; both give identical results.
+
+Bulk pass over the questions table (dry run unless --delete), or lookup benchmark:
+    python question_dedup.py [--delete | --benchmark]
+"""
+import re
+import time
+import random
+import logging
+import os
+import threading
+import unicodedata
+import zlib
+from collections import defaultdict, OrderedDict
+from sqlalchemy import select, func
+from models import db, Question
+from tenancy import current_tenant
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 4
+DUPLICATE_THRESHOLD = 0.7
+# Most tenant indexes kept in memory; the least recently used one is dropped beyond this
+MAX_INDEXES = int(os.environ.get('QUESTION_DEDUP_MAX_INDEXES', 32))
+
+# Universal hashing (a * h + b) mod p over 32-bit shingle hashes; a, b < 2^31 keep
+# the products inside 64 bits so the NumPy path matches the pure-Python one exactly
+_PRIME = (1 << 32) + 15
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, 1 << 31), _rng.randrange(0, 1 << 31)) for _ in range(NUM_PERMUTATIONS)]
+
+if np is not None:
+    _A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+    _B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+
+_CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
+    '‌': ' ',  # zero-width non-joiner
+    **{persian: str(i) for i, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(i) for i, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+# Arabic diacritics (harakat, tanwin, superscript alef)
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+_LATEX_COMMAND = re.compile(r'\\[a-zA-Z]+')
+_NUMBER = re.compile(r'\d+(?:[./]\d+)?')
+_NOISE = re.compile(r'[^\w+\-×÷*/=^<>]+')
+_OPERATOR_SPACING = re.compile(r'\s*([+\-×÷*/=^<>])\s*')
+
+def normalize(text):
+    """Canonical form used for shingling: unified letters and digits, no LaTeX markup or punctuation"""
+    text = unicodedata.normalize('NFKC', text).translate(_CHARACTER_MAP).lower()
+    text = _DIACRITICS.sub('', text)
+    text = _LATEX_COMMAND.sub(' ', text)
+    text = _NOISE.sub(' ', text)
+    return _OPERATOR_SPACING.sub(r'\1', ' '.join(text.split()))
+
+def numbers(normalized):
+    """Sorted numbers appearing in a normalized question"""
+    return tuple(sorted(_NUMBER.findall(normalized)))
+
+def shingles(normalized):
+    """Hashed character shingles of a normalized question"""
+    if len(normalized) <= SHINGLE_SIZE:
+        return {zlib.crc32(normalized.encode('utf-8'))}
+    return {zlib.crc32(normalized[i:i + SHINGLE_SIZE].encode('utf-8'))
+            for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+def minhash(shingle_hashes):
+    """MinHash signature of a set of shingle hashes"""
+    if np is not None:
+        hashes = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+        return tuple(((_A * hashes + _B) % _PRIME).min(axis=1).tolist())
+    return tuple(min((a * h + b) % _PRIME for h in shingle_hashes) for a, b in _PERMUTATIONS)
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERMUTATIONS
+
+def fingerprint(text):
+    """(numbers, signature) of a question text"""
+    normalized = normalize(text)
+    return numbers(normalized), minhash(shingles(normalized))
+
+class NearDuplicateIndex:
+    """In-memory MinHash/LSH index of question texts"""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._fingerprints = {}
+        self._buckets = defaultdict(list)
+        self._lock = threading.Lock()
+        # Held while an index is synced with the table so concurrent requests refresh it once
+        self.refresh_lock = threading.Lock()
+        self.last_id = 0
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _band_keys(self, number_key, signature):
+        for band in range(BANDS):
+            yield (band, number_key, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+
+    def add(self, question_id, text):
+        number_key, signature = fingerprint(text)
+        with self._lock:
+            self._fingerprints[question_id] = (number_key, signature)
+            for key in self._band_keys(number_key, signature):
+                self._buckets[key].append(question_id)
+            self.last_id = max(self.last_id, question_id)
+
+    def remove(self, question_id):
+        with self._lock:
+            entry = self._fingerprints.pop(question_id, None)
+            if entry is None:
+                return
+            for key in self._band_keys(*entry):
+                bucket = self._buckets[key]
+                bucket.remove(question_id)
+                if not bucket:
+                    del self._buckets[key]
+            if question_id == self.last_id:
+                self.last_id = max(self._fingerprints, default=0)
+
+    def ids(self):
+        with self._lock:
+            return set(self._fingerprints)
+
+    def matches(self, text, exclude=None):
+        """[(question_id, similarity)] of indexed questions that duplicate text, most similar first"""
+        number_key, signature = fingerprint(text)
+        candidates = set()
+        with self._lock:
+            for key in self._band_keys(number_key, signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(exclude)
+            scored = [(question_id, similarity(signature, self._fingerprints[question_id][1]))
+                      for question_id in candidates]
+        return sorted((match for match in scored if match[1] >= self.threshold), key=lambda match: -match[1])
+
+    def is_duplicate(self, text):
+        return bool(self.matches(text))
+
+# Per-tenant indexes of the questions each tenant sees, loaded lazily, most recently used last
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _tenant_index(tenant):
+    with _indexes_lock:
+        index = _indexes.get(tenant)
+        if index is None:
+            index = _indexes[tenant] = NearDuplicateIndex()
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(tenant)
+        return index
+
+def _sync(index):
+    """
+    Bring index in line with the questions table. New ids above last_id are
+    added first; if (count, max id) still disagree, a question committed out of
+    order or a deletion happened, and the full id list is diffed.
+    """
+    count, max_id = db.session.execute(select(func.count(Question.id), func.max(Question.id))).one()
+    if (count, max_id or 0) == (len(index), index.last_id):
+        return
+    for question_id, text in db.session.execute(
+        select(Question.id, Question.question_text).where(Question.id > index.last_id).order_by(Question.id)
+    ).all():
+        index.add(question_id, text)
+    if (count, max_id or 0) == (len(index), index.last_id):
+        return
+
+    table_ids = set(db.session.execute(select(Question.id)).scalars())
+    indexed_ids = index.ids()
+    for question_id in indexed_ids - table_ids:
+        index.remove(question_id)
+    missing = table_ids - indexed_ids
+    if missing:
+        for question_id, text in db.session.execute(
+            select(Question.id, Question.question_text).where(Question.id.in_(missing))
+        ).all():
+            index.add(question_id, text)
+    index.last_id = max(table_ids, default=0)
+
+def question_index():
+    """The current tenant's index, synced with questions added or deleted since it was last used"""
+    index = _tenant_index(current_tenant())
+    with index.refresh_lock:
+        _sync(index)
+    return index
+
+def forget_questions(question_ids):
+    """Drop deleted questions from every loaded index"""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        for question_id in question_ids:
+            index.remove(question_id)
+
+def find_near_duplicate(text):
+    """Id of an existing question that near-duplicates text, or None"""
+    matches = question_index().matches(text)
+    return matches[0][0] if matches else None
+
+def find_duplicate_groups():
+    """Groups of near-duplicate question ids in the questions table; the first id of each group is the original"""
+    index = NearDuplicateIndex()
+    duplicate_of = {}
+    for question_id, text in db.session.execute(
+        select(Question.id, Question.question_text).order_by(Question.id)
+    ).all():
+        matches = index.matches(text)
+        if matches:
+            original = duplicate_of.get(matches[0][0], matches[0][0])
+            duplicate_of[question_id] = original
+        index.add(question_id, text)
+
+    groups = defaultdict(list)
+    for question_id, original in duplicate_of.items():
+        groups[original].append(question_id)
+    return [[original] + duplicates for original, duplicates in sorted(groups.items())]
+
+def remove_duplicates():
+    """Delete every question that duplicates an earlier one. Returns the number removed."""
+    groups = find_duplicate_groups()
+    duplicate_ids = [question_id for group in groups for question_id in group[1:]]
+    try:
+        if duplicate_ids:
+            Question.query.filter(Question.id.in_(duplicate_ids)).delete(synchronize_session=False)
+            db.session.commit()
+        forget_questions(duplicate_ids)
+        logging.info(f"Removed {len(duplicate_ids)} near-duplicate questions")
+        return len(duplicate_ids)
+    except Exception as e:
+        logging.error(f"Error removing duplicate questions: {e}")
+        db.session.rollback()
+        return 0
+
+def benchmark(size=20000, lookups=2000):
+    """Build an index of synthetic template questions and time candidate lookups"""
+    import question_templates
+
+    rng = random.Random(7)
+    prerequisites = list(question_templates.TEMPLATES)
+    texts = [question_templates.generate(rng.choice(prerequisites), rng, rng.choice(('easy', 'medium', 'hard')))['text']
+             for _ in range(size + lookups)]
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    for i, text in enumerate(texts[:size]):
+        index.add(i, text)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    duplicates = sum(1 for text in texts[size:] if index.is_duplicate(text))
+    lookup = time.perf_counter() - start
+
+    return {
+        'questions': size,
+        'build_seconds': round(build, 2),
+        'ms_per_lookup': round(lookup / lookups * 1000, 3),
+        'duplicates_found': duplicates,
+    }
+
+if __name__ == '__main__':
+    import sys
+    from app import app, init_db_if_needed
+
+    if '--benchmark' in sys.argv:
+        print(benchmark())
+        sys.exit()
+
+    with app.app_context():
+        init_db_if_needed()
+        groups = find_duplicate_groups()
+        for group in groups:
+            print(f"{group[0]} <- {', '.join(str(question_id) for question_id in group[1:])}")
+        print(f"{sum(len(group) - 1 for group in groups)} near-duplicate questions in {len(groups)} groups")
+        if '--delete' in sys.argv:
+            print(f"Removed {remove_duplicates()} questions")
@@ -0,0 +1,184 @@
+"""
+Prewarmed question pool
+
+Serving reads questions from the `questions` table and never waits on
+generation. A background replenisher compares per-(prerequisite, difficulty)
+inventory with QUESTION_POOL_LOW_WATER and, during the off-peak hours in
+QUESTION_POOL_OFF_PEAK_HOURS, tops up short prerequisites through the
+registered providers (Gemini by default).
+
+The replenisher thread is started when QUESTION_POOL_REPLENISH=1. Enable it
+in one process only (e.g. a single worker or a dedicated instance), or run
+it from cron instead:
+    python question_pool.py [--force]
+"""
+import os
+import random
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import func, select
+from models import db, Question
+
+DIFFICULTY_LEVELS = ('easy', 'medium', 'hard')
+LOW_WATER_MARK = int(os.environ.get('QUESTION_POOL_LOW_WATER', 2))
+# Local hours (start-end, end exclusive, may wrap midnight) during which generation may run
+OFF_PEAK_HOURS = os.environ.get('QUESTION_POOL_OFF_PEAK_HOURS', '1-6')
+REPLENISH_INTERVAL = int(os.environ.get('QUESTION_POOL_INTERVAL', 900))
+# Difficulty served to students from the pool
+SERVE_DIFFICULTY = os.environ.get('QUESTION_POOL_DIFFICULTY', 'medium')
+# Most provider calls per replenish run, to bound API cost
+MAX_CALLS_PER_RUN = int(os.environ.get('QUESTION_POOL_MAX_CALLS', 20))
+
+# name -> provider(prerequisite_name, difficulty_level) returning True when it stored new questions
+PROVIDERS = OrderedDict()
+
+def register_provider(name, provider):
+    """Register a question provider; providers are tried in registration order"""
+    PROVIDERS[name] = provider
+
+def active_providers():
+    """Providers to use, ordered by QUESTION_POOL_PROVIDERS (comma-separated names) when set"""
+    names = os.environ.get('QUESTION_POOL_PROVIDERS')
+    if not names:
+        return list(PROVIDERS.items())
+    return [(name, PROVIDERS[name]) for name in (n.strip() for n in names.split(',')) if name in PROVIDERS]
+
+def is_off_peak(now=None, hours=OFF_PEAK_HOURS):
+    """Whether now falls inside the off-peak window"""
+    start, end = (int(h) for h in hours.split('-'))
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+def inventory():
+    """Stocked question counts as {(prerequisite_name, difficulty_level): count}"""
+    rows = db.session.execute(
+        select(Question.prerequisite_name, Question.difficulty_level, func.count(Question.id))
+        .group_by(Question.prerequisite_name, Question.difficulty_level)
+    ).all()
+    return {(name, level): count for name, level, count in rows}
+
+def _stock(prerequisite_name, difficulty_level):
+    return db.session.execute(
+        select(func.count(Question.id))
+        .where(Question.prerequisite_name == prerequisite_name, Question.difficulty_level == difficulty_level)
+    ).scalar()
+
+def shortfalls(prerequisites, low_water=LOW_WATER_MARK):
+    """(prerequisite_name, difficulty_level, missing) for every slot below the low-water mark, emptiest first"""
+    stock = inventory()
+    short = []
+    for prerequisite in prerequisites:
+        for level in DIFFICULTY_LEVELS:
+            missing = low_water - stock.get((prerequisite, level), 0)
+            if missing > 0:
+                short.append((prerequisite, level, missing))
+    short.sort(key=lambda item: -item[2])
+    return short
+
+def replenish(prerequisites, low_water=LOW_WATER_MARK, max_calls=MAX_CALLS_PER_RUN):
+    """
+    Top up prerequisites below the low-water mark. Each short slot gets one
+    call per provider until one succeeds. Returns the number of provider calls made.
+    """
+    calls = 0
+    providers = active_providers()
+    if not providers:
+        logging.warning("No question providers registered; skipping replenish")
+        return 0
+
+    for prerequisite, level, missing in shortfalls(prerequisites, low_water):
+        # An earlier call may have stocked this slot too (Gemini generates all levels at once)
+        if _stock(prerequisite, level) >= low_water:
+            continue
+        for name, provider in providers:
+            if calls >= max_calls:
+                logging.info(f"Question pool replenish stopped after {calls} provider calls")
+                return calls
+            calls += 1
+            try:
+                if provider(prerequisite, level):
+                    break
+            except Exception as e:
+                logging.error(f"Question provider {name} failed for {prerequisite} ({level}): {e}")
+                db.session.rollback()
+
+    logging.info(f"Question pool replenish made {calls} provider calls")
+    return calls
+
+def pick_question(prerequisite_name, seed, difficulty_level=SERVE_DIFFICULTY):
+    """
+    A stocked question for the prerequisite chosen reproducibly from seed, or None
+    when the pool is empty. Questions of difficulty_level are preferred; other
+    levels are used only while that level has no stock.
+    """
+    for level in (difficulty_level, None):
+        conditions = [Question.prerequisite_name == prerequisite_name]
+        if level is not None:
+            conditions.append(Question.difficulty_level == level)
+        count = db.session.execute(select(func.count(Question.id)).where(*conditions)).scalar()
+        if count:
+            # Only the chosen row is loaded, not every id in the pool
+            offset = random.Random(seed).randrange(count)
+            return db.session.execute(
+                select(Question).where(*conditions).order_by(Question.id).offset(offset).limit(1)
+            ).scalar_one_or_none()
+    return None
+
+class QuestionPoolReplenisher:
+    """Daemon thread running replenish() every interval seconds during off-peak hours"""
+
+    def __init__(self, app, prerequisites, interval=REPLENISH_INTERVAL):
+        self.app = app
+        self.prerequisites = prerequisites
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, force=False):
+        """One replenish pass; outside off-peak hours only when forced"""
+        if not force and not is_off_peak():
+            return 0
+        with self.app.app_context():
+            return replenish(self.prerequisites)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Question pool replenisher error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='question-pool', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+def init_question_pool(app, prerequisites):
+    """Start the background replenisher when QUESTION_POOL_REPLENISH=1"""
+    if os.environ.get('QUESTION_POOL_REPLENISH') != '1':
+        return None
+    logging.info(f"Question pool replenisher every {REPLENISH_INTERVAL}s during hours {OFF_PEAK_HOURS}")
+    return QuestionPoolReplenisher(app, prerequisites).start()
+
+if __name__ == '__main__':
+    import sys
+    from app import app, init_db_if_needed, all_prerequisites
+
+    with app.app_context():
+        init_db_if_needed()
+        prerequisites = all_prerequisites()
+        before = shortfalls(prerequisites)
+        print(f"{len(before)} (prerequisite, difficulty) slots below {LOW_WATER_MARK} questions")
+        if '--force' in sys.argv or is_off_peak():
+            replenish(prerequisites)
+            print(f"{len(shortfalls(prerequisites))} slots still short")
+        else:
+            print(f"Outside off-peak hours ({OFF_PEAK_HOURS}); pass --force to replenish now")
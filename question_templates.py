@@ -0,0 +1,161 @@
+"""
+Parametric local question generator
+
+Each template draws random parameters from a random.Random and returns the
+question text with its computed answer, so arithmetic prerequisites get a
+fresh question per student without calling Gemini. Seeding the generator
+with the session's seed and the slot reproduces the same question when the
+answer is graded.
+
+Benchmark:
+    python question_templates.py [iterations]
+"""
+import random
+import time
+from fractions import Fraction
+
+PERSIAN_DIGITS = str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹')
+
+# Operand ranges per difficulty level
+MAGNITUDES = {'easy': 20, 'medium': 100, 'hard': 1000}
+
+def fa(value):
+    """Number formatted with Persian digits"""
+    return str(value).translate(PERSIAN_DIGITS)
+
+def _fraction(value):
+    return fa(value.numerator) if value.denominator == 1 else f"{fa(value.numerator)}/{fa(value.denominator)}"
+
+def _signed(value):
+    return f"({fa(value)})" if value < 0 else fa(value)
+
+def add_subtract(rng, difficulty):
+    high = MAGNITUDES[difficulty]
+    a, b = rng.randint(2, high), rng.randint(2, high)
+    if rng.random() < 0.5:
+        return f"حاصل جمع {fa(a)} + {fa(b)} چقدر است؟", fa(a + b)
+    a, b = max(a, b), min(a, b)
+    return f"حاصل تفریق {fa(a)} - {fa(b)} چقدر است؟", fa(a - b)
+
+def multiply_divide(rng, difficulty):
+    high = {'easy': 10, 'medium': 20, 'hard': 50}[difficulty]
+    a, b = rng.randint(2, high), rng.randint(2, high)
+    if rng.random() < 0.5:
+        return f"حاصل ضرب {fa(a)} × {fa(b)} چقدر است؟", fa(a * b)
+    return f"حاصل تقسیم {fa(a * b)} ÷ {fa(b)} چقدر است؟", fa(a)
+
+def fractions(rng, difficulty):
+    denominators = {'easy': (2, 4), 'medium': (2, 3, 4, 6), 'hard': (3, 5, 6, 7, 8, 9)}[difficulty]
+    b, d = rng.choice(denominators), rng.choice(denominators)
+    a, c = rng.randint(1, b - 1), rng.randint(1, d - 1)
+    return (f"حاصل $\\frac{{{a}}}{{{b}}} + \\frac{{{c}}}{{{d}}}$ چقدر است؟",
+            _fraction(Fraction(a, b) + Fraction(c, d)))
+
+def decimals(rng, difficulty):
+    denominator = rng.choice({'easy': (2, 10), 'medium': (4, 5, 20), 'hard': (8, 25, 40)}[difficulty])
+    numerator = rng.randint(1, denominator - 1)
+    value = Fraction(numerator, denominator)
+    decimal = f"{numerator / denominator:.3f}".rstrip('0')
+    return f"کسر $\\frac{{{value.numerator}}}{{{value.denominator}}}$ را به صورت عدد اعشاری بنویسید.", fa(decimal)
+
+def percentages(rng, difficulty):
+    percent = rng.choice({'easy': (10, 50), 'medium': (20, 25, 75), 'hard': (5, 15, 35, 60)}[difficulty])
+    base = 20 * rng.randint(1, MAGNITUDES[difficulty] // 10)
+    return f"{fa(percent)} درصد از {fa(base)} چقدر است؟", fa(base * percent // 100)
+
+def integers(rng, difficulty):
+    high = MAGNITUDES[difficulty]
+    a, b = rng.randint(-high, high), rng.randint(-high, high)
+    if rng.random() < 0.5:
+        return f"حاصل {_signed(a)} + {_signed(b)} چقدر است؟", fa(a + b)
+    return f"حاصل {_signed(a)} × {_signed(b)} چقدر است؟", fa(a * b)
+
+def linear_equations(rng, difficulty):
+    high = {'easy': 5, 'medium': 12, 'hard': 30}[difficulty]
+    a = rng.randint(2, 9)
+    x = rng.randint(-high if difficulty == 'hard' else 1, high)
+    b = rng.randint(1, high)
+    return f"مقدار x در معادله {fa(a)}x + {fa(b)} = {fa(a * x + b)} چقدر است؟", fa(x)
+
+def quadratic_equations(rng, difficulty):
+    high = {'easy': 5, 'medium': 9, 'hard': 15}[difficulty]
+    r1, r2 = sorted(rng.sample(range(1 if difficulty == 'easy' else -high, high + 1), 2))
+    s, p = r1 + r2, r1 * r2
+    middle = f" - {abs(s)}x" if s > 0 else (f" + {abs(s)}x" if s < 0 else "")
+    constant = f" + {p}" if p > 0 else (f" - {abs(p)}" if p < 0 else "")
+    return f"ریشه‌های معادله $x^2{middle}{constant} = 0$ کدام هستند؟", f"{fa(r1)} و {fa(r2)}"
+
+def powers_and_roots(rng, difficulty):
+    if rng.random() < 0.5:
+        base = rng.randint(2, {'easy': 5, 'medium': 10, 'hard': 15}[difficulty])
+        exponent = rng.randint(2, 3 if difficulty != 'easy' else 2)
+        return f"حاصل ${base}^{exponent}$ چقدر است؟", fa(base ** exponent)
+    root = rng.randint(2, {'easy': 10, 'medium': 20, 'hard': 40}[difficulty])
+    return f"حاصل $\\sqrt{{{root * root}}}$ چقدر است؟", fa(root)
+
+def ratios(rng, difficulty):
+    a, b = rng.randint(1, 9), rng.randint(2, 9)
+    k = rng.randint(2, MAGNITUDES[difficulty] // 5)
+    return f"اگر $\\frac{{{a}}}{{{b}}} = \\frac{{x}}{{{b * k}}}$ باشد، مقدار x چقدر است؟", fa(a * k)
+
+def linear_functions(rng, difficulty):
+    high = {'easy': 5, 'medium': 10, 'hard': 20}[difficulty]
+    a, b, x = rng.randint(2, high), rng.randint(-high, high), rng.randint(-high, high)
+    sign = '+' if b >= 0 else '-'
+    return f"اگر $f(x) = {a}x {sign} {abs(b)}$ باشد، مقدار $f({x})$ چقدر است؟", fa(a * x + b)
+
+def areas(rng, difficulty):
+    high = {'easy': 10, 'medium': 25, 'hard': 60}[difficulty]
+    width, height = rng.randint(2, high), rng.randint(2, high)
+    if rng.random() < 0.5:
+        return f"مساحت مستطیلی به طول {fa(width)} و عرض {fa(height)} سانتی‌متر چند سانتی‌متر مربع است؟", fa(width * height)
+    height += height % 2
+    return f"مساحت مثلثی با قاعده {fa(width)} و ارتفاع {fa(height)} سانتی‌متر چند سانتی‌متر مربع است؟", fa(width * height // 2)
+
+TEMPLATES = {
+    "جمع و تفریق اعداد طبیعی": add_subtract,
+    "ضرب و تقسیم اعداد طبیعی": multiply_divide,
+    "کسرها و اعمال روی کسرها": fractions,
+    "اعشار و تبدیل کسر به اعشار": decimals,
+    "درصد و کاربردهای آن": percentages,
+    "اعداد صحیح و عملیات روی آنها": integers,
+    "معادلات درجه یک": linear_equations,
+    "معادلات درجه دو": quadratic_equations,
+    "توان و ریشه دوم": powers_and_roots,
+    "نسبت و تناسب": ratios,
+    "تابع و نمودار": linear_functions,
+    "مساحت اشکال هندسی": areas,
+}
+
+def has_template(prerequisite_name):
+    return prerequisite_name in TEMPLATES
+
+def generate(prerequisite_name, rng, difficulty='medium'):
+    """One question instance as {'text', 'answer', 'difficulty'}, or None when the prerequisite has no template"""
+    template = TEMPLATES.get(prerequisite_name)
+    if template is None:
+        return None
+    text, answer = template(rng, difficulty)
+    return {'text': text, 'answer': answer, 'difficulty': difficulty}
+
+def generate_for_slot(prerequisite_name, seed, slot, difficulty='medium'):
+    """The question for a session slot; the same seed and slot always give the same question"""
+    return generate(prerequisite_name, random.Random(f"{seed}:{slot}"), difficulty)
+
+def benchmark(iterations=20000):
+    """Items per second for each template, including per-item seeding as done when serving"""
+    report = {}
+    for prerequisite_name in TEMPLATES:
+        start = time.perf_counter()
+        for i in range(iterations):
+            generate_for_slot(prerequisite_name, 12345, i)
+        elapsed = time.perf_counter() - start
+        report[prerequisite_name] = round(iterations / elapsed)
+    return report
+
+if __name__ == '__main__':
+    import sys
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for prerequisite_name, items_per_second in benchmark(iterations).items():
+        print(f"{items_per_second:>10,} items/s  {prerequisite_name}")
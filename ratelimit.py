@@ -0,0 +1,283 @@
+"""
+Rate limiting and admission control
+
+Token buckets limit how often a client (per IP or per session) may call an
+endpoint; exhausted buckets get 429 with Retry-After. Buckets live in process
+memory by default, or in the rate_limit_buckets table with
+RATE_LIMIT_BACKEND=sql so all workers share them (RATE_LIMIT_DATABASE_URL
+may point at a separate database, e.g. a SQLite file shared by the workers
+of one host).
+
+Admission control caps concurrent /api/ and /admin/ requests per process at
+ADMISSION_MAX_CONCURRENT (SQLAlchemy's default pool is 5 connections plus
+10 overflow). Up to ADMISSION_MAX_QUEUE further requests wait at most
+ADMISSION_QUEUE_TIMEOUT seconds for a slot; beyond that, requests are shed
+with 429 before they can exhaust the database pool. Long-lived views such
+as the dashboard event stream opt out with @admission_exempt. Under asgi.py,
+requests served on the event loop are admitted by AsyncAdmissionController
+instead, up to ASYNC_ADMISSION_MAX_CONCURRENT.
+"""
+import os
+import math
+import asyncio
+import time
+import logging
+import threading
+from functools import wraps
+from flask import request, session, jsonify, g, current_app
+from sqlalchemy import create_engine, select, exc
+from models import db, RateLimitBucket
+from tenancy import current_tenant
+from async_db import running_async
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_DATABASE_URL = os.environ.get('RATE_LIMIT_DATABASE_URL')
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 15))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 50))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2))
+# Requests asgi.py serves on the event loop hold no thread, so more of them may be in flight
+ASYNC_ADMISSION_MAX_CONCURRENT = int(os.environ.get('ASYNC_ADMISSION_MAX_CONCURRENT', 100))
+ADMISSION_PREFIXES = ('/api/', '/admin/')
+
+RATE_LIMITED_ERROR = 'تعداد درخواست‌ها بیش از حد مجاز است، لطفا کمی بعد دوباره تلاش کنید'
+OVERLOADED_ERROR = 'سرور در حال حاضر شلوغ است، لطفا کمی بعد دوباره تلاش کنید'
+
+def refill(tokens, updated_at, capacity, rate, now):
+    """Bucket level at now after refilling at rate tokens/second since updated_at"""
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+def retry_after(tokens, rate, cost=1):
+    """Whole seconds until the bucket holds cost tokens"""
+    return max(1, math.ceil((cost - tokens) / rate))
+
+class MemoryRateLimitStore:
+    """Token buckets in process memory"""
+
+    def __init__(self, prune_every=1000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._prune_every = prune_every
+        self._calls = 0
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Take cost tokens if available. Returns (allowed, tokens left)."""
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = refill(tokens, updated_at, capacity, rate, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+
+            self._calls += 1
+            if self._calls % self._prune_every == 0:
+                self._prune(now)
+        return allowed, tokens
+
+    def _prune(self, now, idle=3600):
+        for key in [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > idle]:
+            del self._buckets[key]
+
+class SQLRateLimitStore:
+    """Token buckets in a database table shared by all workers; fails open if the database errors"""
+
+    RETRIES = 3
+
+    def __init__(self, url=None):
+        self._url = url
+        self._engine = None
+
+    @property
+    def engine(self):
+        if self._url is None:
+            return db.engine
+        if self._engine is None:
+            self._engine = create_engine(self._url)
+            RateLimitBucket.__table__.create(self._engine, checkfirst=True)
+        return self._engine
+
+    def consume(self, key, capacity, rate, cost=1):
+        table = RateLimitBucket.__table__
+        try:
+            for _ in range(self.RETRIES):
+                now = time.time()
+                with self.engine.begin() as conn:
+                    row = conn.execute(select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).first()
+                    if row is None:
+                        tokens = float(capacity)
+                        allowed = tokens >= cost
+                        try:
+                            conn.execute(table.insert().values(key=key, tokens=tokens - cost if allowed else tokens,
+                                                               updated_at=now))
+                        except exc.IntegrityError:
+                            continue  # Another worker created the bucket first
+                        return allowed, tokens - cost if allowed else tokens
+
+                    tokens = refill(row.tokens, row.updated_at, capacity, rate, now)
+                    allowed = tokens >= cost
+                    if allowed:
+                        tokens -= cost
+                    # Optimistic update: lose the race and retry if another worker changed the bucket
+                    result = conn.execute(
+                        table.update()
+                        .where(table.c.key == key, table.c.updated_at == row.updated_at)
+                        .values(tokens=tokens, updated_at=now)
+                    )
+                    if result.rowcount:
+                        return allowed, tokens
+            return True, 0.0
+        except Exception as e:
+            logging.error(f"Rate limit store error, allowing request: {e}")
+            return True, 0.0
+
+    def prune(self, idle=3600):
+        """Delete buckets idle for longer than idle seconds"""
+        table = RateLimitBucket.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(table.delete().where(table.c.updated_at < time.time() - idle)).rowcount
+
+def create_rate_limit_store(backend=RATE_LIMIT_BACKEND):
+    if backend == 'sql':
+        return SQLRateLimitStore(RATE_LIMIT_DATABASE_URL)
+    if backend != 'memory':
+        logging.warning(f"Unknown RATE_LIMIT_BACKEND '{backend}', using memory")
+    return MemoryRateLimitStore()
+
+rate_limit_store = create_rate_limit_store()
+
+def _client_key(per):
+    if per == 'session':
+        identity = session.get('student_id') or (session.get('admin_logged_in') and 'admin')
+        if identity:
+            return f"session:{identity}"
+    # No session yet (or per='ip'): fall back to the client address
+    return f"ip:{request.remote_addr}"
+
+def _too_many(error, seconds):
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+def rate_limit(name, capacity, per_seconds, per='ip', methods=None):
+    """
+    Allow bursts of capacity calls, refilled at capacity per per_seconds,
+    per client IP (per='ip') or per student/admin session (per='session').
+    methods limits which HTTP methods are counted (all by default).
+    """
+    rate = capacity / per_seconds
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if RATE_LIMIT_ENABLED and (methods is None or request.method in methods):
+                key = f"{name}:{current_tenant()}:{_client_key(per)}"
+                allowed, tokens = rate_limit_store.consume(key, capacity, rate)
+                if not allowed:
+                    seconds = retry_after(tokens, rate)
+                    logging.warning(f"Rate limited {key} for {seconds}s")
+                    return _too_many(RATE_LIMITED_ERROR, seconds)
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, time-limited wait queue"""
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 timeout=ADMISSION_QUEUE_TIMEOUT):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.shed = 0
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed. Returns False when the request should be shed."""
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+        try:
+            admitted = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not admitted:
+            with self._lock:
+                self.shed += 1
+        return admitted
+
+    def release(self):
+        self._slots.release()
+
+admission = AdmissionController()
+
+class AsyncAdmissionController:
+    """AdmissionController for requests asgi.py serves on the event loop; queued requests wait without a thread"""
+
+    def __init__(self, max_concurrent=ASYNC_ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 timeout=ADMISSION_QUEUE_TIMEOUT):
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.shed = 0
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed. Returns False when the request should be shed."""
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self.waiting >= self.max_queue:
+            self.shed += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+def admission_exempt(view):
+    """Skip admission control for a view, e.g. a long-lived stream that would hold a slot for minutes"""
+    view.admission_exempt = True
+    return view
+
+def admit_request():
+    """before_request hook applying admission control to API and admin requests"""
+    if not request.path.startswith(ADMISSION_PREFIXES):
+        return None
+    if getattr(current_app.view_functions.get(request.endpoint), 'admission_exempt', False):
+        return None
+    if running_async():
+        # Already admitted by asgi.py; waiting on the semaphore here would block the event loop
+        return None
+    if not admission.acquire():
+        logging.warning(f"Shed {request.path}: {admission.waiting} requests already queued")
+        return _too_many(OVERLOADED_ERROR, max(1, math.ceil(admission.timeout)))
+    g.admitted = True
+    return None
+
+def release_request(error=None):
+    """teardown_request hook freeing the admission slot"""
+    if g.pop('admitted', False):
+        admission.release()
+
+def init_admission_control(app):
+    """Register admission control on the app"""
+    app.before_request(admit_request)
+    app.teardown_request(release_request)
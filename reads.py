@@ -0,0 +1,221 @@
+"""
+Core-SQL read layer for hot read paths
+
+Student results, the admin dashboard, the analytics question table and
+answer replay checks read a handful of columns. They select exactly those
+columns from the mapped tables with SQLAlchemy Core and get plain row tuples
+or small __slots__ dataclasses back, skipping ORM statement compilation,
+entity construction and the identity map.
+
+Core statements are not filtered by the tenant listener in models.py, so
+every query here adds tenant_condition() itself. Answer reads include rows
+moved to student_answers_archive by retention.py, and answers of sessions
+moved to cold storage are read from there (see cold_storage.py).
+
+Allocation and latency comparison with the ORM equivalents (load data with
+synthetic_data.py first):
+    python reads.py [--repeat 5]
+"""
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import select, func, case, union_all
+from flask_sqlalchemy.pagination import Pagination
+from models import (db, Question, Student, StudentAnswer, StudentAnswerArchive, PrerequisiteVideo, ResultSnapshot,
+                    TenantScoped, SharedTenantScoped)
+from tenancy import current_tenant, DEFAULT_TENANT
+import cold_storage
+
+questions = Question.__table__
+students = Student.__table__
+answers = StudentAnswer.__table__
+archived_answers = StudentAnswerArchive.__table__
+videos = PrerequisiteVideo.__table__
+snapshots = ResultSnapshot.__table__
+
+def tenant_condition(model):
+    """WHERE clause limiting a tenant-scoped model's table to what the current tenant may see"""
+    table = model.__table__
+    if issubclass(model, SharedTenantScoped):
+        return table.c.tenant_id.in_((current_tenant(), DEFAULT_TENANT))
+    if issubclass(model, TenantScoped):
+        return table.c.tenant_id == current_tenant()
+    raise TypeError(f"{model.__name__} is not tenant-scoped")
+
+@dataclass(slots=True, frozen=True)
+class AnswerRow:
+    slot: Optional[int]
+    is_correct: int
+    correct_answer: Optional[str]
+
+@dataclass(slots=True, frozen=True)
+class QuestionRow:
+    id: int
+    prerequisite_name: str
+    difficulty_level: str
+    question_text: str
+    correct_answer: str
+    times_used: Optional[int]
+    avg_difficulty_percent: Optional[float]
+    avg_discrimination_index: Optional[float]
+
+QUESTION_ROW_COLUMNS = [questions.c[name] for name in QuestionRow.__slots__]
+
+def recorded_answer(student_id, client_key=None, slot=None):
+    """The student's answer with this idempotency key or slot, or None"""
+    statement = select(answers.c.slot, answers.c.is_correct, answers.c.correct_answer).where(
+        tenant_condition(StudentAnswer), answers.c.student_id == student_id
+    )
+    if client_key is not None:
+        statement = statement.where(answers.c.client_key == client_key)
+    if slot is not None:
+        statement = statement.where(answers.c.slot == slot)
+    row = db.session.execute(statement.limit(1)).first()
+    return AnswerRow(*row) if row is not None else None
+
+def _all_answers(*columns, student_id=None):
+    """Subquery of the given answer columns over the hot and archive tables of the current tenant"""
+    def rows_of(table, model):
+        statement = select(*[table.c[name] for name in columns]).where(tenant_condition(model))
+        if student_id is not None:
+            statement = statement.where(table.c.student_id == student_id)
+        return statement
+    return union_all(rows_of(answers, StudentAnswer), rows_of(archived_answers, StudentAnswerArchive)).subquery()
+
+def answer_outcomes(student_id):
+    """[(prerequisite_name, is_correct)] of the student's answers in answer order, archived and cold included"""
+    # retention.py archives answer by answer, so one session can be split across both tables
+    combined = _all_answers('id', 'prerequisite_name', 'is_correct', student_id=student_id)
+    rows = db.session.execute(
+        select(combined.c.prerequisite_name, combined.c.is_correct).order_by(combined.c.id)
+    ).all()
+    # Compaction moves whole sessions out of both tables, so a student's answers are in the database or cold
+    return rows or cold_storage.answer_outcomes(student_id)
+
+def video_urls(prerequisites):
+    """{prerequisite: video_url}"""
+    if not prerequisites:
+        return {}
+    return dict(db.session.execute(
+        select(videos.c.prerequisite_name, videos.c.video_url)
+        .where(videos.c.prerequisite_name.in_(list(prerequisites)))
+    ).all())
+
+def result_payload(student_id):
+    """Packed result snapshot of a student, or None"""
+    return db.session.execute(
+        select(snapshots.c.payload).where(tenant_condition(ResultSnapshot), snapshots.c.student_id == student_id)
+    ).scalar()
+
+def student_summaries():
+    """[(id, name, grade, start time, snapshot total, snapshot correct)] ordered by id; totals are None without a snapshot"""
+    return db.session.execute(
+        select(students.c.id, students.c.student_name, students.c.student_grade, students.c.session_start_time,
+               snapshots.c.total, snapshots.c.correct)
+        .select_from(students.outerjoin(snapshots, snapshots.c.student_id == students.c.id))
+        .where(tenant_condition(Student))
+        .order_by(students.c.id)
+    ).all()
+
+def unsnapshotted_answer_totals():
+    """{student_id: (answers, correct)} for students without a result snapshot, hot, archived and cold"""
+    combined = _all_answers('student_id', 'is_correct')
+    rows = db.session.execute(
+        select(combined.c.student_id, func.count(), func.sum(case((combined.c.is_correct == 1, 1), else_=0)))
+        .select_from(combined.outerjoin(snapshots, snapshots.c.student_id == combined.c.student_id))
+        .where(snapshots.c.student_id.is_(None))
+        .group_by(combined.c.student_id)
+    ).all()
+    totals = {student_id: (total, correct or 0) for student_id, total, correct in rows}
+    cold = cold_storage.student_totals()
+    if cold:
+        snapshotted = set(db.session.execute(
+            select(snapshots.c.student_id).where(tenant_condition(ResultSnapshot))
+        ).scalars())
+        totals.update((student_id, counts) for student_id, counts in cold.items() if student_id not in snapshotted)
+    return totals
+
+class QuestionPage(Pagination):
+    """Flask-SQLAlchemy pagination over a Core select of questions, yielding QuestionRow items"""
+
+    def _query_items(self):
+        statement = self._query_args['select'].limit(self.per_page).offset(self._query_offset)
+        return [QuestionRow(*row) for row in db.session.execute(statement)]
+
+    def _query_count(self):
+        statement = self._query_args['select'].order_by(None)
+        return db.session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+def question_page(order_by, page=1, per_page=50):
+    """One page of the current tenant's visible questions"""
+    statement = select(*QUESTION_ROW_COLUMNS).where(tenant_condition(Question)).order_by(*order_by)
+    return QuestionPage(page=page, per_page=per_page, error_out=False, select=statement)
+
+# ORM equivalents of the reads above, as written before this module; used by the benchmark only
+def _orm_paths(student_id):
+    return {
+        'answer_outcomes': lambda: [(a.prerequisite_name, a.is_correct) for a in
+                                    StudentAnswer.query.filter_by(student_id=student_id).order_by(StudentAnswer.id).all()],
+        'recorded_answer': lambda: StudentAnswer.query.filter_by(student_id=student_id, slot=0).first(),
+        'student_summaries': lambda: [
+            (s.id, s.student_name, s.student_grade, s.session_start_time,
+             snapshot.total if snapshot else None, snapshot.correct if snapshot else None)
+            for s, snapshot in db.session.query(Student, ResultSnapshot)
+            .outerjoin(ResultSnapshot, ResultSnapshot.student_id == Student.id).order_by(Student.id).all()
+        ],
+        'question_page': lambda: Question.query.order_by(Question.id).paginate(page=1, per_page=50, error_out=False).items,
+    }
+
+def _core_paths(student_id):
+    return {
+        'answer_outcomes': lambda: answer_outcomes(student_id),
+        'recorded_answer': lambda: recorded_answer(student_id, slot=0),
+        'student_summaries': student_summaries,
+        'question_page': lambda: question_page([questions.c.id]).items,
+    }
+
+def _measure(read, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        read()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(best * 1000, 2), round(peak / 1024)
+
+def benchmark(repeat=5):
+    """{read: {'orm': (best ms, peak allocated KiB), 'core': (...)}} for the student with the most answers"""
+    student_id = db.session.execute(
+        select(answers.c.student_id).where(tenant_condition(StudentAnswer))
+        .group_by(answers.c.student_id).order_by(func.count().desc()).limit(1)
+    ).scalar()
+    if student_id is None:
+        raise SystemExit("No answers to benchmark; load data with synthetic_data.py first")
+
+    orm, core = _orm_paths(student_id), _core_paths(student_id)
+    return {name: {'orm': _measure(orm[name], repeat), 'core': _measure(core[name], repeat)} for name in orm}
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    from app import app, init_db_if_needed
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        init_db_if_needed()
+        print(f"{'read':<20}{'path':<6}{'best ms':>10}{'peak KiB':>10}")
+        for name, paths in benchmark(args.repeat).items():
+            for path, (ms, peak) in paths.items():
+                print(f"{name:<20}{path:<6}{ms:>10}{peak:>10}")
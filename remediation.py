@@ -0,0 +1,234 @@
+"""
+Remediation paths over the prerequisite dependency graph
+
+Each grade's prerequisite list is ordered from basic to advanced, so every
+topic is taken to depend on the topic before it in any grade. Admins refine
+this chain with overrides in prerequisite_dependencies that add or remove
+individual edges (see /admin/api/dependencies). Overrides of the default
+tenant are shared by every school; a school's own are applied after them.
+
+Each school's graph is built once per process, with its topological order and every
+topic's ancestor and descendant sets precomputed, and rebuilt only when the
+overrides change (checked at most every REMEDIATION_GRAPH_CHECK_INTERVAL
+seconds). A recommendation is then a handful of set intersections: the
+student's weak topics are ranked in dependency order, and a weak topic with
+no weak prerequisite of its own is a root cause to fix first.
+
+    python remediation.py    # effective edges and recommendation timing
+"""
+import os
+import time
+import logging
+import threading
+from sqlalchemy import select, func
+from models import db, PrerequisiteDependency
+from tenancy import current_tenant, DEFAULT_TENANT
+
+REMEDIATION_GRAPH_CHECK_INTERVAL = float(os.environ.get('REMEDIATION_GRAPH_CHECK_INTERVAL', 60))
+WEAKNESS_THRESHOLD = 0.7
+OVERRIDE_ACTIONS = ('add', 'remove')
+
+# Positional layout of a remediation step in the results payload
+STEP_FIELDS = ('prerequisite', 'root_cause', 'blocked_by', 'unlocks', 'success_rate', 'video_link')
+
+class DependencyGraph:
+    """Immutable DAG of prerequisites with precomputed order and reachability"""
+
+    def __init__(self, nodes, edges):
+        self.nodes = list(dict.fromkeys(nodes))
+        self.edges = frozenset(edges)
+        parents = {node: set() for node in self.nodes}
+        children = {node: [] for node in self.nodes}
+        for before, after in sorted(self.edges, key=lambda edge: (self.nodes.index(edge[0]), self.nodes.index(edge[1]))):
+            parents[after].add(before)
+            children[before].append(after)
+
+        # Kahn's algorithm, taking ready topics in their curriculum order
+        remaining = {node: len(parents[node]) for node in self.nodes}
+        ready = [node for node in self.nodes if remaining[node] == 0]
+        order = []
+        while ready:
+            node = ready.pop(0)
+            order.append(node)
+            for child in children[node]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if len(order) != len(self.nodes):
+            raise ValueError("prerequisite dependencies contain a cycle")
+
+        self.rank = {node: i for i, node in enumerate(order)}
+        self.ancestors = {}
+        for node in order:
+            ancestors = set(parents[node])
+            for parent in parents[node]:
+                ancestors |= self.ancestors[parent]
+            self.ancestors[node] = frozenset(ancestors)
+        self.descendants = {node: set() for node in self.nodes}
+        for node, ancestors in self.ancestors.items():
+            for ancestor in ancestors:
+                self.descendants[ancestor].add(node)
+        self.descendants = {node: frozenset(descendants) for node, descendants in self.descendants.items()}
+
+    def remediation_path(self, weak):
+        """
+        [(topic, root_cause, nearest weak prerequisites, weak dependents count)] for the weak
+        topics, prerequisites first; topics unknown to the graph are treated as independent
+        """
+        weak = set(weak)
+        steps = []
+        for topic in weak:
+            weak_ancestors = self.ancestors.get(topic, frozenset()) & weak
+            # Only the closest ones: skip weak ancestors that another weak ancestor already depends on
+            blocked_by = [a for a in weak_ancestors if not (self.descendants[a] & weak_ancestors)]
+            unlocks = len(self.descendants.get(topic, frozenset()) & weak)
+            steps.append((topic, not weak_ancestors, sorted(blocked_by, key=self.rank.get), unlocks))
+        return sorted(steps, key=lambda step: (self.rank.get(step[0], len(self.rank)), -step[3]))
+
+def chain_edges(grade_prerequisites):
+    """(earlier, later) for every pair of consecutive prerequisites in any grade"""
+    return {(prerequisites[i], prerequisites[i + 1])
+            for prerequisites in grade_prerequisites.values()
+            for i in range(len(prerequisites) - 1)}
+
+def build_graph(grade_prerequisites, overrides=()):
+    """Graph from grade ordering plus (prerequisite, dependent, action) overrides; overrides that would add a cycle are skipped"""
+    nodes = [p for prerequisites in grade_prerequisites.values() for p in prerequisites]
+    edges = chain_edges(grade_prerequisites)
+    graph = DependencyGraph(nodes, edges)
+    for prerequisite, dependent, action in overrides:
+        if prerequisite not in graph.rank or dependent not in graph.rank:
+            continue
+        candidate = edges - {(prerequisite, dependent)} if action == 'remove' else edges | {(prerequisite, dependent)}
+        try:
+            graph = DependencyGraph(nodes, candidate)
+            edges = candidate
+        except ValueError:
+            logging.warning(f"Skipping dependency override {prerequisite} -> {dependent}: it would create a cycle")
+    return graph
+
+_base = {'grade_prerequisites': None, 'graph': None}
+# Per tenant: {'graph', 'version', 'checked_at'}
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _overrides_version():
+    return tuple(db.session.execute(
+        select(func.count(PrerequisiteDependency.id), func.max(PrerequisiteDependency.id))
+    ).one())
+
+def load_overrides():
+    """Overrides visible to the current tenant, shared ones first so the school's own win"""
+    return db.session.execute(
+        select(PrerequisiteDependency.prerequisite_name, PrerequisiteDependency.dependent_name,
+               PrerequisiteDependency.action)
+        .order_by((PrerequisiteDependency.tenant_id != DEFAULT_TENANT), PrerequisiteDependency.id)
+    ).all()
+
+def dependency_graph():
+    """The current tenant's graph; overrides are re-read only when they changed"""
+    tenant_id = current_tenant()
+    entry = _cache.get(tenant_id)
+    now = time.monotonic()
+    if entry is not None and now - entry['checked_at'] < REMEDIATION_GRAPH_CHECK_INTERVAL:
+        return entry['graph']
+    # Never wait for the lock: under asgi.py the holder may be suspended on the same thread
+    if not _cache_lock.acquire(blocking=False):
+        return entry['graph'] if entry is not None else _base['graph']
+    try:
+        if entry is None:
+            entry = _cache[tenant_id] = {'graph': None, 'version': None, 'checked_at': 0.0}
+        version = _overrides_version()
+        if entry['graph'] is None or version != entry['version']:
+            entry['graph'] = build_graph(_base['grade_prerequisites'], load_overrides())
+            entry['version'] = version
+    except Exception as e:
+        logging.error(f"Error loading prerequisite dependencies, using grade ordering: {e}")
+        if entry['graph'] is None:
+            entry['graph'] = _base['graph']
+    finally:
+        entry['checked_at'] = time.monotonic()
+        _cache_lock.release()
+    return entry['graph']
+
+def invalidate_graph():
+    """Rebuild on next use (after this process changed the overrides); shared overrides affect every tenant"""
+    for entry in list(_cache.values()):
+        entry['checked_at'] = 0.0
+
+def init_remediation(grade_prerequisites):
+    """Precompute the graph from grade ordering; overrides are applied on first use per tenant"""
+    _base['grade_prerequisites'] = grade_prerequisites
+    _base['graph'] = build_graph(grade_prerequisites)
+    _cache.clear()
+
+def weak_topics(counts, inferred=None, threshold=WEAKNESS_THRESHOLD):
+    """
+    Topics needing remediation from {prerequisite: [correct, total, dont_know]}: a success rate
+    below threshold, only "don't know" answers, or inferred not mastered by an adaptive session
+    """
+    weak = set()
+    for prerequisite, (correct, total, dont_know) in counts.items():
+        attempted = total - dont_know
+        if (attempted == 0 and dont_know > 0) or (attempted > 0 and correct / attempted < threshold):
+            weak.add(prerequisite)
+    if inferred:
+        weak.update(inferred.get('not_mastered', ()))
+    return weak
+
+def recommend(counts, videos, inferred=None, graph=None):
+    """Remediation steps (rows in STEP_FIELDS order), root causes before the topics they block"""
+    graph = graph or dependency_graph()
+    steps = []
+    for topic, root_cause, blocked_by, unlocks in graph.remediation_path(weak_topics(counts, inferred)):
+        success_rate = None
+        if topic in counts:
+            correct, total, dont_know = counts[topic]
+            attempted = total - dont_know
+            success_rate = round(correct / attempted * 100, 1) if attempted else 0.0
+        steps.append([topic, root_cause, blocked_by, unlocks, success_rate, videos.get(topic)])
+    return steps
+
+def validate_override(grade_prerequisites, prerequisite, dependent, action, overrides):
+    """Error message for an override that cannot be applied, or None"""
+    known = {p for prerequisites in grade_prerequisites.values() for p in prerequisites}
+    if prerequisite not in known or dependent not in known:
+        return 'پیش‌نیاز نامعتبر است'
+    if prerequisite == dependent or action not in OVERRIDE_ACTIONS:
+        return 'وابستگی نامعتبر است'
+    nodes = [p for prerequisites in grade_prerequisites.values() for p in prerequisites]
+    edges = set(build_graph(grade_prerequisites, overrides).edges)
+    if action == 'add':
+        try:
+            DependencyGraph(nodes, edges | {(prerequisite, dependent)})
+        except ValueError:
+            return 'این وابستگی یک دور در گراف پیش‌نیازها ایجاد می‌کند'
+    return None
+
+def benchmark(grade_prerequisites, lookups=10000):
+    """Graph build time and cost of one recommendation"""
+    import random
+
+    start = time.perf_counter()
+    graph = build_graph(grade_prerequisites)
+    build = time.perf_counter() - start
+
+    rng = random.Random(3)
+    prerequisites = max(grade_prerequisites.values(), key=len)
+    samples = [{p: [rng.randint(0, 1), 1, 0] for p in prerequisites} for _ in range(100)]
+    start = time.perf_counter()
+    for i in range(lookups):
+        recommend(samples[i % len(samples)], {}, graph=graph)
+    lookup = time.perf_counter() - start
+    return {'topics': len(graph.nodes), 'edges': len(graph.edges), 'build_ms': round(build * 1000, 2),
+            'us_per_recommendation': round(lookup / lookups * 1e6, 1)}
+
+if __name__ == '__main__':
+    from app import app, init_db_if_needed, GRADE_PREREQUISITES
+
+    with app.app_context():
+        init_db_if_needed()
+        graph = dependency_graph()
+        for before, after in sorted(graph.edges, key=lambda edge: (graph.rank[edge[0]], graph.rank[edge[1]])):
+            print(f"{before} -> {after}")
+    print(benchmark(GRADE_PREREQUISITES))
@@ -0,0 +1,128 @@
+"""
+Read-replica routing
+
+When REPLICA_DATABASE_URL is set, read-only admin and analytics views
+(decorated with @replica_reads) run their SELECTs on the replica while
+student traffic and every write stay on the primary. Before routing, the
+replica's replication lag is checked (at most every REPLICA_CHECK_INTERVAL
+seconds); if it exceeds REPLICA_MAX_LAG seconds or the replica is
+unreachable, reads fall back to the primary.
+
+Lag is measured from the WAL replay position on a PostgreSQL standby, and
+otherwise by comparing the newest student_answers.answered_at on both
+databases, which also works for two SQLite files or logically replicated
+instances.
+"""
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from datetime import datetime, timezone
+from flask import g, has_app_context
+from sqlalchemy import text
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_KEY = 'replica'
+REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 10))
+
+_status = {'checked_at': 0.0, 'usable': False, 'lag': None}
+_status_lock = threading.Lock()
+
+def _newest_answer(connection):
+    newest = connection.execute(text("SELECT MAX(answered_at) FROM student_answers")).scalar()
+    if isinstance(newest, str):
+        # SQLite returns raw text for aggregates
+        newest = datetime.fromisoformat(newest)
+    if newest is not None and newest.tzinfo is None:
+        newest = newest.replace(tzinfo=timezone.utc)
+    return newest
+
+def measure_lag(primary, replica):
+    """Replication lag of the replica in seconds (inf when it has none of the primary's answers)"""
+    with replica.connect() as replica_conn:
+        if replica.dialect.name == 'postgresql':
+            lag = replica_conn.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )).scalar()
+            if lag is not None:
+                return float(lag)
+        replica_newest = _newest_answer(replica_conn)
+
+    with primary.connect() as primary_conn:
+        primary_newest = _newest_answer(primary_conn)
+
+    if primary_newest is None:
+        return 0.0
+    if replica_newest is None:
+        return float('inf')
+    return max(0.0, (primary_newest - replica_newest).total_seconds())
+
+def replica_usable(engines):
+    """Whether the replica is reachable and within REPLICA_MAX_LAG; re-checked every REPLICA_CHECK_INTERVAL"""
+    now = time.monotonic()
+    if now - _status['checked_at'] < REPLICA_CHECK_INTERVAL:
+        return _status['usable']
+
+    with _status_lock:
+        if now - _status['checked_at'] < REPLICA_CHECK_INTERVAL:
+            return _status['usable']
+        try:
+            lag = measure_lag(engines[None], engines[REPLICA_BIND_KEY])
+            usable = lag <= REPLICA_MAX_LAG
+            if not usable:
+                logging.warning(f"Replica lag {lag:.1f}s exceeds {REPLICA_MAX_LAG}s; reading from primary")
+        except Exception as e:
+            logging.error(f"Replica check failed, reading from primary: {e}")
+            lag, usable = None, False
+        _status.update(checked_at=time.monotonic(), usable=usable, lag=lag)
+        return usable
+
+def replica_status():
+    """Last replica check result"""
+    return dict(_status)
+
+def reset_replica_status():
+    _status.update(checked_at=0.0, usable=False, lag=None)
+
+class RoutingSession(Session):
+    """Session sending reads to the replica inside @replica_reads views; flushes and DML always go to the primary"""
+
+    # Maps the chosen engine to the one to use; async_db.init_async_db() installs its bind_for under asgi.py
+    bind_hook = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            engine = self._db.engines[REPLICA_BIND_KEY]
+        else:
+            engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        return self.bind_hook(engine) if self.bind_hook is not None else engine
+
+    def _reads_from_replica(self, clause):
+        if not has_app_context() or not g.get('replica_reads'):
+            return False
+        if self._flushing or getattr(clause, 'is_dml', False):
+            return False
+        engines = self._db.engines
+        return REPLICA_BIND_KEY in engines and replica_usable(engines)
+
+def replica_reads(view):
+    """Route the view's read queries to the replica when one is configured and fresh"""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        g.replica_reads = True
+        return view(*args, **kwargs)
+    return decorated_function
+
+def init_replica(app, url=None):
+    """Register the replica bind; call before db.init_app(app)"""
+    url = url or REPLICA_DATABASE_URL
+    if not url:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND_KEY] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+    logging.info("Read replica configured for admin and analytics queries")
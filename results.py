@@ -0,0 +1,174 @@
+"""
+Immutable result snapshots
+
+A completed assessment never changes, so its results are computed once, when
+get_question/get_questions first see the session finish, and stored in
+result_snapshots: the per-prerequisite counts, success rates, video links
+and remediation path (remediation.py) packed into one binary column
+(session_store.pack), plus total/correct/attempted columns that the admin
+dashboard reads instead of aggregating student_answers. get_results serves the stored snapshot from then on.
+
+Sessions completed before snapshots existed (linear mode only; adaptive
+sessions finish at a point not recorded in the database) can be backfilled:
+    python results.py --backfill
+"""
+import logging
+from sqlalchemy import select, func, exc
+from models import db, Student, ResultSnapshot, upsert_insert
+from session_store import pack, unpack
+import reads
+import remediation
+
+STRENGTH_THRESHOLD = 0.7
+
+# Positional layout of a prerequisite row in the payload
+ROW_FIELDS = ('prerequisite', 'correct', 'attempted', 'total', 'dont_know', 'success_rate', 'video_link')
+
+def prerequisite_counts(answers):
+    """{prerequisite: [correct, total, dont_know]} from (prerequisite_name, is_correct) pairs, in answer order"""
+    counts = {}
+    for prerequisite, is_correct in answers:
+        performance = counts.setdefault(prerequisite, [0, 0, 0])
+        performance[1] += 1
+        if is_correct == 1:
+            performance[0] += 1
+        elif is_correct == -1:
+            performance[2] += 1
+    return counts
+
+def _answer_counts(student_id):
+    return prerequisite_counts(reads.answer_outcomes(student_id))
+
+def _videos(counts, inferred):
+    return reads.video_urls(set(counts) | set((inferred or {}).get('not_mastered', ())))
+
+def build_payload(counts, videos, inferred=None):
+    """Compact results: strength and weakness rows, totals, remediation path and adaptive inferences"""
+    strengths, weaknesses = [], []
+    for prerequisite, (correct, total, dont_know) in counts.items():
+        # Success rate excludes "don't know" answers
+        attempted = total - dont_know
+        if attempted == 0:
+            continue
+        success_rate = correct / attempted
+        row = [prerequisite, correct, attempted, total, dont_know, round(success_rate * 100, 1), videos.get(prerequisite)]
+        (strengths if success_rate >= STRENGTH_THRESHOLD else weaknesses).append(row)
+
+    payload = {
+        'score': sum(c[0] for c in counts.values()),
+        'total': sum(c[1] for c in counts.values()),
+        'attempted': sum(c[1] - c[2] for c in counts.values()),
+        'strengths': strengths,
+        'weaknesses': weaknesses,
+        'remediation': remediation.recommend(counts, videos, inferred),
+    }
+    if inferred is not None:
+        payload['inferred'] = inferred
+    return payload
+
+def expand_payload(payload):
+    """Results response body (without 'success') from a payload"""
+    attempted = payload['attempted']
+    results = {
+        'score': payload['score'],
+        'total': payload['total'],
+        'attempted': attempted,
+        'percentage': round((payload['score'] / attempted * 100) if attempted > 0 else 0, 1),
+        'strengths': [dict(zip(ROW_FIELDS, row)) for row in payload['strengths']],
+        'weaknesses': [dict(zip(ROW_FIELDS, row)) for row in payload['weaknesses']],
+    }
+    # Snapshots written before remediation paths existed have none
+    if 'remediation' in payload:
+        results['remediation'] = [dict(zip(remediation.STEP_FIELDS, step)) for step in payload['remediation']]
+    if 'inferred' in payload:
+        results['inferred'] = payload['inferred']
+    return results
+
+def live_results(student_id, inferred=None):
+    """Results computed from the student's answers so far, without storing them"""
+    counts = _answer_counts(student_id)
+    return expand_payload(build_payload(counts, _videos(counts, inferred), inferred))
+
+def load_results(student_id):
+    """Stored results of a completed assessment, or None"""
+    payload = reads.result_payload(student_id)
+    return expand_payload(unpack(payload)) if payload is not None else None
+
+def finalize_results(student_id, inferred=None):
+    """
+    Snapshot the results of a completed assessment unless already stored.
+    Returns the stored results, or None if the snapshot could not be written.
+    """
+    try:
+        existing = load_results(student_id)
+        if existing is not None:
+            return existing
+
+        counts = _answer_counts(student_id)
+        payload = build_payload(counts, _videos(counts, inferred), inferred)
+        row = {
+            'student_id': student_id,
+            'total': payload['total'],
+            'correct': payload['score'],
+            'attempted': payload['attempted'],
+            'payload': pack(payload),
+        }
+        insert = upsert_insert(ResultSnapshot.__table__)
+        if insert is not None:
+            # A concurrent request may have finalized the same session; keep the first snapshot
+            db.session.execute(insert.values(**row).on_conflict_do_nothing(index_elements=['student_id']))
+            db.session.commit()
+        else:
+            try:
+                db.session.add(ResultSnapshot(**row))
+                db.session.commit()
+            except exc.IntegrityError:
+                db.session.rollback()
+        return load_results(student_id)
+    except Exception as e:
+        logging.error(f"Error finalizing results for student {student_id}: {e}")
+        db.session.rollback()
+        return None
+
+def dashboard_rows():
+    """
+    One row per student for the admin dashboard: (id, name, grade, start time, total, correct).
+    Completed sessions read their snapshot; sessions still in progress are
+    aggregated in a single grouped query.
+    """
+    students = reads.student_summaries()
+    in_progress = reads.unsnapshotted_answer_totals() if any(row.total is None for row in students) else {}
+
+    rows = []
+    for student_id, name, grade, start_time, total, correct in students:
+        if total is None:
+            total, correct = in_progress.get(student_id, (0, 0))
+        rows.append((student_id, name, grade, start_time, total, correct))
+    return rows
+
+def backfill_snapshots(grade_prerequisites):
+    """Snapshot linear sessions that answered every prerequisite of their grade. Returns the number written."""
+    written = 0
+    for grade, prerequisites in grade_prerequisites.items():
+        student_ids = db.session.execute(
+            select(Student.id)
+            .outerjoin(ResultSnapshot, ResultSnapshot.student_id == Student.id)
+            .where(Student.student_grade == grade, Student.progress_version >= len(prerequisites),
+                   ResultSnapshot.student_id.is_(None))
+        ).scalars().all()
+        for student_id in student_ids:
+            if finalize_results(student_id) is not None:
+                written += 1
+    return written
+
+if __name__ == '__main__':
+    import sys
+    from app import app, init_db_if_needed, GRADE_PREREQUISITES
+
+    with app.app_context():
+        init_db_if_needed()
+        if '--backfill' in sys.argv:
+            print(f"Wrote {backfill_snapshots(GRADE_PREREQUISITES)} result snapshots")
+        else:
+            total = db.session.execute(select(func.count()).select_from(ResultSnapshot)).scalar()
+            print(f"{total} result snapshots")
@@ -0,0 +1,157 @@
+"""
+Answer retention and archival
+
+Keeps student_answers (the hot table) small by moving answers older than
+ANSWER_ARCHIVE_AFTER_DAYS into student_answers_archive, and drops archived
+answers older than ANSWER_RETENTION_DAYS. On PostgreSQL the archive is a
+native range-partitioned table with one partition per month, so archived
+time windows only scan the matching partitions and retention drops whole
+partitions. On SQLite the archive is a plain table indexed by answered_at.
+
+Run periodically (e.g. nightly cron):
+    python retention.py [archive_after_days] [retention_days]
+"""
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, union_all, func, text
+from models import db, StudentAnswer, StudentAnswerArchive, utc_now
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ANSWER_ARCHIVE_AFTER_DAYS', 90))
+RETENTION_DAYS = int(os.environ.get('ANSWER_RETENTION_DAYS', 730))
+ARCHIVE_BATCH_SIZE = 5000
+
+ANSWER_COLUMNS = ('id', 'tenant_id', 'student_id', 'prerequisite_name', 'student_answer', 'correct_answer', 'is_correct',
+                  'answered_at', 'client_key', 'slot')
+
+def _is_postgresql():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+def _next_month(month_start):
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
+def _partition_name(month_start):
+    return f"student_answers_archive_{month_start:%Y_%m}"
+
+def ensure_archive_partitions(start, end):
+    """Create monthly archive partitions covering [start, end] (PostgreSQL only)"""
+    if not _is_postgresql():
+        return
+    month = _month_start(start)
+    while month <= end:
+        upper = _next_month(month)
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF student_answers_archive "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        month = upper
+
+def archive_old_answers(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move answers older than the cutoff from student_answers to the archive, in batches. Returns rows moved."""
+    hot = StudentAnswer.__table__
+    archive = StudentAnswerArchive.__table__
+    cutoff = utc_now() - timedelta(days=older_than_days)
+    moved = 0
+
+    try:
+        while True:
+            batch = db.session.execute(
+                select(hot.c.id, hot.c.answered_at)
+                .where(hot.c.answered_at < cutoff)
+                .order_by(hot.c.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            ids = [row.id for row in batch]
+            ensure_archive_partitions(min(row.answered_at for row in batch), max(row.answered_at for row in batch))
+            db.session.execute(archive.insert().from_select(
+                list(ANSWER_COLUMNS),
+                select(*[hot.c[name] for name in ANSWER_COLUMNS]).where(hot.c.id.in_(ids))
+            ))
+            db.session.execute(hot.delete().where(hot.c.id.in_(ids)))
+            db.session.commit()
+            moved += len(ids)
+
+        logging.info(f"Archived {moved} answers older than {older_than_days} days")
+        return moved
+
+    except Exception as e:
+        logging.error(f"Error archiving answers: {e}")
+        db.session.rollback()
+        return moved
+
+def purge_archive(retention_days=RETENTION_DAYS):
+    """Delete archived answers older than the retention period. Returns rows removed (unknown for dropped partitions)."""
+    archive = StudentAnswerArchive.__table__
+    cutoff = utc_now() - timedelta(days=retention_days)
+
+    try:
+        if _is_postgresql():
+            # Whole months before the cutoff: drop their partitions instead of deleting rows
+            partitions = db.session.execute(text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                "WHERE parent.relname = 'student_answers_archive'"
+            )).scalars().all()
+            for name in partitions:
+                month = datetime.strptime(name[-7:], '%Y_%m').replace(tzinfo=timezone.utc)
+                if _next_month(month) <= cutoff:
+                    db.session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    logging.info(f"Dropped archive partition {name}")
+
+        result = db.session.execute(archive.delete().where(archive.c.answered_at < cutoff))
+        db.session.commit()
+        return result.rowcount
+
+    except Exception as e:
+        logging.error(f"Error purging archived answers: {e}")
+        db.session.rollback()
+        return 0
+
+def answers_between(start=None, end=None, tenant_id=None):
+    """
+    Selectable over all answers with start <= answered_at < end, optionally
+    limited to one tenant (Core selects are not tenant-filtered automatically).
+    The archive is only included when the window reaches back past the
+    oldest answer still in the hot table.
+    """
+    hot = StudentAnswer.__table__
+    archive = StudentAnswerArchive.__table__
+
+    def windowed(table):
+        query = select(*[table.c[name] for name in ANSWER_COLUMNS])
+        if tenant_id is not None:
+            query = query.where(table.c.tenant_id == tenant_id)
+        if start is not None:
+            query = query.where(table.c.answered_at >= start)
+        if end is not None:
+            query = query.where(table.c.answered_at < end)
+        return query
+
+    oldest_hot = db.session.execute(select(func.min(hot.c.answered_at))).scalar()
+    if start is not None and oldest_hot is not None and _as_utc(start) >= _as_utc(oldest_hot):
+        return windowed(hot).subquery()
+    return union_all(windowed(hot), windowed(archive)).subquery()
+
+def _as_utc(moment):
+    # SQLite returns naive datetimes; they are stored as UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+if __name__ == '__main__':
+    import sys
+    from app import app, init_db_if_needed
+
+    archive_after = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_DAYS
+    retention = int(sys.argv[2]) if len(sys.argv) > 2 else RETENTION_DAYS
+    with app.app_context():
+        init_db_if_needed()
+        print(f"Archived {archive_old_answers(archive_after)} answers")
+        print(f"Purged {purge_archive(retention)} archived answers")
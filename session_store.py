@@ -0,0 +1,324 @@
+"""
+Server-side session storage
+
+Keeps assessment state on the server and only puts a signed session id in
+the cookie. Backends:
+- 'cookie': Flask's default signed cookie session (no server state)
+- 'memory': in-process LRU, fastest but per-worker
+- 'sql': shared table in the application database
+- 'tiered': in-process LRU in front of the shared table, whose entries are
+  only served while their version still matches the shared row
+"""
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SecureCookieSession
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import select
+from models import db, ServerSession
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Format markers prefixed to every serialized payload
+_FORMAT_MSGPACK = b'm'
+_FORMAT_JSON = b'j'
+
+def pack(data: dict) -> bytes:
+    """Serialize session data to compact bytes (msgpack when installed, compact JSON otherwise)"""
+    if msgpack is not None:
+        return _FORMAT_MSGPACK + msgpack.packb(data, use_bin_type=True)
+    return _FORMAT_JSON + json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def unpack(payload: bytes) -> dict:
+    """Deserialize bytes produced by pack()"""
+    marker, body = payload[:1], payload[1:]
+    if marker == _FORMAT_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Session was stored with msgpack, which is not installed")
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body.decode('utf-8'))
+
+class MemorySessionStore:
+    """In-process LRU session store with per-entry expiry"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return payload
+
+    def set(self, sid, payload, expires_at):
+        with self._lock:
+            self._entries[sid] = (payload, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+class SQLSessionStore:
+    """Session store backed by the server_sessions table, shared by all workers"""
+
+    def __init__(self, database=db):
+        self.db = database
+        self.table = ServerSession.__table__
+
+    def get(self, sid):
+        entry = self.get_entry(sid)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, sid):
+        """(payload, version) of a live session, or None"""
+        with self.db.engine.connect() as conn:
+            row = conn.execute(
+                self.table.select().where(self.table.c.sid == sid)
+            ).first()
+        if row is None or row.expires_at < time.time():
+            return None
+        return row.data, row.version
+
+    def get_version(self, sid):
+        """Version of a live session without reading its payload, or None"""
+        table = self.table
+        with self.db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.version, table.c.expires_at).where(table.c.sid == sid)
+            ).first()
+        if row is None or row.expires_at < time.time():
+            return None
+        return row.version
+
+    def set(self, sid, payload, expires_at):
+        """Store the payload, returns its new version"""
+        version = secrets.token_hex(8)
+        values = dict(data=payload, expires_at=int(expires_at), version=version)
+        with self.db.engine.begin() as conn:
+            result = conn.execute(self.table.update().where(self.table.c.sid == sid).values(**values))
+            if result.rowcount == 0:
+                conn.execute(self.table.insert().values(sid=sid, **values))
+        return version
+
+    def delete(self, sid):
+        with self.db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.sid == sid))
+
+    def purge_expired(self):
+        """Delete expired sessions, returns number of rows removed"""
+        with self.db.engine.begin() as conn:
+            result = conn.execute(self.table.delete().where(self.table.c.expires_at < int(time.time())))
+        return result.rowcount
+
+class TieredSessionStore:
+    """
+    LRU of (version, payload) in front of the SQL store. Each read checks the
+    shared row's version, which costs one indexed lookup but no payload
+    transfer or decode; a local copy is served only while it is current, so a
+    write or delete from any worker is seen on the next request.
+    """
+
+    # Bounds memory held by idle sessions; correctness comes from the version check
+    local_ttl = float(os.environ.get('SESSION_LOCAL_TTL', 300))
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, sid):
+        cached = self.local.get(sid)
+        if cached is not None:
+            version, payload = cached
+            current = self.shared.get_version(sid)
+            if current is None:
+                self.local.delete(sid)
+                return None
+            if current == version:
+                return payload
+        entry = self.shared.get_entry(sid)
+        if entry is None:
+            self.local.delete(sid)
+            return None
+        payload, version = entry
+        if version is not None:
+            # Rows written before versions existed are never cached
+            self.local.set(sid, (version, payload), time.time() + self.local_ttl)
+        return payload
+
+    def set(self, sid, payload, expires_at):
+        version = self.shared.set(sid, payload, expires_at)
+        self.local.set(sid, (version, payload), min(expires_at, time.time() + self.local_ttl))
+
+    def delete(self, sid):
+        self.local.delete(sid)
+        self.shared.delete(sid)
+
+class ServerSideSession(SecureCookieSession):
+    """Session dict that remembers its server-side id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface storing session data in a SessionStore, keyed by a signed cookie id"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+
+            if sid:
+                payload = self.store.get(sid)
+                if payload is not None:
+                    try:
+                        return ServerSideSession(unpack(payload), sid=sid)
+                    except ValueError as e:
+                        logging.warning(f"Discarding unreadable session {sid}: {e}")
+
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        expires = self.get_expiration_time(app, session)
+        expires_at = expires.timestamp() if expires else time.time() + app.permanent_session_lifetime.total_seconds()
+
+        if session.modified or session.new:
+            self.store.set(session.sid, pack(dict(session)), expires_at)
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode('ascii')).decode('ascii'),
+            expires=expires,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+def create_session_store(backend):
+    """Build the session store for a backend name, or None for Flask's cookie sessions"""
+    max_entries = int(os.environ.get('SESSION_LRU_SIZE', 10000))
+    if backend == 'memory':
+        return MemorySessionStore(max_entries)
+    if backend == 'sql':
+        return SQLSessionStore()
+    if backend == 'tiered':
+        return TieredSessionStore(MemorySessionStore(max_entries), SQLSessionStore())
+    return None
+
+def init_session_backend(app, backend=None):
+    """Install the configured session backend on the app (SESSION_BACKEND, default 'cookie')"""
+    backend = backend or os.environ.get('SESSION_BACKEND', 'cookie')
+    store = create_session_store(backend)
+    if store is None:
+        return
+    app.session_interface = ServerSideSessionInterface(store)
+    logging.info(f"Using server-side session backend: {backend}")
+
+def benchmark(iterations=2000):
+    """
+    Measure per-request session overhead (open + save) for each backend
+    with a typical adaptive assessment payload. Returns microseconds per request
+    and the bytes sent in the Cookie header.
+    """
+    from flask import request
+    from app import app, init_db_if_needed
+    import adaptive
+
+    payload = {
+        'student_id': 12345,
+        'student_grade': 'دوازدهم',
+        'current_prerequisite_index': 12,
+        'score': 9,
+        'total_questions': 12,
+        'assessment_mode': 'adaptive',
+        'adaptive_state': adaptive.new_state(35),
+    }
+    original_interface = app.session_interface
+    results = {}
+
+    with app.app_context():
+        init_db_if_needed()
+
+    try:
+        for backend in ('cookie', 'memory', 'sql', 'tiered'):
+            app.session_interface = original_interface
+            init_session_backend(app, backend)
+
+            # First request stores the session and yields the cookie
+            with app.test_request_context('/'):
+                session = app.session_interface.open_session(app, request)
+                session.update(payload)
+                response = app.response_class()
+                app.session_interface.save_session(app, session, response)
+                cookie = response.headers['Set-Cookie'].split(';', 1)[0]
+
+            start = time.perf_counter()
+            for i in range(iterations):
+                with app.test_request_context('/', headers={'Cookie': cookie}):
+                    session = app.session_interface.open_session(app, request)
+                    session['score'] = i
+                    response = app.response_class()
+                    app.session_interface.save_session(app, session, response)
+            elapsed = time.perf_counter() - start
+
+            results[backend] = {
+                'us_per_request': round(elapsed / iterations * 1e6, 1),
+                'cookie_bytes': len(cookie),
+            }
+    finally:
+        app.session_interface = original_interface
+
+    return results
+
+if __name__ == '__main__':
+    for backend, row in benchmark().items():
+        print(f"{backend:<8} {row['us_per_request']:>10} us/request {row['cookie_bytes']:>6} cookie bytes")
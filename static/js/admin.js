@@ -189,6 +189,144 @@ class AdminPanel {
     }
 }
 
+// Live dashboard: patches the students table in place from the server's SSE deltas,
+// or from periodically polled rows when the server does not stream
+class LiveDashboard {
+    constructor(container) {
+        this.tbody = document.getElementById('students-table-body');
+        this.pollUrl = container.dataset.pollUrl;
+        this.pollInterval = (parseInt(container.dataset.pollInterval, 10) || 10) * 1000;
+        if (container.dataset.liveMode === 'sse' && window.EventSource) {
+            this.stream(container.dataset.streamUrl);
+        } else {
+            this.startPolling();
+        }
+    }
+    
+    stream(url) {
+        this.source = new EventSource(url);
+        this.source.addEventListener('session', (e) => this.addStudent(JSON.parse(e.data)));
+        this.source.addEventListener('progress', (e) => this.updateProgress(JSON.parse(e.data)));
+        // The server could not replay what we missed; start over from a full page
+        this.source.addEventListener('reload', () => {
+            this.source.close();
+            location.reload();
+        });
+        // Every stream slot is taken (or streaming was turned off); poll instead
+        this.source.addEventListener('poll', () => {
+            this.source.close();
+            this.startPolling();
+        });
+    }
+    
+    startPolling() {
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(() => this.poll(), this.pollInterval);
+        }
+    }
+    
+    async poll() {
+        try {
+            const response = await fetch(this.pollUrl, { headers: { 'Accept': 'application/json' } });
+            const data = await response.json();
+            if (!data.success) return;
+            data.students.forEach(student => {
+                if (!this.row(student.id)) this.addStudent(student);
+                this.updateProgress(student);
+            });
+        } catch (error) {
+            // Try again on the next tick
+        }
+    }
+    
+    row(studentId) {
+        return this.tbody ? this.tbody.querySelector(`tr[data-student-id="${studentId}"]`) : null;
+    }
+    
+    addStudent(student) {
+        if (!this.tbody) {
+            // Empty state has no table yet
+            location.reload();
+            return;
+        }
+        if (this.row(student.id)) return;
+        
+        const row = document.createElement('tr');
+        row.dataset.studentId = student.id;
+        row.innerHTML = `
+            <td></td>
+            <td><i class="fas fa-user me-2"></i><span data-field="name"></span></td>
+            <td><span class="badge bg-info" data-field="grade"></span></td>
+            <td data-field="start"></td>
+            <td data-field="total">0</td>
+            <td data-field="correct">0</td>
+            <td data-field="percentage">
+                <div class="progress" style="height: 20px;">
+                    <div class="progress-bar" role="progressbar" aria-valuemin="0" aria-valuemax="100"></div>
+                </div>
+            </td>
+            <td data-field="status"></td>
+        `;
+        row.querySelector('[data-field="name"]').textContent = student.name;
+        row.querySelector('[data-field="grade"]').textContent = student.grade;
+        row.querySelector('[data-field="start"]').textContent = student.start_time;
+        
+        // Rows are ordered by student id, so new sessions go last
+        this.tbody.appendChild(row);
+        row.cells[0].textContent = this.tbody.rows.length;
+        this.setPercentage(row, 0, 0);
+        this.updateSummary();
+    }
+    
+    updateProgress(progress) {
+        const row = this.row(progress.id);
+        if (!row) return;
+        
+        row.querySelector('[data-field="total"]').textContent = progress.total;
+        row.querySelector('[data-field="correct"]').textContent = progress.correct;
+        this.setPercentage(row, progress.correct, progress.total);
+        
+        if (progress.completed && !row.querySelector('.fa-check-circle')) {
+            const icon = document.createElement('i');
+            icon.className = 'fas fa-check-circle text-success ms-2';
+            row.cells[1].appendChild(icon);
+        }
+        this.updateSummary();
+    }
+    
+    setPercentage(row, correct, total) {
+        const percentage = total > 0 ? Math.round(correct / total * 1000) / 10 : 0;
+        const text = total > 0 ? percentage.toFixed(1) : '0';
+        row.dataset.percentage = percentage;
+        
+        const bar = row.querySelector('.progress-bar');
+        bar.className = `progress-bar ${percentage >= 80 ? 'bg-success' : percentage >= 60 ? 'bg-warning' : 'bg-danger'}`;
+        bar.style.width = `${percentage}%`;
+        bar.setAttribute('aria-valuenow', percentage);
+        bar.textContent = `${text}%`;
+        
+        const status = row.querySelector('[data-field="status"]');
+        if (percentage >= 80) {
+            status.innerHTML = '<span class="badge bg-success">عالی</span>';
+        } else if (percentage >= 60) {
+            status.innerHTML = '<span class="badge bg-warning">متوسط</span>';
+        } else {
+            status.innerHTML = '<span class="badge bg-danger">نیاز به تمرین</span>';
+        }
+    }
+    
+    updateSummary() {
+        const rows = Array.from(this.tbody.rows);
+        const count = document.getElementById('students-count');
+        const average = document.getElementById('students-average');
+        if (count) count.textContent = rows.length;
+        if (average && rows.length) {
+            const sum = rows.reduce((total, row) => total + (parseFloat(row.dataset.percentage) || 0), 0);
+            average.textContent = `${(sum / rows.length).toFixed(1)}%`;
+        }
+    }
+}
+
 // Global functions for backward compatibility
 window.sortTable = function(sortBy) {
     if (window.adminPanel) {
@@ -209,6 +347,11 @@ document.addEventListener('DOMContentLoaded', () => {
     // Apply formatting
     window.adminPanel.formatNumbers();
     window.adminPanel.highlightQualityIndicators();
+    
+    const liveContainer = document.getElementById('students-live');
+    if (liveContainer) {
+        window.liveDashboard = new LiveDashboard(liveContainer);
+    }
 });
 
 // Analytics Chart Helper (if Chart.js is available)
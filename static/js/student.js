@@ -5,6 +5,13 @@ class StudentAssessment {
         this.questionNumber = 1;
         this.isWaitingForNext = false;
         
+        // Prefetched questions and answers waiting to be sent (kept across reloads for offline use)
+        this.questionQueue = [];
+        this.prefetchCount = 5;
+        this.maxStartAttempts = 5;
+        this.pendingAnswers = this.loadPendingAnswers();
+        this.completed = false;
+        
         this.initializeEventListeners();
     }
     
@@ -48,6 +55,11 @@ class StudentAssessment {
             });
         }
         
+        // Send answers queued while offline as soon as the connection is back
+        window.addEventListener('online', () => {
+            this.flushPendingAnswers().catch(error => console.error('Error sending queued answers:', error));
+        });
+        
         // Math keyboard buttons
         this.initializeMathKeyboard();
     }
@@ -82,6 +94,8 @@ class StudentAssessment {
     async startSession() {
         const name = document.getElementById('student-name').value.trim();
         const grade = document.getElementById('student-grade').value;
+        const modeSelect = document.getElementById('assessment-mode');
+        const mode = modeSelect ? modeSelect.value : 'linear';
         
         if (!name || !grade) {
             this.showAlert('لطفا تمام فیلدها را پر کنید', 'danger');
@@ -91,17 +105,33 @@ class StudentAssessment {
         this.showLoading(true);
         
         try {
-            const response = await fetch('/api/start_session', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ name, grade })
-            });
+            let response;
+            // A busy server answers 429; wait as told by Retry-After and try again
+            for (let attempt = 0; attempt < this.maxStartAttempts; attempt++) {
+                response = await fetch('/api/start_session', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ name, grade, mode })
+                });
+                if (response.status !== 429 || attempt === this.maxStartAttempts - 1) {
+                    break;
+                }
+                const seconds = parseInt(response.headers.get('Retry-After'), 10) || 2;
+                this.showAlert(`سرور شلوغ است، ${seconds} ثانیه دیگر دوباره تلاش می‌شود...`, 'warning');
+                await new Promise(resolve => setTimeout(resolve, seconds * 1000));
+            }
             
             const data = await response.json();
             
             if (data.success) {
+                // Answers queued for an earlier session must not be sent to this one
+                this.pendingAnswers = [];
+                this.savePendingAnswers();
+                this.questionQueue = [];
+                this.completed = false;
+                
                 this.hideForm();
                 this.showQuestionSection();
                 // ✅ یک تأخیر کوتاه اضافه شده تا نمایش صفحه تضمین شود
@@ -120,28 +150,113 @@ class StudentAssessment {
     }
     
     async getNextQuestion() {
-        this.showLoading(true);
         this.hideFeedback();
         
-        try {
-            const response = await fetch('/api/get_question');
-            const data = await response.json();
-            
-            if (data.success) {
-                if (data.completed) {
-                    this.showResults(data.score, data.total);
-                } else {
-                    this.displayQuestion(data.question);
-                }
-            } else {
-                this.showAlert(data.error || 'خطا در دریافت سوال', 'danger');
+        if (this.questionQueue.length === 0) {
+            this.showLoading(true);
+            try {
+                await this.flushPendingAnswers();
+                await this.prefetchQuestions();
+            } catch (error) {
+                console.error('Error getting question:', error);
+                this.showAlert('خطا در ارتباط با سرور', 'danger');
+                return;
+            } finally {
+                this.showLoading(false);
+            }
+        }
+        
+        if (this.questionQueue.length > 0) {
+            this.displayQuestion(this.questionQueue.shift());
+        } else if (this.completed) {
+            this.showResults(this.finalScore, this.finalTotal);
+        }
+    }
+    
+    async prefetchQuestions() {
+        const response = await fetch(`/api/get_questions?count=${this.prefetchCount}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            this.showAlert(data.error || 'خطا در دریافت سوال', 'danger');
+            return;
+        }
+        
+        if (data.completed) {
+            this.completed = true;
+            this.finalScore = data.score;
+            this.finalTotal = data.total;
+            return;
+        }
+        
+        // Skip slots that are already queued or answered but not yet sent
+        const known = new Set([
+            ...this.questionQueue.map(q => q.slot),
+            ...this.pendingAnswers.map(a => a.slot)
+        ]);
+        data.questions.forEach(question => {
+            if (!known.has(question.slot)) {
+                this.questionQueue.push(question);
             }
+        });
+    }
+    
+    loadPendingAnswers() {
+        try {
+            return JSON.parse(localStorage.getItem('pendingAnswers') || '[]');
         } catch (error) {
-            console.error('Error getting question:', error);
-            this.showAlert('خطا در ارتباط با سرور', 'danger');
-        } finally {
-            this.showLoading(false);
+            return [];
+        }
+    }
+    
+    savePendingAnswers() {
+        try {
+            localStorage.setItem('pendingAnswers', JSON.stringify(this.pendingAnswers));
+        } catch (error) {
+            console.error('Error saving pending answers:', error);
+        }
+    }
+    
+    newAnswerKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
         }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+    
+    async flushPendingAnswers() {
+        // Sends all queued answers in one request; returns the per-answer results
+        if (this.pendingAnswers.length === 0) {
+            return [];
+        }
+        
+        const response = await fetch('/api/submit_answers', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ answers: this.pendingAnswers })
+        });
+        const data = await response.json();
+        
+        if (!data.results) {
+            throw new Error(data.error || 'خطا در ثبت پاسخ‌ها');
+        }
+        
+        // Drop answers the server has recorded (including retried duplicates)
+        const recorded = new Set(data.results.filter(r => r.success).map(r => r.key));
+        this.pendingAnswers = this.pendingAnswers.filter(a => !recorded.has(a.key));
+        
+        // A rejected answer cannot be replayed; resynchronise with the server
+        if (!data.success) {
+            this.pendingAnswers = [];
+            this.questionQueue = [];
+            const failed = data.results.find(r => !r.success);
+            this.showAlert((failed && failed.error) || 'خطا در ثبت پاسخ', 'danger');
+        }
+        
+        this.savePendingAnswers();
+        return data.results;
     }
     
     displayQuestion(question) {
@@ -177,34 +292,48 @@ class StudentAssessment {
         this.setFormEnabled(false);
         this.showLoading(true);
         
+        const item = { slot: this.currentQuestion.slot, answer, key: this.newAnswerKey() };
+        this.pendingAnswers.push(item);
+        this.savePendingAnswers();
+        
         try {
-            const response = await fetch('/api/submit_answer', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ answer })
-            });
+            const results = await this.flushPendingAnswers();
+            const result = results.find(r => r.key === item.key);
             
-            const data = await response.json();
-            
-            if (data.success) {
-                this.showFeedback(data.correct, data.correct_answer, answer, data.dont_know);
+            if (result && result.success) {
+                this.showFeedback(result.correct, result.correct_answer, answer, result.dont_know);
                 this.questionNumber++;
                 this.isWaitingForNext = true;
             } else {
-                this.showAlert(data.error || 'خطا در ثبت پاسخ', 'danger');
-                this.setFormEnabled(true);
+                // Rejected by the server: continue from the server's current question
+                this.getNextQuestion();
             }
         } catch (error) {
+            // Offline: keep the answer queued and continue with prefetched questions
             console.error('Error submitting answer:', error);
-            this.showAlert('خطا در ارتباط با سرور', 'danger');
-            this.setFormEnabled(true);
+            this.showOfflineFeedback();
+            this.questionNumber++;
+            this.isWaitingForNext = true;
         } finally {
             this.showLoading(false);
         }
     }
     
+    showOfflineFeedback() {
+        const feedbackSection = document.getElementById('feedback-section');
+        const feedbackContent = document.getElementById('feedback-content');
+        
+        feedbackContent.innerHTML = `
+            <div class="text-info">
+                <i class="fas fa-cloud-upload-alt fa-3x mb-3"></i>
+                <h4>پاسخ شما ذخیره شد</h4>
+                <p class="mb-0">پس از برقراری اتصال به‌طور خودکار ارسال می‌شود</p>
+            </div>
+        `;
+        feedbackSection.style.display = 'block';
+        feedbackSection.classList.add('feedback-animation');
+    }
+    
     showFeedback(isCorrect, correctAnswer, userAnswer, isDontKnow = false) {
         const feedbackSection = document.getElementById('feedback-section');
         const feedbackContent = document.getElementById('feedback-content');
@@ -296,6 +425,10 @@ class StudentAssessment {
         const analysisHtml = this.createAnalysisTable(data.strengths, data.weaknesses);
         document.getElementById('final-score').innerHTML += analysisHtml;
         
+        if (data.remediation && data.remediation.length > 0) {
+            document.getElementById('final-score').innerHTML += this.createRemediationPath(data.remediation);
+        }
+        
         // Add download button
         document.getElementById('final-score').innerHTML += `
             <div class="mt-4">
@@ -401,6 +534,40 @@ class StudentAssessment {
         return html;
     }
     
+    createRemediationPath(steps) {
+        // Steps arrive in study order: root causes before the topics that build on them
+        let html = `
+            <div class="mt-4">
+                <h4 class="text-primary mb-3">
+                    <i class="fas fa-route me-2"></i>مسیر پیشنهادی یادگیری
+                </h4>
+                <ol class="list-group list-group-numbered">
+        `;
+        
+        steps.forEach(step => {
+            const badge = step.root_cause ?
+                '<span class="badge bg-danger ms-2">شروع از اینجا</span>' :
+                `<span class="badge bg-secondary ms-2">پس از: ${step.blocked_by.join('، ')}</span>`;
+            const videoLink = step.video_link ?
+                `<a href="${step.video_link}" target="_blank" class="btn btn-sm btn-outline-primary">
+                    <i class="fas fa-play me-1"></i>مشاهده ویدیو
+                </a>` : '';
+            
+            html += `
+                <li class="list-group-item d-flex justify-content-between align-items-start">
+                    <div class="ms-2 me-auto">
+                        <div class="fw-bold">${step.prerequisite}${badge}</div>
+                        ${step.success_rate !== null ? `<small class="text-muted">درصد موفقیت: ${step.success_rate}%</small>` : ''}
+                    </div>
+                    ${videoLink}
+                </li>
+            `;
+        });
+        
+        html += '</ol></div>';
+        return html;
+    }
+    
     hideForm() {
         document.getElementById('student-form').style.display = 'none';
     }
@@ -0,0 +1,248 @@
+"""
+Synthetic dataset generator for benchmarks
+
+Bulk-loads reproducible fake students, answers and questions at production
+scale. Each student has a latent ability drawn from a normal distribution;
+each prerequisite has a difficulty that grows along its grade's list. A
+student answers correctly with probability sigmoid(ability - difficulty)
+and says "don't know" to a share of the questions they would miss.
+Sessions are spread over the last --days days; a --complete share of
+students finish every prerequisite of their grade, the rest stop part way.
+
+Rows are written with multi-row INSERTs, or COPY on PostgreSQL, and the
+prerequisite rollups are rebuilt afterwards. --benchmark then times the
+admin pages and analytics APIs against the loaded data.
+
+    python synthetic_data.py --students 100000 --seed 1 [--benchmark]
+
+Intended for a scratch database: point DATABASE_URL at one first.
+"""
+import io
+import csv
+import math
+import time
+import random
+import logging
+import argparse
+from datetime import timedelta
+from sqlalchemy import func, select, text
+from models import db, Question, Student, StudentAnswer, utc_now
+from tenancy import DEFAULT_TENANT, tenant_scope
+
+BATCH_SIZE = 10000
+
+def sigmoid(x):
+    return 1 / (1 + math.exp(-x))
+
+def prerequisite_difficulties(grade_prerequisites, rng, spread=1.0, step=0.05):
+    """Difficulty per (grade, position): later prerequisites of a grade are harder, plus noise"""
+    return {
+        grade: [step * position + rng.gauss(0, spread) for position in range(len(prerequisites))]
+        for grade, prerequisites in grade_prerequisites.items()
+    }
+
+def generate_rows(grade_prerequisites, students, seed=1, ability_mean=0.0, ability_sd=1.0,
+                  dont_know_rate=0.3, complete_rate=0.8, days=90, tenants=(DEFAULT_TENANT,), first_student_id=1):
+    """
+    Yield ('student', row) and ('answer', row) dicts for bulk insert.
+    The same arguments always produce the same rows.
+    """
+    rng = random.Random(seed)
+    grades = list(grade_prerequisites)
+    difficulties = prerequisite_difficulties(grade_prerequisites, rng)
+    now = utc_now()
+
+    for student_id in range(first_student_id, first_student_id + students):
+        grade = rng.choice(grades)
+        prerequisites = grade_prerequisites[grade]
+        tenant_id = rng.choice(tenants)
+        ability = rng.gauss(ability_mean, ability_sd)
+        started_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        answered = len(prerequisites) if rng.random() < complete_rate else rng.randint(0, len(prerequisites) - 1)
+
+        yield 'student', {
+            'id': student_id,
+            'tenant_id': tenant_id,
+            'student_name': f"دانش‌آموز {student_id}",
+            'student_grade': grade,
+            'session_start_time': started_at,
+            'progress_version': answered,
+        }
+
+        answered_at = started_at
+        for slot in range(answered):
+            answered_at += timedelta(seconds=rng.uniform(10, 90))
+            p_correct = sigmoid(ability - difficulties[grade][slot])
+            if rng.random() < p_correct:
+                is_correct, student_answer = 1, '۱'
+            elif rng.random() < dont_know_rate:
+                is_correct, student_answer = -1, 'بلد نیستم'
+            else:
+                is_correct, student_answer = 0, '۰'
+            yield 'answer', {
+                'tenant_id': tenant_id,
+                'student_id': student_id,
+                'slot': slot,
+                'prerequisite_name': prerequisites[slot],
+                'student_answer': student_answer,
+                'correct_answer': '۱',
+                'is_correct': is_correct,
+                'answered_at': answered_at,
+            }
+
+def generate_questions(prerequisites, per_prerequisite, seed=1, tenant_id=DEFAULT_TENANT):
+    """Question rows with plausible usage and analytics values"""
+    rng = random.Random(seed)
+    for prerequisite in prerequisites:
+        for i in range(per_prerequisite):
+            yield {
+                'tenant_id': tenant_id,
+                'prerequisite_name': prerequisite,
+                'difficulty_level': rng.choice(('easy', 'medium', 'hard')),
+                'question_text': f"سوال آزمایشی {seed}-{i} برای {prerequisite}",
+                'correct_answer': '۱',
+                'times_used': rng.randint(0, 5000),
+                'avg_difficulty_percent': round(rng.uniform(10, 95), 1),
+                'avg_discrimination_index': round(rng.uniform(-0.1, 0.7), 3),
+            }
+
+def _copy_rows(conn, table, rows):
+    """Load rows with PostgreSQL COPY"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([r'\N' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+def bulk_insert(conn, table, rows):
+    if not rows:
+        return
+    if conn.dialect.name == 'postgresql':
+        _copy_rows(conn, table, rows)
+    else:
+        conn.execute(table.insert(), rows)
+
+def load(grade_prerequisites, students, questions_per_prerequisite=0, batch_size=BATCH_SIZE, **options):
+    """Generate and bulk-load a dataset. Returns row counts and load time."""
+    start = time.perf_counter()
+    counts = {'student': 0, 'answer': 0, 'question': 0}
+    tables = {'student': Student.__table__, 'answer': StudentAnswer.__table__}
+    first_student_id = (db.session.execute(
+        select(func.max(Student.id)).execution_options(all_tenants=True)
+    ).scalar() or 0) + 1
+
+    with db.engine.begin() as conn:
+        batches = {'student': [], 'answer': []}
+        rows = generate_rows(grade_prerequisites, students, first_student_id=first_student_id, **options)
+        for kind, row in rows:
+            batches[kind].append(row)
+            if len(batches[kind]) >= batch_size:
+                # Answers reference students, so flush pending students first
+                bulk_insert(conn, tables['student'], batches['student'])
+                counts['student'] += len(batches['student'])
+                batches['student'] = []
+                if kind == 'answer':
+                    bulk_insert(conn, tables['answer'], batches['answer'])
+                    counts['answer'] += len(batches['answer'])
+                    batches['answer'] = []
+        for kind in ('student', 'answer'):
+            bulk_insert(conn, tables[kind], batches[kind])
+            counts[kind] += len(batches[kind])
+
+        if questions_per_prerequisite:
+            prerequisites = sorted({p for prereqs in grade_prerequisites.values() for p in prereqs})
+            question_rows = list(generate_questions(prerequisites, questions_per_prerequisite, options.get('seed', 1)))
+            for i in range(0, len(question_rows), batch_size):
+                bulk_insert(conn, Question.__table__, question_rows[i:i + batch_size])
+            counts['question'] = len(question_rows)
+
+        if conn.dialect.name == 'postgresql':
+            # Explicit ids bypass the sequences
+            for table in ('students', 'student_answers', 'questions'):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                  f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+
+    counts['seconds'] = round(time.perf_counter() - start, 1)
+    return counts
+
+def benchmark_pages(app, tenant_id=DEFAULT_TENANT, repeat=3):
+    """
+    Cold (first) and best-of-repeat response time in ms of the admin pages and
+    analytics APIs. The analytics fragment cache is cleared before every run so
+    each one takes the uncached path.
+    """
+    import app as app_module
+    from fragment_cache import fragment_cache
+    from app import ADMIN_USERNAME, ADMIN_PASSWORD, GRADE_PREREQUISITES
+    from tenancy import TENANT_HEADER, TENANT_PROXY_SECRET_HEADER, TENANT_PROXY_SECRET, TENANT_ADMINS
+
+    grade = next(iter(GRADE_PREREQUISITES))
+    paths = [
+        '/admin/dashboard',
+        '/admin/analytics',
+        '/admin/analytics?sort=discrimination&order=desc&page=2',
+        f'/admin/api/prerequisite_performance?grade={grade}',
+        '/admin/api/prerequisite_performance?days=30',
+        f'/admin/api/weakest_prerequisites?grade={grade}&days=7',
+    ]
+    # Other schools are reached the way the trusted proxy does it
+    headers = {}
+    if tenant_id != DEFAULT_TENANT:
+        headers = {TENANT_HEADER: tenant_id, TENANT_PROXY_SECRET_HEADER: TENANT_PROXY_SECRET or ''}
+    username, password = TENANT_ADMINS.get(tenant_id, (ADMIN_USERNAME, ADMIN_PASSWORD))
+    client = app.test_client()
+    client.post('/admin/login', data={'username': username, 'password': password}, headers=headers)
+
+    timings = {}
+    for path in paths:
+        runs = []
+        for _ in range(repeat):
+            fragment_cache.clear()
+            app_module._analytics_calculated_versions.clear()
+            start = time.perf_counter()
+            status = client.get(path, headers=headers).status_code
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[path] = (status, round(runs[0], 1), round(min(runs), 1))
+    return timings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ability-mean', type=float, default=0.0)
+    parser.add_argument('--ability-sd', type=float, default=1.0)
+    parser.add_argument('--dont-know-rate', type=float, default=0.3, help="share of wrong answers given as don't know")
+    parser.add_argument('--complete-rate', type=float, default=0.8, help='share of students finishing their grade')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--tenants', type=int, default=1, help='spread students over this many schools')
+    parser.add_argument('--questions-per-prerequisite', type=int, default=0)
+    parser.add_argument('--benchmark', action='store_true', help='time admin pages after loading')
+    parser.add_argument('--benchmark-only', action='store_true', help='skip loading')
+    args = parser.parse_args()
+
+    from app import app, init_db_if_needed, GRADE_PREREQUISITES
+    from analytics import rebuild_answer_rollups
+
+    logging.getLogger().setLevel(logging.WARNING)
+    tenants = (DEFAULT_TENANT,) + tuple(f"school-{i}" for i in range(1, args.tenants))
+    with app.app_context():
+        init_db_if_needed()
+        if not args.benchmark_only:
+            counts = load(
+                GRADE_PREREQUISITES, args.students, args.questions_per_prerequisite,
+                seed=args.seed, ability_mean=args.ability_mean, ability_sd=args.ability_sd,
+                dont_know_rate=args.dont_know_rate, complete_rate=args.complete_rate,
+                days=args.days, tenants=tenants,
+            )
+            print(f"Loaded {counts['student']} students, {counts['answer']} answers, "
+                  f"{counts['question']} questions in {counts['seconds']}s")
+            for tenant_id in tenants:
+                with tenant_scope(tenant_id):
+                    print(f"Rebuilt {rebuild_answer_rollups()} rollup rows for {tenant_id}")
+
+    if args.benchmark or args.benchmark_only:
+        for path, (status, cold_ms, best_ms) in benchmark_pages(app).items():
+            print(f"{cold_ms:>10} ms cold {best_ms:>10} ms best  {status}  {path}")
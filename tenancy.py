@@ -0,0 +1,109 @@
+"""
+Per-school (tenant) scoping
+
+Every request is bound to a tenant id, taken from the TENANT_HEADER request
+header (set by the proxy in front of each school's hostname) or, with
+TENANT_FROM_SUBDOMAIN=1, from the first label of the host name. Requests
+without either belong to DEFAULT_TENANT, so single-school deployments work
+unchanged. The header is only trusted when the proxy also sends
+TENANT_PROXY_SECRET in TENANT_PROXY_SECRET_HEADER; otherwise requests carrying
+it are rejected, since clients could pick any school by setting it.
+
+Admins log in per school: TENANT_ADMINS is a JSON object mapping tenant ids
+to {"username": ..., "password": ...}. The global ADMIN_USERNAME and
+ADMIN_PASSWORD only grant access to DEFAULT_TENANT.
+
+Tenant-scoped models (see models.py) are filtered to the current tenant on
+every ORM query and stamped with it on insert. Background jobs and CLI
+scripts run as DEFAULT_TENANT unless wrapped in tenant_scope().
+"""
+import os
+import re
+import hmac
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, has_app_context, request, abort
+
+DEFAULT_TENANT = 'default'
+TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant-ID')
+TENANT_FROM_SUBDOMAIN = os.environ.get('TENANT_FROM_SUBDOMAIN') == '1'
+TENANT_PROXY_SECRET = os.environ.get('TENANT_PROXY_SECRET')
+TENANT_PROXY_SECRET_HEADER = os.environ.get('TENANT_PROXY_SECRET_HEADER', 'X-Tenant-Proxy-Secret')
+TENANT_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+def _load_tenant_admins():
+    raw = os.environ.get('TENANT_ADMINS')
+    if not raw:
+        return {}
+    try:
+        admins = json.loads(raw)
+        return {tenant_id.strip().lower(): (entry['username'], entry['password'])
+                for tenant_id, entry in admins.items()}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logging.error(f"Ignoring invalid TENANT_ADMINS: {e}")
+        return {}
+
+TENANT_ADMINS = _load_tenant_admins()
+
+_job_tenant = ContextVar('job_tenant', default=None)
+
+def current_tenant():
+    """Tenant of the current request or tenant_scope(), DEFAULT_TENANT otherwise"""
+    tenant_id = _job_tenant.get()
+    if tenant_id is not None:
+        return tenant_id
+    if has_app_context():
+        return g.get('tenant_id', DEFAULT_TENANT)
+    return DEFAULT_TENANT
+
+@contextmanager
+def tenant_scope(tenant_id):
+    """Run a block (e.g. a background job) as the given tenant"""
+    token = _job_tenant.set(tenant_id)
+    try:
+        yield tenant_id
+    finally:
+        _job_tenant.reset(token)
+
+def _from_trusted_proxy():
+    supplied = request.headers.get(TENANT_PROXY_SECRET_HEADER)
+    return bool(TENANT_PROXY_SECRET and supplied) and hmac.compare_digest(supplied, TENANT_PROXY_SECRET)
+
+def resolve_tenant():
+    """Tenant id for the current request, or None when the supplied id is invalid or untrusted"""
+    tenant_id = request.headers.get(TENANT_HEADER)
+    if tenant_id and not _from_trusted_proxy():
+        return None
+    if not tenant_id and TENANT_FROM_SUBDOMAIN and request.host.count('.') >= 2:
+        tenant_id = request.host.split('.', 1)[0]
+    if not tenant_id:
+        return DEFAULT_TENANT
+    tenant_id = tenant_id.strip().lower()
+    return tenant_id if TENANT_ID_PATTERN.match(tenant_id) else None
+
+def check_admin_credentials(tenant_id, username, password, default_credentials):
+    """Whether username/password are the admin credentials of tenant_id (default_credentials for DEFAULT_TENANT)"""
+    credentials = TENANT_ADMINS.get(tenant_id)
+    if credentials is None and tenant_id == DEFAULT_TENANT:
+        credentials = default_credentials
+    if credentials is None or not username or not password:
+        return False
+    expected_username, expected_password = credentials
+    # Compare both fields so timing does not reveal which one was wrong
+    username_ok = hmac.compare_digest(username.encode('utf-8'), expected_username.encode('utf-8'))
+    password_ok = hmac.compare_digest(password.encode('utf-8'), expected_password.encode('utf-8'))
+    return username_ok and password_ok
+
+def bind_request_tenant():
+    """before_request hook binding g.tenant_id"""
+    tenant_id = resolve_tenant()
+    if tenant_id is None:
+        logging.warning(f"Rejected request with invalid or untrusted tenant id for {request.path}")
+        abort(400)
+    g.tenant_id = tenant_id
+
+def init_tenancy(app):
+    """Bind every request to its tenant"""
+    app.before_request(bind_request_tenant)
@@ -0,0 +1,20 @@
+import os
+import tempfile
+import pytest
+
+# app.py binds its database when imported, so point it at a throwaway SQLite file first
+_database_dir = tempfile.mkdtemp(prefix='mathboost-tests-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{_database_dir}/test.db")
+os.environ.setdefault('SESSION_SECRET', 'test-secret')
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app, init_db_if_needed
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        init_db_if_needed()
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
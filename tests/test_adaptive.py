@@ -0,0 +1,60 @@
+import adaptive
+
+def answer_all(state, correct):
+    while (index := adaptive.next_index(state)) is not None:
+        adaptive.record_answer(state, index, correct(index))
+    return state
+
+def test_first_question_splits_the_chain():
+    assert adaptive.next_index(adaptive.new_state(9)) == 4
+
+def test_correct_answer_raises_earlier_topics_only():
+    state = adaptive.record_answer(adaptive.new_state(5), 2, True)
+    assert state['p'][0] > 0.5 and state['p'][1] > 0.5 and state['p'][2] > 0.5
+    assert state['p'][3] == state['p'][4] == 0.5
+    assert state['asked'] == [2]
+
+def test_wrong_answer_lowers_later_topics_only():
+    state = adaptive.record_answer(adaptive.new_state(5), 2, False)
+    assert state['p'][0] == state['p'][1] == 0.5
+    assert all(p < 0.5 for p in state['p'][2:])
+
+def test_never_repeats_a_question_and_respects_budget():
+    state = answer_all(adaptive.new_state(10), lambda index: index < 4)
+    assert len(state['asked']) == len(set(state['asked']))
+    assert len(state['asked']) <= adaptive.max_questions(10)
+    assert adaptive.next_index(state) is None
+
+def test_empty_grade_is_complete():
+    assert adaptive.is_complete(adaptive.new_state(0))
+    assert adaptive.next_index(adaptive.new_state(0)) is None
+
+def test_classify_all_correct_student_as_mastered():
+    prerequisites = [f"topic {i}" for i in range(10)]
+    state = answer_all(adaptive.new_state(10), lambda index: True)
+    result = adaptive.classify(state, prerequisites)
+    assert result['mastered'] == prerequisites
+    assert result['not_mastered'] == result['uncertain'] == []
+
+def test_classify_splits_at_the_frontier():
+    prerequisites = [f"topic {i}" for i in range(10)]
+    state = answer_all(adaptive.new_state(10), lambda index: index < 5)
+    result = adaptive.classify(state, prerequisites)
+    assert set(result['mastered']) <= set(prerequisites[:5])
+    assert set(result['not_mastered']) <= set(prerequisites[5:])
+    assert sorted(result['mastered'] + result['not_mastered'] + result['uncertain']) == sorted(prerequisites)
+
+def test_simulation_asks_fewer_questions_than_linear():
+    report = adaptive.simulate({'grade': [f"topic {i}" for i in range(10)]}, students_per_grade=200)
+    assert report['grade']['adaptive_avg_questions'] < report['grade']['linear_avg_questions']
+
+def test_adaptive_session_stops_early(client):
+    from app import GRADE_PREREQUISITES
+
+    started = client.post('/api/start_session', json={'name': 'adaptive', 'grade': 'هفتم', 'mode': 'adaptive'}).get_json()
+    assert started['success']
+    asked = 0
+    while not client.get('/api/get_question').get_json().get('completed'):
+        assert client.post('/api/submit_answer', json={'answer': 'بلد نیستم'}).get_json()['success']
+        asked += 1
+    assert 0 < asked < len(GRADE_PREREQUISITES['هفتم'])
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, Student, StudentAnswer
+
+answers = StudentAnswer.__table__
+
+def start_session(client, name):
+    assert client.post('/api/start_session', json={'name': name, 'grade': 'ششم'}).get_json()['success']
+    with client.session_transaction() as session:
+        return session['student_id']
+
+def recorded_slots(app, student_id):
+    with app.app_context():
+        return db.session.execute(
+            select(answers.c.slot).where(answers.c.student_id == student_id).order_by(answers.c.slot)
+        ).scalars().all()
+
+def test_batch_retry_with_same_keys_is_recorded_once(app, client):
+    student_id = start_session(client, 'batch retry')
+    items = [{'slot': slot, 'answer': '1', 'key': f"key-{slot}"} for slot in range(3)]
+
+    first = client.post('/api/submit_answers', json={'answers': items}).get_json()
+    retry = client.post('/api/submit_answers', json={'answers': items}).get_json()
+
+    assert first['success'] and retry['success']
+    assert not any(result.get('duplicate') for result in first['results'])
+    assert all(result['duplicate'] for result in retry['results'])
+    assert retry['next_slot'] == first['next_slot'] == 3
+    assert recorded_slots(app, student_id) == [0, 1, 2]
+
+def test_retried_slot_returns_the_stored_result(app, client):
+    student_id = start_session(client, 'slot retry')
+    first = client.post('/api/submit_answer', json={'answer': 'بلد نیستم', 'slot': 0}).get_json()
+    retry = client.post('/api/submit_answer', json={'answer': '1', 'slot': 0}).get_json()
+
+    assert first['success'] and first['dont_know']
+    assert retry['duplicate'] and retry['dont_know'] and retry['slot'] == 0
+    assert recorded_slots(app, student_id) == [0]
+
+def test_out_of_order_slot_is_rejected(app, client):
+    student_id = start_session(client, 'skip ahead')
+    result = client.post('/api/submit_answer', json={'answer': '1', 'slot': 2}).get_json()
+
+    assert not result['success']
+    assert recorded_slots(app, student_id) == []
+
+def test_concurrent_request_with_stale_session_does_not_record_twice(app, client):
+    student_id = start_session(client, 'concurrent')
+    with client.session_transaction() as session:
+        stale = dict(session)
+
+    assert client.post('/api/submit_answer', json={'answer': '1'}).get_json()['success']
+    # A second request that read the session before the first one finished
+    with client.session_transaction() as session:
+        session.clear()
+        session.update(stale)
+    result = client.post('/api/submit_answer', json={'answer': 'بلد نیستم'}).get_json()
+
+    assert result['success'] and result['duplicate'] and result['slot'] == 0
+    assert recorded_slots(app, student_id) == [0]
+    with app.app_context():
+        assert db.session.get(Student, student_id).progress_version == 1
+    with client.session_transaction() as session:
+        assert session['progress_version'] == 1 and session['current_prerequisite_index'] == 1
+
+def test_unique_slot_index_rejects_a_second_row(app, client):
+    student_id = start_session(client, 'unique index')
+    row = {'student_id': student_id, 'slot': 0, 'prerequisite_name': 'p', 'is_correct': 1, 'tenant_id': 'default'}
+    with app.app_context():
+        db.session.execute(answers.insert().values(**row))
+        with pytest.raises(IntegrityError):
+            db.session.execute(answers.insert().values(**row))
+        db.session.rollback()
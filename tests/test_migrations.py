@@ -0,0 +1,126 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from models import db
+from migrations import upgrade_schema
+
+# Tables as the first release created them
+BASELINE_SCHEMA = """
+CREATE TABLE questions (
+    id INTEGER PRIMARY KEY, prerequisite_name VARCHAR(200) NOT NULL, difficulty_level VARCHAR(50) NOT NULL,
+    question_text TEXT NOT NULL UNIQUE, correct_answer VARCHAR(500) NOT NULL, times_used INTEGER,
+    avg_difficulty_percent FLOAT, avg_discrimination_index FLOAT
+);
+CREATE TABLE students (
+    id INTEGER PRIMARY KEY, student_name VARCHAR(100) NOT NULL, student_grade VARCHAR(50) NOT NULL,
+    session_start_time VARCHAR(50) NOT NULL
+);
+CREATE TABLE student_answers (
+    id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL REFERENCES students (id),
+    prerequisite_name VARCHAR(200) NOT NULL, student_answer VARCHAR(500), correct_answer VARCHAR(500),
+    is_correct INTEGER NOT NULL
+);
+CREATE TABLE prerequisite_videos (
+    id INTEGER PRIMARY KEY, prerequisite_name VARCHAR(200) NOT NULL UNIQUE, video_url VARCHAR(500)
+);
+INSERT INTO students VALUES (1, 'legacy', 'هفتم', '<sqlalchemy.sql.functions.now at 0x7f>');
+INSERT INTO students VALUES (2, 'stamped', 'هفتم', '2024-03-01 10:00:00');
+INSERT INTO student_answers VALUES (1, 1, 'توان و ریشه دوم', '4', '4', 1);
+"""
+
+# Rollup table before per-school tenancy: unique on (grade, prerequisite, day)
+PRE_TENANT_ROLLUPS = """
+CREATE TABLE prerequisite_daily_stats (
+    id INTEGER PRIMARY KEY, grade VARCHAR(50) NOT NULL, prerequisite_name VARCHAR(200) NOT NULL, day DATE NOT NULL,
+    answers INTEGER NOT NULL, correct INTEGER NOT NULL, incorrect INTEGER NOT NULL, dont_know INTEGER NOT NULL,
+    CONSTRAINT uq_prerequisite_daily_stats UNIQUE (grade, prerequisite_name, day)
+);
+CREATE INDEX ix_prerequisite_daily_stats_grade_day ON prerequisite_daily_stats (grade, day);
+INSERT INTO prerequisite_daily_stats VALUES (1, 'هفتم', 'توان و ریشه دوم', '2024-03-01', 5, 3, 1, 1);
+"""
+
+# Dependency overrides before they were scoped per school: unique on the edge alone
+PRE_TENANT_DEPENDENCIES = """
+CREATE TABLE prerequisite_dependencies (
+    id INTEGER PRIMARY KEY, prerequisite_name VARCHAR(200) NOT NULL, dependent_name VARCHAR(200) NOT NULL,
+    action VARCHAR(10) NOT NULL,
+    CONSTRAINT uq_prerequisite_dependencies_edge UNIQUE (prerequisite_name, dependent_name)
+);
+INSERT INTO prerequisite_dependencies VALUES (7, 'x', 'y', 'remove');
+"""
+
+def load(engine, script):
+    with engine.begin() as conn:
+        for statement in filter(str.strip, script.split(';')):
+            conn.execute(text(statement))
+
+def upgrade(engine):
+    # What create_tables() does on startup: create missing tables, then upgrade existing ones
+    db.metadata.create_all(engine)
+    upgrade_schema(engine)
+
+def columns(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    load(engine, BASELINE_SCHEMA)
+    yield engine
+    engine.dispose()
+
+def test_baseline_database_gains_current_answer_columns(legacy_engine):
+    upgrade(legacy_engine)
+
+    assert {'answered_at', 'client_key', 'slot', 'tenant_id'} <= columns(legacy_engine, 'student_answers')
+    assert 'progress_version' in columns(legacy_engine, 'students')
+    with legacy_engine.connect() as conn:
+        answered_at, tenant_id = conn.execute(text("SELECT answered_at, tenant_id FROM student_answers")).one()
+        start_times = dict(conn.execute(text("SELECT id, session_start_time FROM students")).all())
+    assert answered_at is not None and tenant_id == 'default'
+    # The unparseable legacy value is replaced; real timestamps are kept
+    assert start_times[1][:2] == '20' and start_times[2] == '2024-03-01 10:00:00'
+
+def test_upgrade_is_idempotent(legacy_engine):
+    upgrade(legacy_engine)
+    before = {table: columns(legacy_engine, table) for table in inspect(legacy_engine).get_table_names()}
+    upgrade(legacy_engine)
+    after = {table: columns(legacy_engine, table) for table in inspect(legacy_engine).get_table_names()}
+    assert before == after
+
+def test_fresh_database_needs_no_upgrade(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    upgrade(engine)
+    assert {'answered_at', 'client_key', 'slot', 'tenant_id'} <= columns(engine, 'student_answers')
+    engine.dispose()
+
+def test_rollups_are_rebuilt_with_tenant_led_unique_key(legacy_engine):
+    load(legacy_engine, PRE_TENANT_ROLLUPS)
+    upgrade(legacy_engine)
+
+    rollup = "INSERT INTO prerequisite_daily_stats (tenant_id, grade, prerequisite_name, day, answers, correct, incorrect, dont_know) "
+    with legacy_engine.begin() as conn:
+        assert conn.execute(text(
+            "SELECT tenant_id, answers, correct, incorrect, dont_know FROM prerequisite_daily_stats"
+        )).all() == [('default', 5, 3, 1, 1)]
+        # The same day and prerequisite may now be counted separately for another school
+        conn.execute(text(rollup + "VALUES ('school-1', 'هفتم', 'توان و ریشه دوم', '2024-03-01', 1, 1, 0, 0)"))
+    with pytest.raises(IntegrityError), legacy_engine.begin() as conn:
+        conn.execute(text(rollup + "VALUES ('school-1', 'هفتم', 'توان و ریشه دوم', '2024-03-01', 1, 1, 0, 0)"))
+
+    indexes = {index['name'] for index in inspect(legacy_engine).get_indexes('student_answers')}
+    assert {'ix_student_answers_tenant_student', 'ix_student_answers_tenant_answered_at'} <= indexes
+
+def test_dependency_overrides_are_rebuilt_per_school(legacy_engine):
+    load(legacy_engine, PRE_TENANT_DEPENDENCIES)
+    upgrade(legacy_engine)
+
+    override = "INSERT INTO prerequisite_dependencies (tenant_id, prerequisite_name, dependent_name, action) "
+    with legacy_engine.begin() as conn:
+        assert conn.execute(text(
+            "SELECT id, tenant_id, prerequisite_name, dependent_name, action FROM prerequisite_dependencies"
+        )).all() == [(7, 'default', 'x', 'y', 'remove')]
+        # A school may override an edge the shared base already overrides
+        conn.execute(text(override + "VALUES ('school-1', 'x', 'y', 'add')"))
+    with pytest.raises(IntegrityError), legacy_engine.begin() as conn:
+        conn.execute(text(override + "VALUES ('school-1', 'x', 'y', 'remove')"))
@@ -0,0 +1,62 @@
+import question_dedup
+from question_dedup import NearDuplicateIndex, normalize, fingerprint, find_near_duplicate, question_index
+from models import db, Question
+from tenancy import tenant_scope
+
+def test_normalize_unifies_persian_letters_and_digits():
+    assert normalize('حاصل ۱۲ + ۳ چيست؟') == normalize('حاصل 12+3 چیست')
+
+def test_reworded_question_is_a_duplicate():
+    index = NearDuplicateIndex()
+    index.add(1, 'حاصل عبارت ۲۵ + ۳۷ را به دست آورید.')
+    assert [question_id for question_id, _ in index.matches('مقدار عبارت 25+37 را به دست آورید')] == [1]
+    assert [question_id for question_id, _ in index.matches('حاصلِ عبارتِ ۲۵ + ۳۷ را به‌دست آورید!')] == [1]
+
+def test_different_numbers_are_not_duplicates():
+    index = NearDuplicateIndex()
+    index.add(1, 'حاصل عبارت ۲۵ + ۳۷ را به دست آورید.')
+    assert not index.is_duplicate('حاصل عبارت ۲۶ + ۳۷ را به دست آورید.')
+
+def test_remove_drops_question_and_resets_last_id():
+    index = NearDuplicateIndex()
+    index.add(1, 'first question about fractions 1/2')
+    index.add(2, 'second question about decimals 0.5')
+    index.remove(2)
+    assert len(index) == 1 and index.last_id == 1
+    assert not index.is_duplicate('second question about decimals 0.5')
+
+def test_signatures_match_between_numpy_and_pure_python(monkeypatch):
+    text = 'معادله 2x + 3 = 7 را حل کنید'
+    expected = fingerprint(text)
+    monkeypatch.setattr(question_dedup, 'np', None)
+    assert fingerprint(text) == expected
+
+def add_question(text):
+    question = Question(prerequisite_name='dedup', difficulty_level='easy', question_text=text, correct_answer='1')
+    db.session.add(question)
+    db.session.commit()
+    return question.id
+
+def test_index_picks_up_out_of_order_and_deleted_questions(app):
+    with app.app_context(), tenant_scope('dedup-school'):
+        newer = add_question('کدام عدد بزرگ‌تر است: ۷۱ یا ۱۷؟')
+        index = question_index()
+        assert newer in index.ids()
+
+        # A question committed after a higher id was already indexed
+        older = add_question('جذر عدد ۱۴۴ را بیابید')
+        index.remove(older)
+        index.last_id = max(index.last_id, older + 1)
+        assert find_near_duplicate('جذر عدد 144 را بیابید') == older
+
+        Question.query.filter_by(id=newer).delete()
+        db.session.commit()
+        assert find_near_duplicate('کدام عدد بزرگ‌تر است: 71 یا 17؟') is None
+        assert newer not in question_index().ids()
+
+def test_tenant_indexes_are_bounded(monkeypatch):
+    monkeypatch.setattr(question_dedup, '_indexes', question_dedup.OrderedDict())
+    monkeypatch.setattr(question_dedup, 'MAX_INDEXES', 2)
+    for tenant_id in ('a', 'b', 'a', 'c'):
+        question_dedup._tenant_index(tenant_id)
+    assert list(question_dedup._indexes) == ['a', 'c']
@@ -0,0 +1,70 @@
+import pytest
+import ratelimit
+from ratelimit import refill, retry_after, MemoryRateLimitStore, SQLRateLimitStore, AdmissionController
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'time', clock)
+    return clock
+
+def test_refill_is_capped_and_ignores_clock_skew():
+    assert refill(0, 100, capacity=10, rate=2, now=103) == 6
+    assert refill(5, 100, capacity=10, rate=2, now=200) == 10
+    assert refill(5, 100, capacity=10, rate=2, now=90) == 5
+
+def test_retry_after_rounds_up_to_whole_seconds():
+    assert retry_after(0.5, rate=0.25) == 2
+    assert retry_after(0.99, rate=100) == 1
+
+def test_memory_bucket_allows_burst_then_refills(clock):
+    store = MemoryRateLimitStore()
+    assert [store.consume('k', capacity=3, rate=1)[0] for _ in range(4)] == [True, True, True, False]
+    clock.now += 1
+    assert store.consume('k', capacity=3, rate=1)[0]
+    assert not store.consume('k', capacity=3, rate=1)[0]
+    # Other keys have their own bucket
+    assert store.consume('other', capacity=3, rate=1)[0]
+
+def test_sql_bucket_is_shared_between_stores(clock, tmp_path):
+    url = f"sqlite:///{tmp_path / 'buckets.db'}"
+    first, second = SQLRateLimitStore(url), SQLRateLimitStore(url)
+    assert first.consume('k', capacity=2, rate=1)[0]
+    assert second.consume('k', capacity=2, rate=1)[0]
+    assert not first.consume('k', capacity=2, rate=1)[0]
+    clock.now += 1
+    assert second.consume('k', capacity=2, rate=1)[0]
+
+def test_admission_sheds_beyond_queue():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, timeout=0.01)
+    assert controller.acquire()
+    assert not controller.acquire()
+    controller.release()
+    assert controller.acquire()
+    assert controller.shed == 1
+
+def test_admission_queue_times_out():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, timeout=0.01)
+    assert controller.acquire()
+    assert not controller.acquire()
+    assert controller.shed == 1 and controller.waiting == 0
+
+def test_admin_login_is_rate_limited_per_ip(client):
+    from app import ADMIN_LOGIN_LIMIT
+
+    capacity = ADMIN_LOGIN_LIMIT[0]
+    attempt = lambda: client.post('/admin/login', data={'username': 'x', 'password': 'y'},
+                                  environ_base={'REMOTE_ADDR': '10.9.8.7'})
+    assert all(attempt().status_code != 429 for _ in range(capacity))
+    limited = attempt()
+    assert limited.status_code == 429 and int(limited.headers['Retry-After']) >= 1
+    # Another address is unaffected
+    assert client.post('/admin/login', data={'username': 'x', 'password': 'y'},
+                       environ_base={'REMOTE_ADDR': '10.9.8.6'}).status_code != 429
@@ -0,0 +1,62 @@
+import pytest
+from models import db, PrerequisiteDependency
+from remediation import (DependencyGraph, build_graph, weak_topics, validate_override,
+                         dependency_graph, invalidate_graph)
+from tenancy import tenant_scope
+
+GRADES = {
+    'a': ['add', 'multiply', 'fractions'],
+    'b': ['add', 'negatives', 'equations'],
+}
+
+def test_topological_order_follows_curriculum():
+    graph = build_graph(GRADES)
+    assert sorted(graph.nodes, key=graph.rank.get) == ['add', 'multiply', 'negatives', 'fractions', 'equations']
+    assert graph.ancestors['equations'] == {'add', 'negatives'}
+    assert graph.descendants['add'] == {'multiply', 'fractions', 'negatives', 'equations'}
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError):
+        DependencyGraph(['x', 'y'], {('x', 'y'), ('y', 'x')})
+
+def test_overrides_add_and_remove_edges_and_skip_cycles():
+    graph = build_graph(GRADES, [
+        ('multiply', 'equations', 'add'),
+        ('add', 'negatives', 'remove'),
+        ('fractions', 'add', 'add'),  # would close a cycle
+    ])
+    assert ('multiply', 'equations') in graph.edges
+    assert ('add', 'negatives') not in graph.edges
+    assert ('fractions', 'add') not in graph.edges
+
+def test_remediation_path_puts_root_causes_first():
+    graph = build_graph(GRADES)
+    path = graph.remediation_path({'fractions', 'multiply', 'equations'})
+    assert [step[0] for step in path] == ['multiply', 'fractions', 'equations']
+    topic, root_cause, blocked_by, unlocks = path[0]
+    assert root_cause and blocked_by == [] and unlocks == 1
+    assert path[1][1:3] == (False, ['multiply'])
+    # equations depends on add and negatives, neither of which is weak
+    assert path[2][1] is True
+
+def test_weak_topics_counts_dont_know_and_inferred():
+    counts = {'add': [1, 1, 0], 'multiply': [0, 1, 1], 'fractions': [1, 2, 0]}
+    weak = weak_topics(counts, inferred={'not_mastered': ['equations']})
+    assert weak == {'multiply', 'fractions', 'equations'}
+
+def test_validate_override_rejects_cycles_and_unknown_topics():
+    assert validate_override(GRADES, 'fractions', 'add', 'add', []) is not None
+    assert validate_override(GRADES, 'add', 'unknown', 'add', []) is not None
+    assert validate_override(GRADES, 'add', 'add', 'add', []) is not None
+    assert validate_override(GRADES, 'multiply', 'equations', 'add', []) is None
+
+def test_school_overrides_apply_to_that_school_only(app):
+    edge = ('جمع و تفریق اعداد طبیعی', 'معادلات درجه یک')
+    with app.app_context():
+        with tenant_scope('school-a'):
+            db.session.add(PrerequisiteDependency(prerequisite_name=edge[0], dependent_name=edge[1], action='add'))
+            db.session.commit()
+            invalidate_graph()
+            assert edge in dependency_graph().edges
+        with tenant_scope('school-b'):
+            assert edge not in dependency_graph().edges
@@ -0,0 +1,37 @@
+import reads
+from models import db, Question, Student
+from tenancy import tenant_scope
+
+def add(tenant_id, row):
+    with tenant_scope(tenant_id):
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+def test_students_are_only_visible_to_their_school(app):
+    with app.app_context():
+        student_id = add('school-a', Student(student_name='isolated', student_grade='هفتم'))
+        with tenant_scope('school-b'):
+            assert db.session.execute(
+                db.select(Student).where(Student.id == student_id)
+            ).scalar_one_or_none() is None
+            assert student_id not in [row.id for row in reads.student_summaries()]
+        with tenant_scope('school-a'):
+            assert Student.query.filter_by(id=student_id).one().tenant_id == 'school-a'
+            assert student_id in [row.id for row in reads.student_summaries()]
+
+def test_default_questions_are_shared_and_school_questions_are_not(app):
+    with app.app_context():
+        shared_id = add('default', Question(prerequisite_name='tenancy', difficulty_level='easy',
+                                            question_text='shared question', correct_answer='1'))
+        own_id = add('school-a', Question(prerequisite_name='tenancy', difficulty_level='easy',
+                                          question_text='school-a question', correct_answer='1'))
+        with tenant_scope('school-b'):
+            visible = {question.id for question in Question.query.filter_by(prerequisite_name='tenancy')}
+        assert visible == {shared_id}
+        with tenant_scope('school-a'):
+            visible = {question.id for question in Question.query.filter_by(prerequisite_name='tenancy')}
+        assert visible == {shared_id, own_id}
+
+def test_untrusted_tenant_header_is_rejected(client):
+    assert client.get('/', headers={'X-Tenant-ID': 'school-a'}).status_code == 400